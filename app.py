@@ -1,15 +1,20 @@
 import streamlit as st
-import folium
-from folium.plugins import Fullscreen
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+import functools
 import json
 import os
+import time
+import autosave
+import bundle_utils
+import country_index
+import geo_utils
 import h5_utils
-import redis_utils
+import map_utils
 import random
-import pandas as pd
-from streamlit_oauth import OAuth2Component
 import sys
+# The mapping stack (folium, tile_server, map_component, raster_utils), statistics, the leaderboard and the
+# account back ends (redis_utils, streamlit_oauth) are imported where they are first used, so starting the
+# server and showing the welcome screen do not load them
 
 # Global variables
 players = {}
@@ -44,6 +49,26 @@ except Exception as page_config_error:
 DEFAULT_H5_FILE = "countries_visited.h5"
 # Use os.path.join for cross-platform compatibility
 GEOJSON_PATH = os.path.join("JSON", "countries.geojson")
+# Compact TopoJSON asset built from the GeoJSON file by build_geometries.py
+TOPOJSON_PATH = geo_utils.topojson_path(source_path=GEOJSON_PATH)
+# Size of the rendered world map in pixels
+MAP_WIDTH = 1200
+MAP_HEIGHT = 600
+# Budget of the rendered map HTML cache shared by all sessions
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Draw maps with the persistent map component instead of a new folium map per rerun
+MAP_COMPONENT = os.environ.get('MAP_COMPONENT', 'True').lower() == 'true'
+
+# Neighbours listed per player, and the largest group shown as a full similarity matrix
+SIMILAR_TRAVELLERS = 3
+SIMILARITY_MATRIX_LIMIT = 30
+# Seconds between refreshes of the autosave status while autosave is on
+AUTOSAVE_STATUS_INTERVAL = 1
+# Seconds between checks whether a background leaderboard refresh finished
+LEADERBOARD_STATUS_INTERVAL = 1
+# Load the country data and palettes in a background thread when the first page is served, so they are
+# ready by the time someone logs in
+WARMUP = os.environ.get('WARMUP', 'True').lower() == 'true'
 
 # Initialize session state
 if 'logged_in' not in st.session_state:
@@ -54,24 +79,114 @@ if 'current_mode' not in st.session_state:
     st.session_state.current_mode = "single"  # Default to single-player mode
 
 
-# Load country data
-@st.cache_data
+def get_country_data_path():
+    """
+    Get the country geometry file to load, preferring the TopoJSON asset over the GeoJSON file.
+
+    Returns:
+        str: Path to JSON/countries.topojson if it has been built, else JSON/countries.geojson
+    """
+    if os.path.exists(TOPOJSON_PATH):
+        return TOPOJSON_PATH
+    return GEOJSON_PATH
+
+
+# Data files checked once per process; a failed check is cleared by main() so it runs again
+@st.cache_resource
+def validate_data_files():
+    """
+    Check that the JSON directory, the country data and the palettes exist.
+
+    Returns:
+        tuple: (error, info) messages about the first missing file, or None if all exist
+    """
+    palettes_path = os.path.join("JSON", "palettes.json")
+    if not os.path.exists("JSON"):
+        print("ERROR: JSON directory not found!")
+        return ("JSON directory not found. Please make sure the JSON directory exists in the project root.",
+                "This application requires the JSON directory with countries.geojson and palettes.json files.")
+    if not os.path.exists(get_country_data_path()):
+        print(f"ERROR: countries.geojson not found: {os.path.abspath(GEOJSON_PATH)}")
+        return (f"countries.geojson not found at {GEOJSON_PATH}. Please make sure the file exists.",
+                "This application requires the countries.geojson file in the JSON directory.")
+    if not os.path.exists(palettes_path):
+        print(f"ERROR: palettes.json not found: {os.path.abspath(palettes_path)}")
+        return (f"palettes.json not found at {palettes_path}. Please make sure the file exists.",
+                "This application requires the palettes.json file in the JSON directory.")
+    return None
+
+
+# Whether a map file opens as HDF5; the size and mtime are part of the cache key, so only new versions are opened
+@st.cache_data(max_entries=32)
+def is_valid_h5_file(path, mtime_ns, size):
+    try:
+        import h5py
+        with h5_utils.FILE_LOCK, h5py.File(path, 'r'):
+            return True
+    except Exception as exc:
+        print(f"Error opening existing HDF5 file: {str(exc)}")
+        return False
+
+
+def ensure_map_file(path=DEFAULT_H5_FILE):
+    """
+    Create the map file if it is missing, or back up and recreate it if it is not a valid HDF5 file.
+
+    Costs one os.stat() while the file is unchanged since it was last validated.
+
+    Args:
+        path (str): Path to the HDF5 map file
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        try:
+            success = h5_utils.init_h5(path)
+            if not success:
+                # Try to create a simple placeholder file to avoid errors
+                with open(path, 'wb') as file_handle:
+                    file_handle.write(b'placeholder')
+        except Exception as exc:
+            print(f"Error creating HDF5 file: {str(exc)}")
+            # Try to create a simple placeholder file to avoid errors
+            try:
+                with open(path, 'wb') as file_handle:
+                    file_handle.write(b'placeholder')
+            except (IOError, PermissionError) as file_error:
+                print(f"Error creating placeholder file: {str(file_error)}")
+        return
+
+    if not is_valid_h5_file(path, stat.st_mtime_ns, stat.st_size):
+        # Rename the corrupted file and create a new one
+        try:
+            import shutil
+            backup_file = f"{path}.bak"
+            shutil.move(path, backup_file)
+            h5_utils.init_h5(path)
+        except (IOError, OSError, PermissionError) as backup_error:
+            print(f"Error backing up corrupted file and creating new one: {str(backup_error)}")
+
+
+# Load country data once per process; every session shares the same read-only copy instead of unpickling its own.
+# Problems are printed, not shown: the loader also runs in the warm-up thread, where no page shows messages, and
+# main() shows the error when the data is missing
+@st.cache_resource(show_spinner=False)
 def load_country_data():
     try:
         # Check if file exists
-        if not os.path.exists(GEOJSON_PATH):
-            st.error(f"GeoJSON file not found: {GEOJSON_PATH}")
-            st.info(f"Current working directory: {os.getcwd()}")
-            st.info("Please check that the JSON directory exists and contains the countries.geojson file.")
+        if not os.path.exists(get_country_data_path()):
+            print(f"GeoJSON file not found: {GEOJSON_PATH}")
+            print(f"Current working directory: {os.getcwd()}")
+            print("Please check that the JSON directory exists and contains the countries.geojson file.")
             return None, []
 
-        with open(GEOJSON_PATH, encoding="utf-8") as f:
-            geo_data = json.load(f)
+        # GeoJSON FeatureCollection or TopoJSON topology; build_map and the helpers accept both
+        with open(get_country_data_path(), encoding="utf-8") as f:
+            geo_data = geo_utils.freeze(geo_utils.add_feature_ids(json.load(f)))
 
         # Create a list of countries with their ISO codes
         countries = []
-        for feature in geo_data['features']:
-            props = feature['properties']
+        for props in geo_utils.feature_properties(geo_data):
             if 'ISO3166-1-Alpha-2' in props and props['ISO3166-1-Alpha-2'] != '-99':
                 countries.append({
                     'name': props['name'],
@@ -81,60 +196,150 @@ def load_country_data():
         # Sort by name
         countries.sort(key=lambda x: x['name'])
 
+        # Compile the binary bundle so new server processes can skip parsing the file
+        if bundle_utils.load_country_bundle(get_country_data_path()) is None:
+            try:
+                bundle_utils.build_country_bundle(get_country_data_path(), geo_data)
+            except OSError as bundle_error:
+                print(f"Error building country bundle: {str(bundle_error)}")
+
         # Verify we have data
         if not countries:
-            st.warning("No countries were loaded from the GeoJSON file.")
-            st.info("The file may be missing country data or using an unexpected format.")
+            print("No countries were loaded from the GeoJSON file.")
+            print("The file may be missing country data or using an unexpected format.")
         else:
-            st.success(f"Successfully loaded {len(countries)} countries.")
+            print(f"Successfully loaded {len(countries)} countries.")
 
-        return geo_data, countries
+        return geo_data, geo_utils.freeze(countries)
     except FileNotFoundError:
-        st.error(f"GeoJSON file not found: {GEOJSON_PATH}")
-        st.info(f"Current working directory: {os.getcwd()}")
-        st.info("Please check that the JSON directory exists and contains the countries.geojson file.")
+        print(f"GeoJSON file not found: {GEOJSON_PATH}")
+        print(f"Current working directory: {os.getcwd()}")
+        print("Please check that the JSON directory exists and contains the countries.geojson file.")
         return None, []
     except json.JSONDecodeError:
-        st.error(f"Error parsing GeoJSON file: {GEOJSON_PATH}")
-        st.info("The file may be corrupted or not in valid JSON format.")
+        print(f"Error parsing GeoJSON file: {GEOJSON_PATH}")
+        print("The file may be corrupted or not in valid JSON format.")
         return None, []
     except Exception as load_error:
-        st.error(f"Error loading country data: {str(load_error)}")
-        st.info(f"Current working directory: {os.getcwd()}")
-        st.info(f"Full path to GeoJSON: {os.path.abspath(GEOJSON_PATH)}")
+        print(f"Error loading country data: {str(load_error)}")
+        print(f"Current working directory: {os.getcwd()}")
+        print(f"Full path to GeoJSON: {os.path.abspath(GEOJSON_PATH)}")
         return None, []
 
 
-# Load palettes
-@st.cache_data
+# Columnar country index shared by every session, from the precompiled bundle when it is up to date
+@st.cache_resource(show_spinner=False)
+def get_country_index():
+    bundle = bundle_utils.load_country_bundle(get_country_data_path())
+    if bundle is not None:
+        return country_index.CountryIndex.from_bundle(bundle)
+    geo_data, _ = load_country_data()
+    return country_index.CountryIndex.from_geo_data(geo_data or {})
+
+
+# Load the leaderboard rankings; the file's mtime is part of the cache key and only what the page shows is cached
+@st.cache_data(max_entries=4)
+def load_leaderboard_summary(path, mtime_ns):
+    import leaderboard
+    return leaderboard.load_rankings(path)
+
+
+# Load a simplified geometry level built by build_geometries.py, shared read-only like load_country_data()
+@st.cache_resource(show_spinner=False)
+def load_geometry_level(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return geo_utils.freeze(geo_utils.add_feature_ids(json.load(f)))
+    except (OSError, json.JSONDecodeError) as level_error:
+        print(f"Error loading geometry level {path}: {str(level_error)}")
+        return None
+
+
+# Load palettes; problems are printed like in load_country_data()
+@st.cache_data(show_spinner=False)
 def load_palettes():
     try:
         return h5_utils.get_palettes()
     except FileNotFoundError:
-        st.error("Palettes JSON file not found")
-        st.info("Please check that the JSON/palettes.json file exists.")
+        print("Palettes JSON file not found")
+        print("Please check that the JSON/palettes.json file exists.")
         return {}
     except json.JSONDecodeError:
-        st.error("Error parsing palettes JSON file")
-        st.info("The file may be corrupted or not in valid JSON format.")
+        print("Error parsing palettes JSON file")
+        print("The file may be corrupted or not in valid JSON format.")
         return {}
     except Exception as palette_error:
-        st.error(f"Error loading palettes: {str(palette_error)}")
+        print(f"Error loading palettes: {str(palette_error)}")
         return {}
 
 
+# Started by every script run until the data files are there; only a successful start is cached, so the warm-up
+# still runs once the files appear
+def start_warmup():
+    """
+    Load the data a logged-in session needs in a background thread.
+
+    Streamlit runs no script at server start, so this is started by the first script run of the process,
+    usually a welcome screen, which loads nothing itself; the data is then ready by the first login. The
+    loaders only print problems, as no page shows messages from this thread; main() shows the error and
+    drops the failed result, so the session that needs the data loads it again.
+
+    Returns:
+        threading.Thread: The warm-up thread, or None if the data files are missing
+    """
+    if validate_data_files() is not None:
+        validate_data_files.clear()
+        return None
+    return start_warmup_thread()
+
+
+# Started once per process; the thread fills the shared caches. The loaders it calls show no spinner, which would
+# need the script run context this thread does not have, and its messages go to stderr, apart from the output of
+# the script
+@st.cache_resource
+def start_warmup_thread():
+    """
+    Start the warm-up thread of start_warmup().
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    import threading
+
+    def warmup():
+        started = time.perf_counter()
+        try:
+            get_country_index()
+            load_palettes()
+            get_map_geometry(None)
+            print(f"Warmed up data caches in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+        except Exception as warmup_error:
+            print(f"Error warming up data caches: {str(warmup_error)}", file=sys.stderr)
+
+    thread = threading.Thread(target=warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
 # Build map function
-def build_map(player_data, geo_data):
+def build_map(player_data, geo_data, tile_url=None):
     """
     Build a folium map with visited countries colored according to player colors.
 
     Args:
         player_data (dict): Dictionary of players with their visited countries and colors
-        geo_data (dict): GeoJSON data for countries
+        geo_data (dict): GeoJSON or TopoJSON data for countries
+        tile_url (str): URL template of the country tile server. If set, the shapes are fetched
+            as tiles instead of being embedded into the map.
 
     Returns:
         folium.Map: The created map
     """
+    import folium
+    from folium.plugins import Fullscreen
+
     try:
         # Check if geo_data is None or empty
         if geo_data is None:
@@ -142,65 +347,11 @@ def build_map(player_data, geo_data):
             # Return a simple default map
             return folium.Map(location=[20, 0], zoom_start=2)
 
+        # Compute every country's style once per render; style_fn is then a dict lookup
+        style_table = map_utils.build_style_table(player_data, map_utils.feature_codes(geo_data))
+
         def style_fn(feature):
-            try:
-                iso = feature["properties"].get("ISO3166-1-Alpha-2", "")
-                if iso == '-99':  # Skip non-country territories
-                    return {"fillColor": "#ffffff", "fillOpacity": 0.1, "color": "#999", "weight": 0.5}
-
-                owners = [player_id for player_id, player_info in player_data.items() if iso in player_info["visited"]]
-
-                if not owners:  # Nobody visited
-                    return {"fillColor": "#ffffff", "color": "#999", "weight": 0.5}
-
-                if len(owners) == 1:  # Single owner → their colour
-                    return {"fillColor": player_data[owners[0]]["colour"],
-                            "fillOpacity": 0.7,
-                            "color": "#444", "weight": 0.5}
-
-                # Multiple owners → improved color mixing
-                # Convert hex colors to RGB
-                hex_colors = [player_data[o]["colour"] for o in owners]
-                rgb_colors = []
-
-                for hex_color in hex_colors:
-                    # Ensure hex color has # prefix and is 7 characters long (#RRGGBB)
-                    if not hex_color.startswith('#'):
-                        hex_color = f"#{hex_color}"
-                    if len(hex_color) != 7:
-                        # Default to a gray color if invalid
-                        hex_color = "#777777"
-
-                    # Convert hex to RGB
-                    r = int(hex_color[1:3], 16)
-                    g = int(hex_color[3:5], 16)
-                    b = int(hex_color[5:7], 16)
-                    rgb_colors.append((r, g, b))
-
-                # Calculate the mixed color using a more visually accurate method
-                # This uses a square root method which better represents color mixing
-                r_sum = sum(color[0] ** 2 for color in rgb_colors)
-                g_sum = sum(color[1] ** 2 for color in rgb_colors)
-                b_sum = sum(color[2] ** 2 for color in rgb_colors)
-
-                r_mixed = int((r_sum / len(rgb_colors)) ** 0.5)
-                g_mixed = int((g_sum / len(rgb_colors)) ** 0.5)
-                b_mixed = int((b_sum / len(rgb_colors)) ** 0.5)
-
-                # Ensure values are within valid RGB range (0-255)
-                r_mixed = max(0, min(255, r_mixed))
-                g_mixed = max(0, min(255, g_mixed))
-                b_mixed = max(0, min(255, b_mixed))
-
-                mixed_color = "#{:02x}{:02x}{:02x}".format(r_mixed, g_mixed, b_mixed)
-
-                return {"fillColor": mixed_color,
-                        "fillOpacity": 0.7,
-                        "color": "#222", "weight": 0.5}
-            except Exception as style_error:
-                # If there's an error in styling, use a default style
-                st.warning(f"Error styling map feature: {str(style_error)}")
-                return {"fillColor": "#ffffff", "color": "#999", "weight": 0.5}
+            return style_table.get(feature["properties"].get(map_utils.ISO_PROPERTY, ""), map_utils.UNVISITED_STYLE)
 
         # Create map
         m = folium.Map(location=[20, 0], zoom_start=2, control_scale=True)
@@ -208,13 +359,27 @@ def build_map(player_data, geo_data):
         # Add fullscreen button
         Fullscreen().add_to(m)
 
-        # Add GeoJSON layer
+        # Add country layer
         tooltip = folium.GeoJsonTooltip(fields=['name', 'ISO3166-1-Alpha-2'], aliases=['Country:', 'Code:'])
-        folium.GeoJson(
-            geo_data,
-            style_function=style_fn,
-            tooltip=tooltip
-        ).add_to(m)
+        if tile_url:
+            # Only embed the styles of countries that are not drawn as unvisited
+            import tile_server
+            styles = map_utils.styled_countries(style_table)
+            tile_server.CountryTileLayer(tile_url, styles, map_utils.UNVISITED_STYLE).add_to(m)
+        elif geo_utils.is_topology(geo_data):
+            # TopoJson writes the styles into the properties, so keep the cached topology untouched
+            folium.TopoJson(
+                geo_utils.copy_topology_properties(geo_data),
+                f"objects.{geo_utils.TOPOJSON_OBJECT}",
+                style_function=style_fn,
+                tooltip=tooltip
+            ).add_to(m)
+        else:
+            folium.GeoJson(
+                geo_data,
+                style_function=style_fn,
+                tooltip=tooltip
+            ).add_to(m)
 
         # Add legend
         if player_data:
@@ -243,6 +408,173 @@ def build_map(player_data, geo_data):
         return folium.Map(location=[20, 0], zoom_start=2)
 
 
+# Rendered map HTML shared across sessions
+@st.cache_resource
+def get_render_cache():
+    return map_utils.RenderCache(max_bytes=RENDER_CACHE_MAX_BYTES)
+
+
+# Country tile server, started once per process when TILE_SERVER=local
+@st.cache_resource
+def get_tile_url():
+    import tile_server
+    if tile_server.TILE_SERVER == "external":
+        return tile_server.tile_url_template()
+    if tile_server.TILE_SERVER != "local":
+        return None
+
+    geo_data, _ = load_country_data()
+    if geo_data is None:
+        return None
+    try:
+        tile_server.start_tile_server(tile_server.TileSet(geo_data))
+    except OSError as server_error:
+        print(f"Error starting tile server: {str(server_error)}")
+        return None
+    return tile_server.tile_url_template()
+
+
+def get_geometry_version(path=None):
+    """
+    Identify the geometry the map is drawn from, so cached renders are dropped when it changes.
+
+    Args:
+        path (str): Path to the geometry file the map is drawn from. If None, uses the loaded country data file.
+
+    Returns:
+        str: Path, modification time and size of the geometry file
+    """
+    if path is None:
+        path = get_country_data_path()
+    try:
+        stat = os.stat(path)
+        return f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+    except OSError:
+        return path
+
+
+def get_map_geometry(geo_data, width=MAP_WIDTH, height=MAP_HEIGHT):
+    """
+    Pick the geometry to embed into a map of the given size.
+
+    Uses the coarsest simplified level that looks exact at that size, preferring its TopoJSON
+    copy, and falls back to the full-resolution data when the levels have not been built
+    (see build_geometries.py).
+
+    Args:
+        geo_data (dict): Full-resolution GeoJSON or TopoJSON data for countries.
+            If None, it is loaded only when no simplified level is available.
+        width (int): Width of the map in pixels
+        height (int): Height of the map in pixels
+
+    Returns:
+        tuple: (GeoJSON or TopoJSON data, geometry version)
+    """
+    level = geo_utils.pick_geometry_level(width, height)
+    level_paths = (geo_utils.topojson_path(level, GEOJSON_PATH), geo_utils.geometry_level_path(level, GEOJSON_PATH))
+    for level_path in level_paths:
+        level_data = load_geometry_level(level_path)
+        if level_data is not None:
+            return level_data, get_geometry_version(level_path)
+    if geo_data is None:
+        geo_data, _ = load_country_data()
+    return geo_data, get_geometry_version()
+
+
+def render_map(player_data, geo_data, width=MAP_WIDTH, height=MAP_HEIGHT, key="country_map"):
+    """
+    Display the map for the given players.
+
+    With MAP_COMPONENT the map stays alive in the browser and only receives style changes;
+    otherwise a folium map is rendered, reusing cached HTML when the map state is unchanged.
+
+    Args:
+        player_data (dict): Dictionary of players with their visited countries and colors
+        geo_data (dict): Full-resolution country data, used when no simplified level is available
+        width (int): Width of the map in pixels
+        height (int): Height of the map in pixels
+        key (str): Key of the map component; use one per map on the page
+    """
+    tile_url = get_tile_url()
+    if MAP_COMPONENT and not tile_url:
+        import map_component
+        map_geo_data, geometry_version = get_map_geometry(geo_data, width, height)
+        style_table = map_utils.build_style_table(player_data, map_utils.feature_codes(map_geo_data))
+        legend = [{"name": str(p), "colour": info["colour"], "count": len(info["visited"])}
+                  for p, info in player_data.items()]
+        map_component.country_map(map_geo_data, geometry_version, map_utils.styled_countries(style_table),
+                                  map_utils.UNVISITED_STYLE, legend=legend, height=height, key=key)
+        return
+
+    if tile_url:
+        # The shapes are served as tiles; the page only carries the styles
+        map_geo_data, geometry_version = geo_data, f"{get_geometry_version()}:{tile_url}"
+    else:
+        map_geo_data, geometry_version = get_map_geometry(geo_data, width, height)
+    render_cache = get_render_cache()
+    state_key = map_utils.state_hash(player_data, geometry_version)
+    map_html = render_cache.get(state_key)
+    if map_html is None:
+        import folium
+        m = build_map(player_data, map_geo_data, tile_url)
+        # Wrap the map in a figure the same way streamlit_folium.folium_static does
+        map_html = folium.Figure().add_child(m).render()
+        render_cache.put(state_key, map_html)
+
+    try:
+        components.html(map_html, height=height + 10, width=width)
+    except (RuntimeError, ValueError, TypeError):
+        # Try alternative rendering method
+        st.markdown(map_html, unsafe_allow_html=True)
+        st.success("Map rendered using alternative method.")
+
+
+# Pixel masks of the countries for static PNG renders, compiled once per geometry and size
+@st.cache_resource
+def get_raster_map(_geo_data, geometry_version, width, height):
+    import raster_utils
+    return raster_utils.RasterMap(_geo_data, width, height)
+
+
+def render_map_png(player_data, geo_data, width=MAP_WIDTH, height=MAP_HEIGHT):
+    """
+    Render the map for the given players as a static PNG, reusing cached images when the map state is unchanged.
+
+    Args:
+        player_data (dict): Dictionary of players with their visited countries and colors
+        geo_data (dict): Full-resolution country data, used when no simplified level is available
+        width (int): Width of the image in pixels
+        height (int): Height of the image in pixels
+
+    Returns:
+        bytes: PNG image
+    """
+    map_geo_data, geometry_version = get_map_geometry(geo_data, width, height)
+    render_cache = get_render_cache()
+    state_key = map_utils.state_hash(player_data, f"png:{width}x{height}:{geometry_version}")
+    png = render_cache.get(state_key)
+    if png is None:
+        png = get_raster_map(map_geo_data, geometry_version, width, height).render_png(player_data)
+        render_cache.put(state_key, png)
+    return png
+
+
+def map_png_download(player_data, geo_data, key):
+    """
+    Offer the map as a PNG download; the image is only rendered when the button is clicked.
+
+    Args:
+        player_data (dict): Dictionary of players with their visited countries and colors
+        geo_data (dict): Full-resolution country data, used when no simplified level is available
+        key (str): Widget key of the download button
+    """
+    # Snapshot the selections, which later edits change in place
+    snapshot = {player_id: {"colour": info["colour"], "visited": frozenset(info["visited"])}
+                for player_id, info in player_data.items()}
+    st.download_button("Download Map (PNG)", data=functools.partial(render_map_png, snapshot, geo_data),
+                       file_name="countries_visited.png", mime="image/png", key=key)
+
+
 # OAuth configuration
 def setup_oauth():
     # Replace with your actual OAuth credentials
@@ -251,6 +583,7 @@ def setup_oauth():
     redirect_uri = st.secrets.get("OAUTH_REDIRECT_URI", "http://localhost:8501")
 
     # Initialize OAuth component
+    from streamlit_oauth import OAuth2Component
     oauth2 = OAuth2Component(
         client_id,
         client_secret,
@@ -287,6 +620,7 @@ def welcome_screen():
             st.session_state.login_error = "Please enter both username and password"
         else:
             # Authenticate user
+            import redis_utils
             if redis_utils.authenticate_user(st.session_state.login_username, st.session_state.login_password):
                 st.session_state.login_success = f"Welcome back, {st.session_state.login_username}!"
                 # Set session state
@@ -309,6 +643,7 @@ def welcome_screen():
     if 'register_button' in st.session_state and st.session_state.register_button:
         # Reset button state
         st.session_state.register_button = False
+        import redis_utils
 
         if (not st.session_state.reg_username or
                 not st.session_state.reg_password or
@@ -460,6 +795,7 @@ def login_screen():
             else:
                 # Check Redis for user authentication
                 try:
+                    import redis_utils
                     success = redis_utils.authenticate_user(username, password)
                     if success:
                         st.session_state.authenticated = True
@@ -477,6 +813,7 @@ def login_screen():
             st.session_state.register_error = "Please enter both username and password."
         else:
             try:
+                import redis_utils
                 success, message = redis_utils.register_user(username, password)
                 if success:
                     st.session_state.register_success = f"User {username} registered successfully. You can now log in."
@@ -514,83 +851,50 @@ def main():
         if 'country_search' not in st.session_state:
             st.session_state.country_search = ""
 
-        # Check if HDF5 file exists and create it if it doesn't
-        if not os.path.exists(DEFAULT_H5_FILE):
-            try:
-                success = h5_utils.init_h5(DEFAULT_H5_FILE)
-                if not success:
-                    # Try to create a simple placeholder file to avoid errors
-                    with open(DEFAULT_H5_FILE, 'wb') as file_handle:
-                        file_handle.write(b'placeholder')
-            except Exception as exc:
-                print(f"Error creating HDF5 file: {str(exc)}")
-                # Try to create a simple placeholder file to avoid errors
-                try:
-                    with open(DEFAULT_H5_FILE, 'wb') as file_handle:
-                        file_handle.write(b'placeholder')
-                except (IOError, PermissionError) as file_error:
-                    print(f"Error creating placeholder file: {str(file_error)}")
-        else:
-            # Verify that the file is a valid HDF5 file
-            try:
-                import h5py
-                with h5py.File(DEFAULT_H5_FILE, 'r'):
-                    pass
-            except Exception as exc:
-                print(f"Error opening existing HDF5 file: {str(exc)}")
-                # Rename the corrupted file and create a new one
-                try:
-                    import shutil
-                    backup_file = f"{DEFAULT_H5_FILE}.bak"
-                    shutil.move(DEFAULT_H5_FILE, backup_file)
-                    h5_utils.init_h5(DEFAULT_H5_FILE)
-                except (IOError, OSError, PermissionError) as backup_error:
-                    print(f"Error backing up corrupted file and creating new one: {str(backup_error)}")
-
-        # Check if JSON directory and files exist
-        if not os.path.exists("JSON"):
-            # Display a basic UI with error message
-            st.title("Countries Visited Map")
-            st.error("JSON directory not found. Please make sure the JSON directory exists in the project root.")
-            st.info("This application requires the JSON directory with countries.geojson and palettes.json files.")
-            return
-
-        if not os.path.exists(GEOJSON_PATH):
-            # Display a basic UI with error message
-            st.title("Countries Visited Map")
-            st.error(f"countries.geojson not found at {GEOJSON_PATH}. Please make sure the file exists.")
-            st.info("This application requires the countries.geojson file in the JSON directory.")
-            return
-
-        if not os.path.exists(os.path.join("JSON", "palettes.json")):
-            # Display a basic UI with error message
-            st.title("Countries Visited Map")
-            st.error(f"palettes.json not found at {os.path.join('JSON', 'palettes.json')}. Please make sure the file "
-                     f"exists.")
-            st.info("This application requires the palettes.json file in the JSON directory.")
-            return
-
-        # Load data
-        geo_data, countries = load_country_data()
-
-        # Check if country data was loaded successfully
-        if not geo_data or not countries:
-            # Display a basic UI with error message
-            st.title("Countries Visited Map")
-            st.error("Failed to load country data. Please check the terminal for more details.")
-            st.info("This application requires valid country data from the countries.geojson file.")
-            return
-
-        palettes = load_palettes()
-
-        # Check if palettes were loaded successfully
-        if not palettes:
-            # Display a basic UI with error message
-            st.title("Countries Visited Map")
-            st.error("Failed to load color palettes. Please check the terminal for more details.")
-            st.info("This application requires valid color palettes from the palettes.json file.")
-            # Continue without palettes - we can use default colors
-            palettes = {"default": ["#7ebce6", "#f7941d", "#a2ad00", "#522398"]}
+        if WARMUP:
+            start_warmup()
+
+        # The data is only loaded for logged-in users, so the welcome screen costs next to nothing
+        geo_data = index = palettes = None
+        if st.session_state.logged_in:
+            # Create the map file, or replace it if it is corrupt; an unchanged file is not opened again
+            ensure_map_file()
+
+            # Check that the JSON files exist; checked once per process while they do
+            missing = validate_data_files()
+            if missing:
+                validate_data_files.clear()
+                error, info = missing
+                # Display a basic UI with error message
+                st.title("Countries Visited Map")
+                st.error(error)
+                st.info(info)
+                return
+
+            # Load data; the geometry itself is only loaded if the map needs the full-resolution file
+            index = get_country_index()
+
+            # Check if country data was loaded successfully; a failed load is not kept, so the next run tries again
+            if not len(index):
+                get_country_index.clear()
+                load_country_data.clear()
+                # Display a basic UI with error message
+                st.title("Countries Visited Map")
+                st.error("Failed to load country data. Please check the terminal for more details.")
+                st.info("This application requires valid country data from the countries.geojson file.")
+                return
+
+            palettes = load_palettes()
+
+            # Check if palettes were loaded successfully
+            if not palettes:
+                load_palettes.clear()
+                # Display a basic UI with error message
+                st.title("Countries Visited Map")
+                st.error("Failed to load color palettes. Please check the terminal for more details.")
+                st.info("This application requires valid color palettes from the palettes.json file.")
+                # Continue without palettes - we can use default colors
+                palettes = {"default": ["#7ebce6", "#f7941d", "#a2ad00", "#522398"]}
 
         # Sidebar
         with st.sidebar:
@@ -602,6 +906,10 @@ def main():
 
                 # Callback function for logout button
                 def logout_callback():
+                    # Write any autosaved changes still queued before the session ends
+                    writer = autosave.get_writer(DEFAULT_H5_FILE, create=False)
+                    if writer is not None:
+                        writer.flush()
                     st.session_state.logged_in = False
                     st.session_state.user_id = None
                     st.session_state.need_rerun = True
@@ -622,6 +930,14 @@ def main():
                                 key="mode_selection")
                 st.session_state.current_mode = "single" if mode == "Single Player" else "multi"
 
+                # Autosave: selection changes are queued and written in the background
+                if 'autosave' not in st.session_state:
+                    st.session_state.autosave = autosave.AUTOSAVE
+                st.checkbox("Autosave", key="autosave", on_change=autosave_callback,
+                            help="Save selection changes automatically in the background")
+                if st.session_state.autosave:
+                    show_autosave_status()
+
                 # File management
                 st.divider()
                 st.subheader("Map File")
@@ -632,9 +948,11 @@ def main():
                     # Callback function for new map button
                     def new_map_callback():
                         try:
+                            discard_autosave()
                             if os.path.exists(DEFAULT_H5_FILE):
                                 os.remove(DEFAULT_H5_FILE)
                             init_success = h5_utils.init_h5(DEFAULT_H5_FILE)
+                            reload_selections()
                             if init_success:
                                 st.session_state.new_map_success = "Created new map!"
                                 st.session_state.need_rerun = True
@@ -673,10 +991,14 @@ def main():
 
                 with col2:
                     uploaded_file = st.file_uploader("Load Map", type=["h5"], key="map_file_uploader")
-                    if uploaded_file:
+                    # The uploader keeps the file across reruns, so a map is only loaded once per upload
+                    if uploaded_file and st.session_state.get("loaded_map_file_id") != uploaded_file.file_id:
                         try:
+                            discard_autosave()
                             with open(DEFAULT_H5_FILE, "wb") as f:
                                 f.write(uploaded_file.getvalue())
+                            st.session_state.loaded_map_file_id = uploaded_file.file_id
+                            reload_selections()
                             st.success("Map loaded!")
                             st.session_state.need_rerun = True
                         except Exception as exc:
@@ -712,11 +1034,11 @@ def main():
                     if st.session_state.current_mode == "single":
                         # Clear the placeholder
                         placeholder.empty()
-                        single_player_mode(geo_data, countries)
+                        single_player_mode(geo_data, index)
                     else:
                         # Clear the placeholder
                         placeholder.empty()
-                        multi_player_mode(geo_data, countries, palettes)
+                        multi_player_mode(geo_data, index, palettes)
                 except Exception as exc:
                     import traceback
                     traceback.print_exc()
@@ -765,13 +1087,305 @@ def main():
         st.warning("There was an error loading the application. Please see the error message above.")
 
 
-def single_player_mode(geo_data, countries):
+def apply_edited_rows(selection, edited_rows, codes, column="Visited"):
+    """
+    Apply a data editor's edited-rows delta to a set of selected country codes.
+
+    Args:
+        selection (set): ISO codes of the selected countries, updated in place
+        edited_rows (dict): Row position -> {column: new value}, as kept by st.data_editor
+        codes (sequence): ISO code of each row shown in the editor
+        column (str): Name of the checkbox column
+
+    Returns:
+        int: Number of rows applied
+    """
+    applied = 0
+    for position, changes in edited_rows.items():
+        if column not in changes:
+            continue
+        code = codes[int(position)]
+        if changes[column]:
+            selection.add(code)
+        else:
+            selection.discard(code)
+        applied += 1
+    return applied
+
+
+def sync_editor_selection(editor_key, codes, player_id=None):
+    """
+    on_change callback of the country editors: apply the edited rows to the session's selection.
+
+    Only the edited rows are read, so the cost follows the number of edits since the editor was last reset
+    (see reset_editors()), not the number of countries.
+
+    Args:
+        editor_key (str): Key of the st.data_editor
+        codes (sequence): ISO code of each row the editor was shown with
+        player_id (str): Player whose multi-player selection to update, or None for single-player mode
+    """
+    if player_id is None:
+        selection = st.session_state.single_player_selected_countries
+    else:
+        selection = st.session_state.multi_player_selections.setdefault(player_id, set())
+    editor_state = st.session_state.get(editor_key) or {}
+    apply_edited_rows(selection, editor_state.get("edited_rows", {}), codes)
+    if 'autosave' in st.session_state and st.session_state.autosave:
+        autosave.get_writer(DEFAULT_H5_FILE).submit("default" if player_id is None else player_id, selection)
+
+
+def editor_generation(player_id):
+    """
+    Get the generation of a player's country editors, which is part of their widget keys.
+
+    Args:
+        player_id (str): Player of the editor, "default" in single-player mode
+
+    Returns:
+        str: Generation, changed by reset_editors()
+    """
+    generations = st.session_state.get("editor_generations", {})
+    return f"{st.session_state.get('editor_epoch', 0)}.{generations.get(player_id, 0)}"
+
+
+def reset_editors(player_id=None):
+    """
+    Start new country editors once a selection was saved, cleared or replaced.
+
+    A keyed st.data_editor keeps its edited rows for as long as its key lives and replays all of them on every
+    change, so without a new key the old checkmarks would stay on screen and come back into the selection.
+
+    Args:
+        player_id (str): Player whose editors to reset, "default" in single-player mode; every player if None
+    """
+    if player_id is None:
+        st.session_state.editor_epoch = st.session_state.get("editor_epoch", 0) + 1
+    else:
+        generations = dict(st.session_state.get("editor_generations", {}))
+        generations[player_id] = generations.get(player_id, 0) + 1
+        st.session_state.editor_generations = generations
+
+
+def reload_selections():
+    """Drop the session's selections and editors after the map file was replaced, so they are read from it again."""
+    for key in ["single_player_selected_countries", "multi_player_selections"]:
+        if key in st.session_state:
+            del st.session_state[key]
+    reset_editors()
+
+
+def autosave_callback():
+    """
+    on_change callback of the autosave checkbox: queue the session's selections when autosave is switched on,
+    so edits made before are saved too.
+    """
+    if not st.session_state.autosave:
+        return
+    writer = autosave.get_writer(DEFAULT_H5_FILE)
+    if st.session_state.current_mode == "single":
+        if 'single_player_selected_countries' in st.session_state:
+            writer.submit("default", st.session_state.single_player_selected_countries)
+    elif 'multi_player_selections' in st.session_state:
+        for player_id, selection in st.session_state.multi_player_selections.items():
+            writer.submit(player_id, selection)
+
+
+def discard_autosave(player_id=None):
+    """
+    Drop queued autosave changes that would overwrite a cleared, deleted or replaced map.
+
+    Args:
+        player_id (str): Player whose queued change to drop; every player if None
+    """
+    writer = autosave.get_writer(DEFAULT_H5_FILE, create=False)
+    if writer is not None:
+        writer.discard(player_id)
+
+
+@st.fragment(run_every=AUTOSAVE_STATUS_INTERVAL)
+def show_autosave_status():
+    """Show whether autosaved changes are still waiting to be written, refreshed on its own."""
+    writer = autosave.get_writer(DEFAULT_H5_FILE, create=False)
+    if writer is None:
+        st.caption("No changes to save yet")
+    elif writer.error:
+        st.error(writer.error)
+    elif writer.pending():
+        st.caption(f"Saving changes for {writer.pending()} player(s)...")
+    elif writer.saved_at:
+        st.caption(f"All changes saved at {time.strftime('%H:%M:%S', time.localtime(writer.saved_at))}")
+    else:
+        st.caption("No changes to save yet")
+
+
+def save_player_callback(player_id):
+    """
+    on_click callback of a player's save button in multi-player mode: write the player's selection to the map file.
+
+    Args:
+        player_id (str): Player whose selection to save
+    """
+    global players
+    # Rewrite the visited countries, keeping the visit dates of those still selected
+    selection = st.session_state.multi_player_selections.get(player_id, set())
+    h5_utils.save_selections({player_id: selection}, DEFAULT_H5_FILE)
+    reset_editors(player_id)
+    st.session_state[f"save_{player_id}_success"] = (f"Updated visited countries for {player_id}: "
+                                                     f"{len(selection)} countries marked as visited")
+    # Refresh player data
+    players = h5_utils.get_players(DEFAULT_H5_FILE)
+
+
+@st.fragment
+def show_overlap_statistics(index, player_data):
+    """
+    Show which countries the chosen players share: visited by all, by any and by at least N of them.
+
+    Args:
+        index (country_index.CountryIndex): Country index giving the columns and names
+        player_data (dict): Player ID -> {"visited": set of ISO codes}
+    """
+    import numpy as np
+    import stats_utils
+
+    st.subheader("Overlap Statistics")
+    codes = list(index.rows)
+    matrix = stats_utils.VisitMatrix.from_players(player_data, codes)
+
+    chosen = st.multiselect("Players to compare", list(player_data), default=list(player_data),
+                            key="overlap_players")
+    matrix = matrix.subset(chosen)
+    if not len(matrix):
+        st.info("Choose at least one player to compare.")
+        return
+    min_players = 1
+    if len(matrix) > 1:
+        min_players = st.slider("Visited by at least N players", 1, len(matrix), min(2, len(matrix)),
+                                key="overlap_min_players")
+
+    counts = matrix.visitor_counts()
+    shared = counts >= min_players
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Visited by All", int(matrix.visited_by_all().sum()))
+    col2.metric("Visited by Any", int(matrix.visited_by_any().sum()))
+    col3.metric(f"Visited by {min_players}+", int(shared.sum()))
+
+    with st.expander("Country and player details"):
+        order = np.argsort(-counts[shared], kind="stable")
+        rows = [index.rows[code] for code in np.asarray(codes)[shared][order]]
+        st.dataframe({"Country": index.names[rows], "Code": index.codes[rows], "Visitors": counts[shared][order]},
+                     hide_index=True, use_container_width=True)
+        st.dataframe({"Player": matrix.players, "Countries Visited": matrix.player_totals()},
+                     hide_index=True, use_container_width=True)
+
+    if len(matrix) > 1:
+        show_travel_similarity(matrix)
+
+
+def show_travel_similarity(matrix):
+    """
+    Show who travels most like whom: each player's nearest travellers and, for small groups, the full matrix.
+
+    Args:
+        matrix (stats_utils.VisitMatrix): Visits of the players to compare
+    """
+    import stats_utils
+
+    st.subheader("Travel Similarity")
+    metric = st.radio("Similarity", list(stats_utils.SIMILARITY_METRICS), format_func=str.capitalize,
+                      horizontal=True, key="similarity_metric",
+                      help="; ".join(f"{name.capitalize()}: {description}"
+                                     for name, description in stats_utils.SIMILARITY_METRICS.items()))
+
+    neighbours, scores = matrix.nearest(k=SIMILAR_TRAVELLERS, metric=metric)
+    st.dataframe({
+        "Player": matrix.players,
+        "Most Similar Travellers": [", ".join(f"{matrix.players[j]} ({score:.2f})" for j, score in zip(row, row_scores))
+                                    for row, row_scores in zip(neighbours, scores)],
+    }, hide_index=True, use_container_width=True)
+
+    if len(matrix) <= SIMILARITY_MATRIX_LIMIT:
+        with st.expander("Similarity matrix"):
+            similarity = matrix.similarity(metric)
+            st.dataframe({"Player": matrix.players,
+                          **{player: similarity[:, j].round(2) for j, player in enumerate(matrix.players)}},
+                         hide_index=True, use_container_width=True)
+
+
+@st.fragment
+def show_leaderboard(index):
+    """
+    Show the global leaderboard across all map files, served from the precomputed summary.
+
+    Args:
+        index (country_index.CountryIndex): Country index giving the country names
+    """
+    import leaderboard
+
+    st.subheader("Global Leaderboard")
+
+    def refresh_leaderboard_callback():
+        # The scan runs in a background thread, so the page stays responsive while the map files are read
+        leaderboard.refresh_in_background()
+        st.session_state.leaderboard_refreshing = True
+
+    running, _ = leaderboard.refresh_status()
+    st.button("Refresh Leaderboard", key="refresh_leaderboard_button", on_click=refresh_leaderboard_callback,
+              disabled=running)
+    if 'leaderboard_refreshing' in st.session_state and st.session_state.leaderboard_refreshing:
+        show_leaderboard_refresh_status()
+    if 'leaderboard_error' in st.session_state and st.session_state.leaderboard_error:
+        st.error(st.session_state.leaderboard_error)
+        st.session_state.leaderboard_error = None
+
+    path = leaderboard.LEADERBOARD_PATH
+    summary = load_leaderboard_summary(path, os.stat(path).st_mtime_ns) if os.path.exists(path) else None
+    if summary is None:
+        st.info("No leaderboard yet. Refresh it to rank the players of every map.")
+        return
+    rankings = summary["rankings"]
+    st.caption(f"{rankings['players']} players across {summary['maps']} maps, updated {summary['updated']}")
+
+    def country_name(code):
+        return index.names[index.rows[code]] if code in index.rows else code
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Most Countries**")
+        st.dataframe({"Player": [entry["player"] for entry in rankings["most_countries"]],
+                      "Map": [entry["map"] for entry in rankings["most_countries"]],
+                      "Countries": [entry["countries"] for entry in rankings["most_countries"]]},
+                     hide_index=True, use_container_width=True)
+    with col2:
+        st.markdown("**Rarest Travellers**", help="Sum of 1 + ln(players / visitors) over the countries visited")
+        st.dataframe({"Player": [entry["player"] for entry in rankings["rarest_travellers"]],
+                      "Map": [entry["map"] for entry in rankings["rarest_travellers"]],
+                      "Score": [entry["score"] for entry in rankings["rarest_travellers"]]},
+                     hide_index=True, use_container_width=True)
+    st.markdown("**Rarest Countries Visited**")
+    st.dataframe({"Country": [country_name(entry["code"]) for entry in rankings["rarest_countries"]],
+                  "Code": [entry["code"] for entry in rankings["rarest_countries"]],
+                  "Visitors": [entry["visitors"] for entry in rankings["rarest_countries"]]},
+                 hide_index=True, use_container_width=True)
+
+
+@st.fragment(run_every=LEADERBOARD_STATUS_INTERVAL)
+def show_leaderboard_refresh_status():
+    """Show that the leaderboard is being refreshed, and show the new one once the refresh finished."""
+    import leaderboard
+    running, error = leaderboard.refresh_status()
+    if running:
+        st.caption("Refreshing the leaderboard...")
+        return
+    st.session_state.leaderboard_refreshing = False
+    st.session_state.leaderboard_error = error
+    st.rerun()
+
+
+def single_player_mode(geo_data, index):
     st.title("Single Player Mode")
-    # Initialize if needed
-    if not os.path.exists(DEFAULT_H5_FILE):
-        h5_utils.init_h5(DEFAULT_H5_FILE)
-        h5_utils.add_player("default", "#444444", DEFAULT_H5_FILE)
-    # Get player data
+    # Get player data; main() has created the map file
     players = h5_utils.get_players(DEFAULT_H5_FILE)
     if "default" not in players:
         h5_utils.add_player("default", "#444444", DEFAULT_H5_FILE)
@@ -786,26 +1400,35 @@ def single_player_mode(geo_data, countries):
     if 'single_player_show_map' not in st.session_state:
         st.session_state.single_player_show_map = False
 
+    single_player_selection(geo_data, index, players.get("default", {}).get("colour", "#444444"))
+
+
+@st.fragment
+def single_player_selection(geo_data, index, colour):
+    """
+    Country editor, statistics and map of single-player mode, rerun on their own when the selection changes.
+
+    Args:
+        geo_data (dict): Country data for the map
+        index (country_index.CountryIndex): Country index for the editor and statistics
+        colour (str): Colour of the player on the map
+    """
     # Country selection
     with st.container():
         st.subheader("Select Countries You've Visited")
 
         # Search box for countries
-        search_term = st.text_input("Search for a country", key="single_player_search")
+        search_term = st.text_input("Search for a country", key="single_player_search",
+                                    help="Search by name, ISO code (e.g. FR or FRA) or common alias (e.g. USA)")
 
-        # Filter countries based on search
-        filtered_countries = countries
-        if search_term:
-            filtered_countries = [c for c in countries if search_term.lower() in c['name'].lower()]
+        # Filter countries based on search and take the rows from the cached base table
+        rows = index.search(search_term)
+        df = index.frame(rows, selected=st.session_state.single_player_selected_countries)
 
-        # Create a DataFrame for easier display
-        df = pd.DataFrame(filtered_countries)
-
-        # Set 'Visited' based on session state selected countries
-        df['Visited'] = df['code'].apply(lambda x: x in st.session_state.single_player_selected_countries)
-
-        # Display as a table with checkboxes
-        edited_df = st.data_editor(
+        # Display as a table with checkboxes; edits are applied to the selection by the on_change callback.
+        # The search term is part of the key so row positions of one result list never carry over to another.
+        editor_key = f"single_player_data_editor_{editor_generation('default')}_{search_term}"
+        st.data_editor(
             df,
             column_config={
                 "name": "Country",
@@ -819,57 +1442,63 @@ def single_player_mode(geo_data, countries):
             hide_index=True,
             use_container_width=True,
             num_rows="fixed",
-            key="single_player_data_editor"
+            disabled=["name", "code"],
+            key=editor_key,
+            on_change=sync_editor_selection,
+            args=(editor_key, index.codes[rows])
         )
 
-        # Update selected countries in session state based on edited data
-        for _, row in edited_df.iterrows():
-            if row['Visited'] and row['code'] not in st.session_state.single_player_selected_countries:
-                st.session_state.single_player_selected_countries.add(row['code'])
-            elif not row['Visited'] and row['code'] in st.session_state.single_player_selected_countries:
-                st.session_state.single_player_selected_countries.remove(row['code'])
-        col1, col2 = st.columns([1, 1])
-        with col1:
-            # Callback function for save selected countries button
-            def save_countries_callback():
-                global players
-                # Clear existing visits
-                h5_utils.clear_player_visits("default", DEFAULT_H5_FILE)
-                # Add new visits
-                if st.session_state.single_player_selected_countries:
-                    h5_utils.update_visits("default", list(st.session_state.single_player_selected_countries),
-                                           DEFAULT_H5_FILE)
-                visit_count = len(st.session_state.single_player_selected_countries)
-                st.session_state.save_countries_success = (f"Updated visited countries: {visit_count} countries marked "
-                                                           f"as visited")
-                # Refresh player data
-                players = h5_utils.get_players(DEFAULT_H5_FILE)
-
-            st.button("Save Selected Countries", key="single_player_save", on_click=save_countries_callback)
-
-            # Display success message if it exists
-            if 'save_countries_success' in st.session_state and st.session_state.save_countries_success:
-                st.success(st.session_state.save_countries_success)
-                st.session_state.save_countries_success = None
+        # Callback function for save selected countries button
+        def save_countries_callback():
+            global players
+            # Rewrite the visited countries, keeping the visit dates of those still selected
+            h5_utils.save_selections({"default": st.session_state.single_player_selected_countries},
+                                     DEFAULT_H5_FILE)
+            reset_editors("default")
+            visit_count = len(st.session_state.single_player_selected_countries)
+            st.session_state.save_countries_success = (f"Updated visited countries: {visit_count} countries marked "
+                                                       f"as visited")
+            # Refresh player data
+            players = h5_utils.get_players(DEFAULT_H5_FILE)
 
-        with col2:
-            # Callback function for toggle map button
-            def toggle_map_callback():
-                st.session_state.single_player_show_map = not st.session_state.single_player_show_map
+        st.button("Save Selected Countries", key="single_player_save", on_click=save_countries_callback)
 
-            # Toggle map display
-            st.button("Show Map" if not st.session_state.single_player_show_map else "Hide Map",
-                      key="single_player_toggle_map", on_click=toggle_map_callback)
+        # Display success message if it exists
+        if 'save_countries_success' in st.session_state and st.session_state.save_countries_success:
+            st.success(st.session_state.save_countries_success)
+            st.session_state.save_countries_success = None
 
     # Display stats
     st.subheader("Statistics")
-    total_countries = len(countries)
-    visited_count = len(st.session_state.single_player_selected_countries)
-    visited_percent = (visited_count / total_countries) * 100 if total_countries > 0 else 0
+    summary = index.summary(st.session_state.single_player_selected_countries)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Countries", len(index))
+    col2.metric("Countries Visited", summary["countries"])
+    col3.metric("Percentage Visited", f"{summary['country_share'] * 100:.1f}%")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Countries", total_countries)
-    col2.metric("Countries Visited", visited_count)
-    col3.metric("Percentage Visited", f"{visited_percent:.1f}%")
+    col1.metric("Continents Visited", summary["continents"])
+    col2.metric("Share of World Area", f"{summary['area_share'] * 100:.1f}%")
+    col3.metric("Share of World Population", f"{summary['population_share'] * 100:.1f}%")
+
+    single_player_map(geo_data, colour)
+
+
+@st.fragment
+def single_player_map(geo_data, colour):
+    """
+    Map of single-player mode; showing or hiding it reruns only this fragment.
+
+    Args:
+        geo_data (dict): Country data for the map
+        colour (str): Colour of the player on the map
+    """
+    # Callback function for toggle map button
+    def toggle_map_callback():
+        st.session_state.single_player_show_map = not st.session_state.single_player_show_map
+
+    # Toggle map display
+    st.button("Show Map" if not st.session_state.single_player_show_map else "Hide Map",
+              key="single_player_toggle_map", on_click=toggle_map_callback)
 
     # Display map only if requested
     if st.session_state.single_player_show_map:
@@ -878,85 +1507,27 @@ def single_player_mode(geo_data, countries):
         # Create a temporary players dict with current selections for the map
         temp_players = {
             "default": {
-                "colour": players.get("default", {}).get("colour", "#444444"),
+                "colour": colour,
                 "visited": st.session_state.single_player_selected_countries
             }
         }
 
-        # Add a placeholder to ensure something is displayed - defining outside try block
+        # Add a placeholder to ensure something is displayed
         map_placeholder = st.empty()
         map_placeholder.info("Rendering map... Please wait.")
 
-        # Initialize m with a default value
-        m = None
-
         try:
-            m = build_map(temp_players, geo_data)
-            try:
-                # Only try to render if m was successfully created
-                if m is not None:
-                    # Try to render the map with folium_static
-                    folium_static(m, width=1200, height=600)
-                    # Clear the placeholder if successful
-                    map_placeholder.empty()
-                else:
-                    st.error("Failed to build map")
-                    map_placeholder.empty()
-            except Exception as folium_error:
-                import traceback
-                # Try alternative rendering method
-                try:
-                    # Convert map to HTML and display with st.markdown
-                    map_html = m.get_root().render()
-                    map_placeholder.empty()  # Clear the placeholder
-                    st.markdown(map_html, unsafe_allow_html=True)
-                    st.success("Map rendered using alternative method.")
-                except (ValueError, RuntimeError, AttributeError) as render_error:
-                    map_placeholder.empty()  # Clear the placeholder
-                    st.error(f"Error displaying map: {str(folium_error)}")
-                    st.info(f"Alternative rendering failed: {str(render_error)}")
-                    st.info("This could be due to an issue with the map data or the Folium library.")
-                    # Display a message with a placeholder for the map
-                    st.warning("Map could not be displayed. Please try refreshing the page or creating a new map.")
-        except (ValueError, KeyError, ImportError, IOError, AttributeError) as build_error:
-            st.error(f"Error creating map: {str(build_error)}")
-            st.info("This could be due to an issue with the map data or the Folium library.")
-            # Display a message with a placeholder for the map
-            st.warning("Map could not be created. Please try refreshing the page or creating a new map.")
-            try:
-                # Try to render the map with folium_static
-                folium_static(m, width=1200, height=600)
-                # Clear the placeholder if successful
-                map_placeholder.empty()
-            except Exception as folium_error:
-                import traceback
-                # Try alternative rendering method
-                try:
-                    # Only attempt alternative rendering if m exists
-                    if m is not None:
-                        # Convert map to HTML and display with st.markdown
-                        map_html = m.get_root().render()
-                        map_placeholder.empty()  # Clear the placeholder
-                        st.markdown(map_html, unsafe_allow_html=True)
-                        st.success("Map rendered using alternative method.")
-                    else:
-                        map_placeholder.empty()
-                        st.error("Failed to build map")
-                except (ValueError, RuntimeError, AttributeError) as render_error:
-                    map_placeholder.empty()  # Clear the placeholder
-                    st.error(f"Error displaying map: {str(folium_error)}")
-                    st.info(f"Alternative rendering failed: {str(render_error)}")
-                    st.info("This could be due to an issue with the map data or the Folium library.")
-                    # Display a message with a placeholder for the map
-                    st.warning("Map could not be displayed. Please try refreshing the page or creating a new map.")
-        except (ValueError, KeyError, ImportError, IOError, AttributeError) as build_error:
-            st.error(f"Error creating map: {str(build_error)}")
+            render_map(temp_players, geo_data, key="single_player_map")
+            map_placeholder.empty()
+            map_png_download(temp_players, geo_data, key="single_player_download_map")
+        except Exception as map_error:
+            map_placeholder.empty()
+            st.error(f"Error creating map: {str(map_error)}")
             st.info("This could be due to an issue with the map data or the Folium library.")
-            # Display a message with a placeholder for the map
-            st.warning("Map could not be created. Please try refreshing the page or creating a new map.")
+            st.warning("Map could not be displayed. Please try refreshing the page or creating a new map.")
 
 
-def multi_player_mode(geo_data, countries, palettes):
+def multi_player_mode(geo_data, index, palettes):
     global players
 
     # Handle all button clicks and state changes BEFORE rendering UI
@@ -1001,11 +1572,13 @@ def multi_player_mode(geo_data, countries, palettes):
         if player_select_key in st.session_state and st.session_state[player_select_key]:
             selected_player = st.session_state[player_select_key]
 
+            discard_autosave(selected_player)
             h5_utils.delete_player(selected_player, DEFAULT_H5_FILE)
             # Also remove from session state
             if ('multi_player_selections' in st.session_state and
                     selected_player in st.session_state.multi_player_selections):
                 del st.session_state.multi_player_selections[selected_player]
+            reset_editors(selected_player)
             st.session_state.delete_player_success = f"Deleted player: {selected_player}"
 
             # Refresh player data
@@ -1031,11 +1604,13 @@ def multi_player_mode(geo_data, countries, palettes):
             selected_player = st.session_state[player_select_key]
 
             # Clear in database
+            discard_autosave(selected_player)
             h5_utils.clear_player_visits(selected_player, DEFAULT_H5_FILE)
             # Clear in session state
             if ('multi_player_selections' in st.session_state and
                     selected_player in st.session_state.multi_player_selections):
                 st.session_state.multi_player_selections[selected_player] = set()
+            reset_editors(selected_player)
             st.session_state.clear_countries_success = f"Cleared visited countries for: {selected_player}"
 
             # Refresh player data
@@ -1047,81 +1622,18 @@ def multi_player_mode(geo_data, countries, palettes):
         st.session_state.save_all_players_button = False
 
         if 'multi_player_selections' in st.session_state:
-            # Save all players' selections to the database
-            for playerid, selectedcountries in st.session_state.multi_player_selections.items():
-                if playerid in players:  # Only save for existing players
-                    # Clear existing visits
-                    h5_utils.clear_player_visits(playerid, DEFAULT_H5_FILE)
-                    # Add new visits
-                    if selectedcountries:
-                        h5_utils.update_visits(playerid, list(selectedcountries), DEFAULT_H5_FILE)
+            # Save all players' selections to the database in one write, keeping their visit dates
+            h5_utils.save_selections({playerid: selectedcountries for playerid, selectedcountries
+                                      in st.session_state.multi_player_selections.items()
+                                      if playerid in players}, DEFAULT_H5_FILE)  # Only existing players
+            reset_editors()
             st.session_state.save_all_players_success = "Saved all players' country selections"
             # Refresh player data
             players = h5_utils.get_players(DEFAULT_H5_FILE)
 
-    # Handle individual player save button clicks
-    for player_id in players.keys() if players else []:
-        save_key = f"save_{player_id}"
-        if save_key in st.session_state and st.session_state[save_key]:
-            # Reset button state
-            st.session_state[save_key] = False
-
-            # Clear existing visits
-            h5_utils.clear_player_visits(player_id, DEFAULT_H5_FILE)
-            # Add new visits
-            if ('multi_player_selections' in st.session_state and
-                    player_id in st.session_state.multi_player_selections and
-                    st.session_state.multi_player_selections[player_id]):
-                # Update player's visited countries in the database
-                selections = list(st.session_state.multi_player_selections[player_id])
-                h5_utils.update_visits(player_id, selections, DEFAULT_H5_FILE)
-            # Get count of visited countries for this player
-            visited_count = len(st.session_state.multi_player_selections.get(player_id, set()))
-            # Create success message
-            successkey = f"save_{player_id}_success"
-            success_msg = f"Updated visited countries for {player_id}: {visited_count} countries marked as visited"
-            st.session_state[successkey] = success_msg
-            # Refresh player data
-            players = h5_utils.get_players(DEFAULT_H5_FILE)
-
-    # Handle toggle map button click
-    if 'multi_player_toggle_map' in st.session_state and st.session_state.multi_player_toggle_map:
-        # Reset button state
-        st.session_state.multi_player_toggle_map = False
-
-        # Toggle map display state
-        if 'multi_player_show_map' in st.session_state:
-            st.session_state.multi_player_show_map = not st.session_state.multi_player_show_map
-        else:
-            st.session_state.multi_player_show_map = True
-
-    # Process data editor changes for each player
-    if 'multi_player_selections' in st.session_state and players:
-        for player_id in players:
-            editor_key = f"multi_player_{player_id}_data_editor"
-            if editor_key in st.session_state and st.session_state[editor_key] is not None:
-                edited_df = st.session_state[editor_key]
-                if isinstance(edited_df, pd.DataFrame):
-                    # Ensure this player has an entry in the session state
-                    if player_id not in st.session_state.multi_player_selections:
-                        st.session_state.multi_player_selections[player_id] = players[player_id]["visited"].copy()
-
-                    # Update selected countries in session state based on edited data
-                    for _, row in edited_df.iterrows():
-                        if 'Visited' in row and 'code' in row:
-                            if row['Visited'] and row['code'] not in st.session_state.multi_player_selections[
-                                    player_id]:
-                                st.session_state.multi_player_selections[player_id].add(row['code'])
-                            elif not row['Visited'] and row['code'] in st.session_state.multi_player_selections[
-                                    player_id]:
-                                st.session_state.multi_player_selections[player_id].remove(row['code'])
-
     # Now begin rendering UI
     st.title("Multi-Player Mode")
-    # Initialize if needed
-    if not os.path.exists(DEFAULT_H5_FILE):
-        h5_utils.init_h5(DEFAULT_H5_FILE)
-    # Get player data
+    # Get player data; main() has created the map file
     players = h5_utils.get_players(DEFAULT_H5_FILE)
 
     # Initialize session state for showing map
@@ -1235,7 +1747,7 @@ def multi_player_mode(geo_data, countries, palettes):
         if player_select_key not in st.session_state and players:
             st.session_state[player_select_key] = list(players.keys())[0]
 
-        selected_player = st.selectbox("Select Player to Edit", list(players.keys()), key=player_select_key)
+        st.selectbox("Select Player to Edit", list(players.keys()), key=player_select_key)
 
         # Player actions
         col1, col2, col3 = st.columns(3)
@@ -1266,61 +1778,100 @@ def multi_player_mode(geo_data, countries, palettes):
                 st.success(st.session_state.save_all_players_success)
                 st.session_state.save_all_players_success = None
 
-        # Country selection for the selected player
-        if selected_player in players:
-            st.subheader(f"Countries Visited by {selected_player}")
-
-            # Ensure this player has an entry in the session state
-            if selected_player not in st.session_state.multi_player_selections:
-                st.session_state.multi_player_selections[selected_player] = players[selected_player]["visited"].copy()
-
-            # Search box for countries
-            search_term = st.text_input(f"Search for a country to add to {selected_player}'s visits",
-                                        key=f"search_{selected_player}")
-
-            # Filter countries based on search
-            filtered_countries = countries
-            if search_term:
-                filtered_countries = [c for c in countries if search_term.lower() in c['name'].lower()]
-
-            # Create a DataFrame for easier display
-            df = pd.DataFrame(filtered_countries)
-
-            # Set 'Visited' based on session state selected countries
-            df['Visited'] = df['code'].apply(lambda x: x in st.session_state.multi_player_selections[selected_player])
-
-            # Display as a table with checkboxes
-            st.data_editor(
-                df,
-                column_config={
-                    "name": "Country",
-                    "code": "Code",
-                    "Visited": st.column_config.CheckboxColumn(
-                        "Visited",
-                        help="Check if this player has visited this country",
-                        default=False,
-                    )
-                },
-                hide_index=True,
-                use_container_width=True,
-                num_rows="fixed",
-                key=f"multi_player_{selected_player}_data_editor"
-            )
-
-            # Button with no callback - handled at beginning of function
-            st.button(f"Save {selected_player}'s Countries", key=f"save_{selected_player}")
-
-            # Display success message if it exists
-            success_key = f"save_{selected_player}_success"
-            if success_key in st.session_state and st.session_state[success_key]:
-                st.success(st.session_state[success_key])
-                st.session_state[success_key] = None
     else:
         st.info("No players yet. Add a player to get started!")
 
-    # Button with no callback - handled at beginning of function
+    if players:
+        multi_player_selection(geo_data, index, players)
+
+    # Rankings across every map file, from the precomputed summary
+    with st.expander("Global Leaderboard"):
+        show_leaderboard(index)
+
+
+@st.fragment
+def multi_player_selection(geo_data, index, players):
+    """
+    Country editor of the selected player, overlap statistics and map of multi-player mode,
+    rerun on their own when a selection changes.
+
+    Args:
+        geo_data (dict): Country data for the map
+        index (country_index.CountryIndex): Country index for the editor and statistics
+        players (dict): Player ID -> {"colour", "visited"}, as returned by h5_utils.get_players()
+    """
+    selected_player = st.session_state.get("selected_player_to_edit")
+
+    # Country selection for the selected player
+    if selected_player in players:
+        st.subheader(f"Countries Visited by {selected_player}")
+
+        # Ensure this player has an entry in the session state
+        if selected_player not in st.session_state.multi_player_selections:
+            st.session_state.multi_player_selections[selected_player] = players[selected_player]["visited"].copy()
+
+        # Search box for countries
+        search_term = st.text_input(f"Search for a country to add to {selected_player}'s visits",
+                                    key=f"search_{selected_player}",
+                                    help="Search by name, ISO code (e.g. FR or FRA) or common alias (e.g. USA)")
+
+        # Filter countries based on search and take the rows from the cached base table
+        rows = index.search(search_term)
+        df = index.frame(rows, selected=st.session_state.multi_player_selections[selected_player])
+
+        # Display as a table with checkboxes; edits are applied to the selection by the on_change callback
+        editor_key = f"multi_player_{selected_player}_data_editor_{editor_generation(selected_player)}_{search_term}"
+        st.data_editor(
+            df,
+            column_config={
+                "name": "Country",
+                "code": "Code",
+                "Visited": st.column_config.CheckboxColumn(
+                    "Visited",
+                    help="Check if this player has visited this country",
+                    default=False,
+                )
+            },
+            hide_index=True,
+            use_container_width=True,
+            num_rows="fixed",
+            disabled=["name", "code"],
+            key=editor_key,
+            on_change=sync_editor_selection,
+            args=(editor_key, index.codes[rows], selected_player)
+        )
+
+        st.button(f"Save {selected_player}'s Countries", key=f"save_{selected_player}",
+                  on_click=save_player_callback, args=(selected_player,))
+
+        # Display success message if it exists
+        success_key = f"save_{selected_player}_success"
+        if success_key in st.session_state and st.session_state[success_key]:
+            st.success(st.session_state[success_key])
+            st.session_state[success_key] = None
+
+    # Overlap statistics over the current selections
+    show_overlap_statistics(index, {player_id: {"visited": st.session_state.multi_player_selections.get(
+        player_id, set())} for player_id in players})
+
+    multi_player_map(geo_data, players)
+
+
+@st.fragment
+def multi_player_map(geo_data, players):
+    """
+    Map of multi-player mode; showing or hiding it reruns only this fragment.
+
+    Args:
+        geo_data (dict): Country data for the map
+        players (dict): Player ID -> {"colour", "visited"}, as returned by h5_utils.get_players()
+    """
+    # Callback function for toggle map button
+    def toggle_map_callback():
+        st.session_state.multi_player_show_map = not st.session_state.multi_player_show_map
+
     st.button("Show Map" if not st.session_state.multi_player_show_map else "Hide Map",
-              key="multi_player_toggle_map")
+              key="multi_player_toggle_map", on_click=toggle_map_callback)
 
     # Display map only if requested
     if st.session_state.multi_player_show_map:
@@ -1334,47 +1885,20 @@ def multi_player_mode(geo_data, countries, palettes):
                 "visited": st.session_state.multi_player_selections.get(player_id, set())
             }
 
-        # Add a placeholder to ensure something is displayed - defining outside try block
+        # Add a placeholder to ensure something is displayed
         map_placeholder = st.empty()
         map_placeholder.info("Rendering map... Please wait.")
 
         try:
-            m = build_map(temp_players, geo_data)
-            if m is not None:
-                try:
-                    # Try to render the map with folium_static
-                    folium_static(m, width=1200, height=600)
-                    # Clear the placeholder if successful
-                    map_placeholder.empty()
-                except (RuntimeError, ValueError, TypeError) as folium_error:
-                    # Try alternative rendering method with specific error handling
-                    try:
-                        # Convert map to HTML and display with st.markdown
-                        map_html = m.get_root().render()
-                        map_placeholder.empty()  # Clear the placeholder
-                        st.markdown(map_html, unsafe_allow_html=True)
-                        st.success("Map rendered using alternative method.")
-                    except (ValueError, RuntimeError, AttributeError) as render_error:
-                        map_placeholder.empty()  # Clear the placeholder
-                        st.error(f"Error displaying map: {str(folium_error)}")
-                        st.info(f"Alternative rendering failed: {str(render_error)}")
-                        st.warning("Map could not be displayed. Please try refreshing the page or creating a new map.")
-            else:
-                map_placeholder.empty()
-                st.error("Failed to build map")
+            render_map(temp_players, geo_data, key="multi_player_map")
+            map_placeholder.empty()
+            map_png_download(temp_players, geo_data, key="multi_player_download_map")
         except Exception as map_error:
+            map_placeholder.empty()
             st.error(f"Error creating map: {str(map_error)}")
             st.warning("Map could not be created. Please try refreshing the page or creating a new map.")
 
 
-# Check essential requirements
-if not os.path.exists("JSON"):
-    print("ERROR: JSON directory not found!")
-elif not os.path.exists(GEOJSON_PATH):
-    print(f"ERROR: countries.geojson not found: {os.path.abspath(GEOJSON_PATH)}")
-elif not os.path.exists(os.path.join("JSON", "palettes.json")):
-    print(f"ERROR: palettes.json not found: {os.path.abspath(os.path.join('JSON', 'palettes.json'))}")
-
 try:
     # Force Streamlit to show something
     st.empty()
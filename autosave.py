@@ -0,0 +1,241 @@
+"""
+Background autosave of country selections.
+
+Selection changes are queued per player and written by one writer thread per
+map file, so saving never blocks a script run. A player's queued selection
+is replaced by each newer one, so a burst of checkbox edits becomes a single
+write: the writer waits until no change has arrived for AUTOSAVE_DELAY
+seconds (but at most AUTOSAVE_MAX_DELAY after the first one), then writes
+every queued player with one h5_utils.save_selections() call. A failed write
+is queued again unless a newer selection arrived meanwhile, so no edit is
+dropped. discard() bumps a per-player generation, so a batch the writer has
+already taken is neither written nor queued again for a player cleared or
+deleted meanwhile. flush() writes at once and waits, for logout; every
+writer is flushed at interpreter exit.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+import h5_utils
+
+# Autosave configuration
+# AUTOSAVE turns autosave on by default for new sessions; each session can still switch it
+AUTOSAVE = os.environ.get('AUTOSAVE', 'False').lower() == 'true'
+AUTOSAVE_DELAY = float(os.environ.get('AUTOSAVE_DELAY', 2.0))
+AUTOSAVE_MAX_DELAY = float(os.environ.get('AUTOSAVE_MAX_DELAY', 10.0))
+# Longest wait for queued changes on logout and at exit
+AUTOSAVE_FLUSH_TIMEOUT = float(os.environ.get('AUTOSAVE_FLUSH_TIMEOUT', 10.0))
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class AutosaveWriter:
+    """
+    Writer thread coalescing the selection changes of one map file.
+
+    Attributes:
+        filename (str): Path to the HDF5 map file
+        delay (float): Seconds without changes before a batch is written
+        max_delay (float): Longest wait in seconds between the first queued change and its write
+        saved_at (float): time.time() of the last successful write, None before the first one
+        error (str): Message of the last failed write, None once a write succeeds
+    """
+
+    def __init__(self, filename, delay=AUTOSAVE_DELAY, max_delay=AUTOSAVE_MAX_DELAY):
+        """
+        Args:
+            filename (str): Path to the HDF5 map file
+            delay (float): Seconds without changes before a batch is written
+            max_delay (float): Longest wait in seconds between the first queued change and its write
+        """
+        self.filename = filename
+        self.delay = delay
+        self.max_delay = max_delay
+        self.saved_at = None
+        self.error = None
+        self._pending = {}
+        # Player -> generation, bumped by discard(); queued selections remember the generation they were made in
+        self._generations = {}
+        self._epoch = 0
+        self._first = None
+        self._last = None
+        self._writing = 0
+        self._attempts = 0
+        self._flush = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"autosave-{filename}", daemon=True)
+        self._thread.start()
+
+    def submit(self, player_id, codes):
+        """
+        Queue a player's current selection, replacing any queued one.
+        Args:
+            player_id (str): Player whose selection changed
+            codes (iterable): ISO codes of the whole selection, copied
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._pending[player_id] = (self._generation(player_id), frozenset(codes))
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._condition.notify_all()
+
+    def discard(self, player_id=None):
+        """
+        Drop queued changes, e.g. when a player is cleared or deleted or the map is replaced.
+
+        Changes of a batch being written are dropped too: they are skipped if the write has not started
+        yet and not retried if it fails.
+        Args:
+            player_id (str): Player whose queued change to drop; all players if None
+        """
+        with self._condition:
+            if player_id is None:
+                self._pending.clear()
+                self._epoch += 1
+            else:
+                self._pending.pop(player_id, None)
+                self._generations[player_id] = self._generations.get(player_id, 0) + 1
+            if not self._pending:
+                self._first = self._last = None
+            self._condition.notify_all()
+
+    def pending(self):
+        """
+        Count the players with changes not yet written.
+        Returns:
+            int: Players queued or being written
+        """
+        with self._condition:
+            return len(self._pending) + self._writing
+
+    def flush(self, timeout=AUTOSAVE_FLUSH_TIMEOUT):
+        """
+        Write the queued changes now and wait for them.
+        Args:
+            timeout (float): Longest wait in seconds; None waits until done
+        Returns:
+            bool: True if everything queued is written, False on a write error or timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            attempts = self._attempts
+            self._flush = True
+            self._condition.notify_all()
+            while self._pending or self._writing:
+                if self._attempts > attempts and self.error is not None:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self, timeout=AUTOSAVE_FLUSH_TIMEOUT):
+        """
+        Flush the queued changes and stop the writer thread.
+        Args:
+            timeout (float): Longest wait in seconds for the flush
+        Returns:
+            bool: True if everything queued was written
+        """
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        return flushed
+
+    def _generation(self, player_id):
+        """Current generation of a player's selections; call with the condition held."""
+        return self._epoch, self._generations.get(player_id, 0)
+
+    def _current(self, batch):
+        """The entries of a batch not discarded since they were queued; call with the condition held."""
+        return {player_id: entry for player_id, entry in batch.items()
+                if entry[0] == self._generation(player_id)}
+
+    def _due_in(self):
+        """Seconds until the queued batch is due, 0 if due now, None if nothing is queued."""
+        if not self._pending:
+            return None
+        if self._flush or self._closed:
+            return 0
+        return max(0.0, min(self._last + self.delay, self._first + self.max_delay) - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    due_in = self._due_in()
+                    if due_in == 0:
+                        break
+                    if due_in is None and self._closed:
+                        return
+                    self._condition.wait(due_in)
+                batch, self._pending = self._pending, {}
+                self._first = self._last = None
+                self._writing = len(batch)
+                self._flush = False
+
+            try:
+                # Hold the file lock from the generation check to the end of the write, so a discard() and the
+                # clear or delete it precedes cannot slip in between
+                with h5_utils.FILE_LOCK:
+                    with self._condition:
+                        batch = self._current(batch)
+                        self._writing = len(batch)
+                    if batch:
+                        h5_utils.save_selections({player_id: codes for player_id, (_, codes) in batch.items()},
+                                                 self.filename)
+                error = None
+            except Exception as write_error:
+                error = f"Error autosaving {self.filename}: {str(write_error)}"
+                print(error)
+
+            with self._condition:
+                self._writing = 0
+                self._attempts += 1
+                self.error = error
+                if error is None:
+                    self.saved_at = time.time()
+                elif not self._closed:
+                    # Retry after the usual delay, keeping any newer selection queued meanwhile and dropping
+                    # players discarded meanwhile
+                    for player_id, entry in self._current(batch).items():
+                        self._pending.setdefault(player_id, entry)
+                    now = time.monotonic()
+                    self._first = self._first or now
+                    self._last = now
+                self._condition.notify_all()
+
+
+def get_writer(filename, create=True):
+    """
+    Get the process-wide autosave writer of a map file.
+    Args:
+        filename (str): Path to the HDF5 map file
+        create (bool): Start a writer if the file has none yet
+    Returns:
+        AutosaveWriter: The file's writer, or None if it has none and create is False
+    """
+    key = os.path.abspath(filename)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None and create:
+            writer = _writers[key] = AutosaveWriter(filename)
+        return writer
+
+
+@atexit.register
+def close_all():
+    """Flush and stop every writer; runs at interpreter exit."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,43 @@
+"""
+Build script for the map's derived geometry assets.
+Reads JSON/countries.geojson and writes the simplified geometry levels
+that the app embeds into the map instead of the full-resolution file,
+plus compact TopoJSON copies of the full-resolution file and of each level,
+and the binary country bundle the app starts from.
+"""
+
+import argparse
+import os
+import sys
+
+import bundle_utils
+import geo_utils
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build simplified country geometries for the map.")
+    parser.add_argument("--source", default=geo_utils.DEFAULT_GEOJSON_PATH,
+                        help="Path to the full-resolution countries GeoJSON file")
+    parser.add_argument("--levels", nargs="+", choices=list(geo_utils.GEOMETRY_LEVELS),
+                        help="Levels to build (default: all)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"GeoJSON file not found: {args.source}")
+        print(f"Current working directory: {os.getcwd()}")
+        sys.exit(1)
+
+    source_size = os.path.getsize(args.source)
+    print(f"Source: {args.source} ({source_size / 1024:.0f} KiB)")
+    for level, (path, size) in geo_utils.build_geometry_levels(args.source, args.levels).items():
+        print(f"  {level:<8} {path} ({size / 1024:.0f} KiB, {100 * size / source_size:.1f}% of source)")
+    for level, (path, size) in geo_utils.build_topojson_assets(args.source, args.levels).items():
+        print(f"  {level or 'full':<8} {path} ({size / 1024:.0f} KiB, {100 * size / source_size:.1f}% of source)")
+    # The app loads the TopoJSON asset when it exists, so bundle the file it will actually read
+    topojson_source = geo_utils.topojson_path(source_path=args.source)
+    bundle_source = topojson_source if os.path.exists(topojson_source) else args.source
+    print(f"  bundle   {bundle_utils.build_country_bundle(bundle_source)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Precompiled binary cache of the country dataset.
+
+A bundle is a directory of .npy files next to the country data file, built
+from it once and reused by every new server process until the source changes:
+
+- code.npy, name.npy and one column per GeoJSON property (numbers keep
+  their type, anything else is stored as a string)
+- coords.npy with every ring's coordinates, plus ring, polygon and feature
+  offsets into it (a ring i is coords[ring_offsets[i]:ring_offsets[i + 1]])
+- meta.json with the format version and the size, mtime and SHA-256 of the source
+
+All arrays are loaded with memory mapping, so opening a bundle costs a few
+file reads regardless of the size of the dataset.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+import geo_utils
+
+BUNDLE_FORMAT = 1
+ISO_PROPERTY = "ISO3166-1-Alpha-2"
+
+
+def bundle_path(source_path=geo_utils.DEFAULT_GEOJSON_PATH):
+    """
+    Get the bundle directory of a country data file.
+    Args:
+        source_path (str): Path to the GeoJSON or TopoJSON country file
+    Returns:
+        str: e.g. JSON/countries.geojson.bundle
+    """
+    return f"{source_path}.bundle"
+
+
+def _file_digest(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _property_column(values):
+    """Store a property as the narrowest array that keeps its values' types."""
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return np.array([0 if value is None else value for value in values], dtype=np.int64)
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return np.array(["" if value is None else str(value) for value in values], dtype=np.str_)
+
+
+class CountryBundle:
+    """
+    Memory-mapped columns of the country dataset.
+
+    Attributes:
+        codes (numpy.ndarray): ISO code of every feature
+        names (numpy.ndarray): Name of every feature
+        properties (dict): Property name -> column, in the source's key order
+        present (numpy.ndarray): (features, properties) mask of the properties each feature has
+        coords, ring_offsets, polygon_offsets, feature_offsets (numpy.ndarray): Geometry arrays
+        meta (dict): Contents of meta.json
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Bundle directory written by build_country_bundle()
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.codes = load("code")
+        self.names = load("name")
+        self.properties = {key: load(f"property_{i}") for i, key in enumerate(self.meta["properties"])}
+        self.present = load("present")
+        self.coords = load("coords")
+        self.ring_offsets = load("ring_offsets")
+        self.polygon_offsets = load("polygon_offsets")
+        self.feature_offsets = load("feature_offsets")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def countries(self):
+        """
+        Get the country list shown by the app.
+        Returns:
+            list: {"name", "code"} dicts sorted by name, without non-country features
+        """
+        keep = (self.codes != "") & (self.codes != "-99")
+        order = np.argsort(self.names[keep], kind="stable")
+        names = self.names[keep][order].tolist()
+        codes = self.codes[keep][order].tolist()
+        return [{"name": name, "code": code} for name, code in zip(names, codes)]
+
+    def feature_properties(self, i):
+        """Get the properties of feature i as a dict with the source's types."""
+        return {key: column[i].item() for (key, column), has in zip(self.properties.items(), self.present[i])
+                if has}
+
+    def to_geojson(self):
+        """
+        Rebuild the country data as a GeoJSON FeatureCollection.
+        Returns:
+            dict: FeatureCollection with Polygon/MultiPolygon geometries
+        """
+        points = np.asarray(self.coords).tolist()
+        ring_offsets = np.asarray(self.ring_offsets).tolist()
+        polygon_offsets = np.asarray(self.polygon_offsets).tolist()
+        feature_offsets = np.asarray(self.feature_offsets).tolist()
+        rings = [points[start:end] for start, end in zip(ring_offsets[:-1], ring_offsets[1:])]
+        polygons = [rings[start:end] for start, end in zip(polygon_offsets[:-1], polygon_offsets[1:])]
+
+        features = []
+        for i, (start, end) in enumerate(zip(feature_offsets[:-1], feature_offsets[1:])):
+            if end - start == 0:
+                geometry = None
+            elif end - start == 1:
+                geometry = {"type": "Polygon", "coordinates": polygons[start]}
+            else:
+                geometry = {"type": "MultiPolygon", "coordinates": polygons[start:end]}
+            features.append({"type": "Feature", "properties": self.feature_properties(i), "geometry": geometry})
+        return {"type": "FeatureCollection", "features": features}
+
+
+def build_country_bundle(source_path, geo_data=None):
+    """
+    Compile a country data file into a bundle next to it.
+    Args:
+        source_path (str): Path to the GeoJSON or TopoJSON country file
+        geo_data (dict): The file's parsed contents, if already loaded
+    Returns:
+        str: Path of the bundle directory
+    """
+    stat = os.stat(source_path)
+    if geo_data is None:
+        with open(source_path, encoding="utf-8") as f:
+            geo_data = json.load(f)
+    if geo_utils.is_topology(geo_data):
+        geo_data = geo_utils.topojson_to_geojson(geo_data)
+    features = geo_data.get("features", [])
+    properties = [feature["properties"] for feature in features]
+    keys = list(dict.fromkeys(key for props in properties for key in props))
+
+    coords, ring_offsets, polygon_offsets, feature_offsets = geo_utils.flatten_geometry(features)
+
+    arrays = {
+        "code": np.array([props.get(ISO_PROPERTY, "") for props in properties], dtype=np.str_),
+        "name": np.array([props.get("name", "") for props in properties], dtype=np.str_),
+        "present": np.array([[key in props for key in keys] for props in properties],
+                            dtype=bool).reshape(-1, len(keys)),
+        "coords": coords,
+        "ring_offsets": ring_offsets,
+        "polygon_offsets": polygon_offsets,
+        "feature_offsets": feature_offsets,
+    }
+    for i, key in enumerate(keys):
+        arrays[f"property_{i}"] = _property_column([props.get(key) for props in properties])
+    meta = {"format": BUNDLE_FORMAT, "source": os.path.basename(source_path), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "sha256": _file_digest(source_path), "properties": keys}
+
+    # Write into a temporary directory and swap it in, so other processes never see half a bundle
+    path = bundle_path(source_path)
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(temp_path, f"{name}.npy"), array)
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_country_bundle(source_path):
+    """
+    Open the bundle of a country data file if it is up to date.
+
+    The bundle is valid when the source's size and mtime match; if only the
+    mtime changed, the source's SHA-256 decides and the recorded mtime is refreshed.
+    Args:
+        source_path (str): Path to the GeoJSON or TopoJSON country file
+    Returns:
+        CountryBundle: The bundle, or None if it is missing, stale or unreadable
+    """
+    path = bundle_path(source_path)
+    meta_path = os.path.join(path, "meta.json")
+    try:
+        stat = os.stat(source_path)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != BUNDLE_FORMAT or meta.get("size") != stat.st_size:
+            return None
+        if meta.get("mtime_ns") != stat.st_mtime_ns:
+            if meta.get("sha256") != _file_digest(source_path):
+                return None
+            meta["mtime_ns"] = stat.st_mtime_ns
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        return CountryBundle(path)
+    except (OSError, ValueError, KeyError) as bundle_error:
+        if os.path.exists(path):
+            print(f"Error loading country bundle {path}: {str(bundle_error)}")
+        return None
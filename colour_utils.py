@@ -0,0 +1,360 @@
+import collections
+import functools
+import json
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_PALETTES_PATH = os.path.join("JSON", "palettes.json")
+# Colour used when a hex code cannot be parsed (matches the map's fallback)
+FALLBACK_HEX = "#777777"
+
+# sRGB (D65) -> XYZ conversion matrix and reference white
+_RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+
+
+def normalize_hex(hex_code):
+    """
+    Normalize a hex colour code to lower-case "#rrggbb".
+    Args:
+        hex_code (str): Hex code with or without # prefix
+    Returns:
+        str: The normalized hex code, or FALLBACK_HEX if the code is invalid
+    """
+    code = hex_code.strip().lower()
+    if not code.startswith("#"):
+        code = f"#{code}"
+    if len(code) != 7:
+        return FALLBACK_HEX
+    try:
+        int(code[1:], 16)
+    except ValueError:
+        return FALLBACK_HEX
+    return code
+
+
+def hex_to_rgb(hex_codes):
+    """
+    Convert hex colour codes to an RGB array.
+    Args:
+        hex_codes (list): Hex codes with or without # prefix
+    Returns:
+        numpy.ndarray: (N, 3) uint8 array of RGB values
+    """
+    values = np.fromiter((int(normalize_hex(code)[1:], 16) for code in hex_codes),
+                         dtype=np.uint32, count=len(hex_codes))
+    shifts = np.array([16, 8, 0], dtype=np.uint32)
+    return ((values[:, None] >> shifts) & 0xFF).astype(np.uint8)
+
+
+def rgb_to_hex(rgb):
+    """
+    Convert an RGB array to hex colour codes.
+    Args:
+        rgb (numpy.ndarray): (N, 3) array of RGB values in 0-255
+    Returns:
+        list: Lower-case "#rrggbb" hex codes
+    """
+    rgb = np.clip(np.asarray(rgb), 0, 255).astype(np.uint32)
+    values = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    return [f"#{value:06x}" for value in values.tolist()]
+
+
+def rgb_to_lab(rgb):
+    """
+    Convert sRGB values to CIE Lab (D65).
+    Args:
+        rgb (numpy.ndarray): (N, 3) array of RGB values in 0-255
+    Returns:
+        numpy.ndarray: (N, 3) float64 array of L, a, b values
+    """
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb > 0.04045, ((srgb + 0.055) / 1.055) ** 2.4, srgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16,
+                     500 * (f[:, 0] - f[:, 1]),
+                     200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def lab_to_rgb(lab):
+    """
+    Convert CIE Lab (D65) values to sRGB.
+    Args:
+        lab (numpy.ndarray): (N, 3) array of L, a, b values
+    Returns:
+        numpy.ndarray: (N, 3) float64 array of RGB values clipped to 0-255
+    """
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack([fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200], axis=1)
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _WHITE_D65
+    linear = np.clip(xyz @ _XYZ_TO_RGB.T, 0, 1)
+    srgb = np.where(linear > 0.0031308, 1.055 * linear ** (1 / 2.4) - 0.055, linear * 12.92)
+    return np.clip(srgb * 255, 0, 255)
+
+
+def describe_color(palette_name, color, hex_code):
+    """
+    Get a display name for a palette colour.
+    Args:
+        palette_name (str): Name of the palette the colour belongs to
+        color (dict): Colour entry from palettes.json
+        hex_code (str): Hex code of the colour with # prefix
+    Returns:
+        str: The colour's own name, or a descriptive fallback for generated shades
+    """
+    color_name = color.get("name", "")
+    if color_name and not color_name.startswith(palette_name):
+        return color_name
+    # For shades palettes, provide more descriptive names
+    if "shades" in palette_name:
+        position = color.get("position", 0)
+        if position <= 3:
+            return f"Dark {palette_name.split('_')[0].title()}"
+        if position >= 7:
+            return f"Light {palette_name.split('_')[0].title()}"
+        return f"Medium {palette_name.split('_')[0].title()}"
+    # Default to hex code if no better name is available
+    return f"Color {hex_code}"
+
+
+class PaletteRegistry:
+    """
+    Palette colours compiled once into NumPy arrays.
+
+    Every unique colour gets one row in ``hex_codes``, ``names``, ``rgb`` and
+    ``lab``. Exact hex lookups go through a dict index, and nearest-colour
+    lookups for arbitrary hex codes are a single vectorized distance computation
+    in Lab space.
+    """
+
+    def __init__(self, palettes_data):
+        """
+        Args:
+            palettes_data (dict): Parsed palettes.json content
+        """
+        self.palettes = {}
+        self.color_info = {}
+        index = {}
+        names = []
+        labs = []
+        for palette in palettes_data.get("palettes", []):
+            palette_name = palette.get("paletteName", "Unknown")
+            hex_codes = []
+            for color in palette.get("colors", []):
+                hex_code = color.get("hex", "")
+                if not hex_code:
+                    continue
+                hex_code = "#" + hex_code if not hex_code.startswith("#") else hex_code
+                hex_codes.append(hex_code)
+                if hex_code not in self.color_info:
+                    self.color_info[hex_code] = describe_color(palette_name, color, hex_code)
+                key = normalize_hex(hex_code)
+                if key not in index:
+                    index[key] = len(index)
+                    names.append(self.color_info[hex_code])
+                    labs.append(color.get("lab"))
+            self.palettes[palette_name] = hex_codes
+
+        self._index = index
+        self.hex_codes = np.array(list(index), dtype="<U7")
+        self.names = np.array(names, dtype=object)
+        self.rgb = hex_to_rgb(list(index)) if index else np.empty((0, 3), dtype=np.uint8)
+        # Prefer the Lab values shipped in palettes.json, computing the missing ones
+        self.lab = rgb_to_lab(self.rgb)
+        for row, lab in enumerate(labs):
+            if lab is not None:
+                self.lab[row] = lab
+        self._lab_sq = (self.lab ** 2).sum(axis=1)
+
+    @classmethod
+    def from_json(cls, json_path=DEFAULT_PALETTES_PATH):
+        """
+        Compile a registry from a palettes JSON file.
+        Args:
+            json_path (str): Path to the palettes JSON file
+        Returns:
+            PaletteRegistry: The compiled registry
+        """
+        with open(json_path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self._index)
+
+    def index_of(self, hex_code):
+        """
+        Get the registry row of an exact hex code.
+        Args:
+            hex_code (str): Hex code with or without # prefix
+        Returns:
+            int: The row index, or -1 if the colour is not in any palette
+        """
+        return self._index.get(normalize_hex(hex_code), -1)
+
+    def name_of(self, hex_code, default=None):
+        """
+        Get the palette name of an exact hex code.
+        Args:
+            hex_code (str): Hex code with or without # prefix
+            default: Value returned when the colour is not in any palette
+        Returns:
+            str: The colour name, or default if not found
+        """
+        row = self.index_of(hex_code)
+        return self.names[row] if row >= 0 else default
+
+    def nearest(self, hex_codes):
+        """
+        Find the closest palette colour (Euclidean distance in Lab) for each hex code.
+        Args:
+            hex_codes (list): Hex codes with or without # prefix
+        Returns:
+            numpy.ndarray: Registry row index for each hex code
+        """
+        if not len(self):
+            raise ValueError("Palette registry is empty")
+        query = rgb_to_lab(hex_to_rgb(hex_codes))
+        # |q - p|^2 = |q|^2 - 2 q.p + |p|^2; |q|^2 is constant per row so it can be dropped
+        distances = self._lab_sq[None, :] - 2.0 * (query @ self.lab.T)
+        return distances.argmin(axis=1)
+
+    def nearest_names(self, hex_codes):
+        """
+        Name arbitrary hex codes after their closest palette colour.
+        Args:
+            hex_codes (list): Hex codes with or without # prefix
+        Returns:
+            numpy.ndarray: Colour name for each hex code
+        """
+        return self.names[self.nearest(hex_codes)]
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_registry(json_path, mtime_ns, size):
+    # mtime_ns and size are only part of the cache key so edits to the file recompile
+    return PaletteRegistry.from_json(json_path)
+
+
+def load_palette_registry(json_path=None):
+    """
+    Load the compiled palette registry, compiling palettes.json only when it changes.
+    Args:
+        json_path (str): Path to the palettes JSON file. If None, uses default path.
+    Returns:
+        PaletteRegistry: The shared compiled registry (treat as read-only)
+    """
+    if json_path is None:
+        json_path = DEFAULT_PALETTES_PATH
+    stat = os.stat(json_path)
+    return _compile_registry(os.path.abspath(json_path), stat.st_mtime_ns, stat.st_size)
+
+
+class RMSMix:
+    """Root-mean-square mix of RGB channels, which represents mixed colours better than a plain average."""
+
+    def __call__(self, hex_codes):
+        rgb = hex_to_rgb(hex_codes).astype(np.float64)
+        return np.floor(np.sqrt((rgb ** 2).mean(axis=0)))
+
+
+class LabMix:
+    """Average in CIE Lab space, using the Lab values from palettes.json where available."""
+
+    def __init__(self, registry=None):
+        """
+        Args:
+            registry (PaletteRegistry): Registry supplying Lab values for palette colours.
+                                        If None, the default palettes.json is used when present.
+        """
+        self.registry = registry
+
+    def __call__(self, hex_codes):
+        lab = rgb_to_lab(hex_to_rgb(hex_codes))
+        registry = self.registry
+        if registry is None and os.path.exists(DEFAULT_PALETTES_PATH):
+            registry = load_palette_registry()
+        if registry is not None:
+            rows = np.array([registry.index_of(code) for code in hex_codes])
+            known = rows >= 0
+            lab[known] = registry.lab[rows[known]]
+        return np.round(lab_to_rgb(lab.mean(axis=0, keepdims=True))[0])
+
+
+# Mixing models selectable by name; any callable taking a list of hex codes and returning RGB works too
+MIX_MODELS = {
+    "rms": RMSMix,
+    "lab": LabMix,
+}
+
+
+class ColourMixer:
+    """
+    Mixes colours with a pluggable model and memoizes the results.
+
+    The mix depends on the colours and how often each occurs, as players may
+    share a colour, but not on their order; results are cached by the sorted
+    tuple of normalized hex codes with bounded LRU eviction. The cache is
+    shared between Streamlit sessions, so access is guarded by a lock.
+    """
+
+    def __init__(self, model="rms", maxsize=4096):
+        """
+        Args:
+            model (str or callable): Name from MIX_MODELS or a callable mapping hex codes to an RGB triple
+            maxsize (int): Maximum number of cached mixes
+        """
+        self.model = MIX_MODELS[model]() if isinstance(model, str) else model
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def mix(self, hex_codes):
+        """
+        Mix colours, weighting each by how often it occurs.
+        Args:
+            hex_codes (iterable): Hex codes with or without # prefix, one per owner
+        Returns:
+            str: The mixed colour as a lower-case "#rrggbb" hex code
+        """
+        key = tuple(sorted(normalize_hex(code) for code in hex_codes))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        mixed = rgb_to_hex(np.asarray(self.model(list(key)))[None, :])[0]
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = mixed
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return mixed
+
+    def cache_info(self):
+        """
+        Get cache statistics.
+        Returns:
+            dict: hits, misses, current size and maxsize of the cache
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "maxsize": self.maxsize}
+
+    def clear(self):
+        """Drop all cached mixes."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Process-wide mixer used by the map when no other mixer is given
+DEFAULT_MIXER = ColourMixer()
@@ -0,0 +1,243 @@
+"""
+Immutable, columnar index of the countries shown by the app.
+
+The index holds one NumPy array per attribute (ISO codes, name, normalized
+name, continent, area and population), sorted by name and without
+non-country features, plus a read-only ISO code -> row map. It is built once
+per process and shared by every session, so searches, tables and statistics
+work on array slices instead of rebuilding lists of dicts on every rerun.
+"""
+
+import functools
+import types
+
+import numpy as np
+
+import geo_utils
+import search_index
+
+ISO_PROPERTY = "ISO3166-1-Alpha-2"
+ISO3_PROPERTY = "ISO3166-1-Alpha-3"
+NON_COUNTRY_CODE = "-99"
+CONTINENT_PROPERTY = "continent"
+POPULATION_PROPERTY = "pop_est"
+
+# Other names people search for, by ISO code
+ALIASES = {
+    "AE": ["UAE", "Emirates"],
+    "BA": ["Bosnia"],
+    "BO": ["Bolivia"],
+    "CD": ["DRC", "DR Congo", "Congo-Kinshasa", "Zaire"],
+    "CG": ["Congo-Brazzaville", "Republic of the Congo"],
+    "CI": ["Ivory Coast", "Côte d'Ivoire", "Cote d'Ivoire"],
+    "CV": ["Cape Verde", "Cabo Verde"],
+    "CZ": ["Czech Republic", "Czechia"],
+    "FM": ["Micronesia"],
+    "GB": ["UK", "Britain", "Great Britain", "United Kingdom", "England", "Scotland", "Wales", "Northern Ireland"],
+    "IR": ["Iran", "Persia"],
+    "KP": ["North Korea", "DPRK"],
+    "KR": ["South Korea", "Korea"],
+    "LA": ["Laos"],
+    "MD": ["Moldova"],
+    "MK": ["Macedonia", "North Macedonia"],
+    "MM": ["Burma", "Myanmar"],
+    "NL": ["Holland", "Netherlands"],
+    "PS": ["Palestine"],
+    "RU": ["Russia", "Russian Federation"],
+    "SY": ["Syria"],
+    "SZ": ["Swaziland", "Eswatini"],
+    "TL": ["East Timor", "Timor-Leste"],
+    "TR": ["Turkey", "Türkiye"],
+    "TW": ["Taiwan"],
+    "TZ": ["Tanzania"],
+    "US": ["USA", "United States", "America"],
+    "VA": ["Vatican", "Holy See"],
+    "VE": ["Venezuela"],
+    "VN": ["Vietnam", "Viet Nam"],
+}
+
+
+def _frozen(array):
+    """Make an array read-only so sessions sharing it cannot change it."""
+    array = np.asarray(array)
+    array.setflags(write=False)
+    return array
+
+
+class CountryIndex:
+    """
+    Column arrays of the country list, sorted by name.
+
+    Attributes:
+        codes (numpy.ndarray): ISO 3166-1 alpha-2 code of each country
+        codes3 (numpy.ndarray): ISO 3166-1 alpha-3 code of each country, "" if unknown
+        names (numpy.ndarray): Display name of each country
+        normalized (numpy.ndarray): Names folded with search_index.fold_text()
+        continents (numpy.ndarray): Continent of each country, "" if unknown
+        areas (numpy.ndarray): Area in square kilometres
+        populations (numpy.ndarray): Estimated population, NaN if unknown
+        rows (mappingproxy): ISO code -> first row with that code
+        table (pandas.DataFrame): Categorical "name" and "code" columns of every row, built on first use;
+            never modified, frame() returns copies
+        search_index (search_index.SearchIndex): Names, codes and ALIASES of every row
+    """
+
+    def __init__(self, codes, codes3, names, continents, areas, populations):
+        """
+        Args:
+            codes, codes3, names, continents (sequence): String columns, one entry per country
+            areas, populations (sequence): Numeric columns, one entry per country
+        """
+        order = np.argsort(np.asarray(names, dtype=np.str_), kind="stable")
+        self.codes = _frozen(np.asarray(codes, dtype=np.str_)[order])
+        self.codes3 = _frozen(np.asarray(codes3, dtype=np.str_)[order])
+        self.names = _frozen(np.asarray(names, dtype=np.str_)[order])
+        self.normalized = _frozen(np.array([search_index.fold_text(name) for name in self.names.tolist()],
+                                           dtype=np.str_))
+        self.continents = _frozen(np.asarray(continents, dtype=np.str_)[order])
+        self.areas = _frozen(np.asarray(areas, dtype=np.float64)[order])
+        self.populations = _frozen(np.asarray(populations, dtype=np.float64)[order])
+        first_rows = {}
+        for row, code in enumerate(self.codes.tolist()):
+            first_rows.setdefault(code, row)
+        self.rows = types.MappingProxyType(first_rows)
+        self._all_rows = _frozen(np.arange(len(self.codes)))
+        self.search_index = search_index.SearchIndex(self._search_entries())
+
+    def _search_entries(self):
+        """(text, row, kind) tuples of the names, codes and aliases to search."""
+        for row, (code, code3, name) in enumerate(zip(self.codes.tolist(), self.codes3.tolist(),
+                                                      self.names.tolist())):
+            yield name, row, search_index.NAME
+            yield code, row, search_index.CODE
+            if code3:
+                yield code3, row, search_index.CODE
+            for alias in ALIASES.get(code, []):
+                yield alias, row, search_index.ALIAS
+
+    @classmethod
+    def from_geo_data(cls, geo_data):
+        """
+        Build the index from GeoJSON or TopoJSON country data.
+        Args:
+            geo_data (dict): GeoJSON FeatureCollection or TopoJSON topology
+        Returns:
+            CountryIndex: Index of the features that are countries
+        """
+        if geo_utils.is_topology(geo_data):
+            geo_data = geo_utils.topojson_to_geojson(geo_data)
+        features = geo_data.get("features", [])
+        properties = [feature["properties"] for feature in features]
+        areas = geo_utils.feature_areas(*geo_utils.flatten_geometry(features))
+        keep = [i for i, props in enumerate(properties)
+                if props.get(ISO_PROPERTY, NON_COUNTRY_CODE) != NON_COUNTRY_CODE]
+        return cls([properties[i][ISO_PROPERTY] for i in keep],
+                   [str(properties[i].get(ISO3_PROPERTY) or "") for i in keep],
+                   [properties[i].get("name", "") for i in keep],
+                   [str(properties[i].get(CONTINENT_PROPERTY) or "") for i in keep],
+                   areas[keep],
+                   [np.nan if properties[i].get(POPULATION_PROPERTY) is None
+                    else properties[i][POPULATION_PROPERTY] for i in keep])
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        """
+        Build the index from the columns of a country bundle, without parsing the source file.
+        Args:
+            bundle (bundle_utils.CountryBundle): Opened country bundle
+        Returns:
+            CountryIndex: Index of the features that are countries
+        """
+        n = len(bundle)
+        keep = (bundle.codes != "") & (bundle.codes != NON_COUNTRY_CODE)
+        areas = geo_utils.feature_areas(bundle.coords, bundle.ring_offsets, bundle.polygon_offsets,
+                                        bundle.feature_offsets)
+
+        def column(key, missing, dtype):
+            if key not in bundle.properties:
+                return np.full(n, missing, dtype=dtype)[keep]
+            values = np.asarray(bundle.properties[key]).astype(dtype)
+            present = np.asarray(bundle.present[:, bundle.meta["properties"].index(key)])
+            return np.where(present, values, np.array(missing, dtype=dtype))[keep]
+
+        return cls(bundle.codes[keep], column(ISO3_PROPERTY, "", np.str_), bundle.names[keep],
+                   column(CONTINENT_PROPERTY, "", np.str_), areas[keep],
+                   column(POPULATION_PROPERTY, np.nan, np.float64))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @functools.cached_property
+    def table(self):
+        """Base table of frame(); pandas is only imported once a table is needed."""
+        import pandas as pd
+        return pd.DataFrame({"name": pd.Categorical(self.names.tolist()),
+                             "code": pd.Categorical(self.codes.tolist())})
+
+    def mask(self, codes):
+        """
+        Get a boolean column that is True for every row with one of the given ISO codes.
+        Args:
+            codes (iterable): ISO codes, e.g. a player's visited set
+        Returns:
+            numpy.ndarray: Boolean array with one entry per country
+        """
+        return np.isin(self.codes, np.array(list(codes), dtype=np.str_))
+
+    def search(self, term):
+        """
+        Find the countries matching a search term by name, ISO code or alias, ignoring case and accents.
+        Args:
+            term (str): Search term; empty matches every country
+        Returns:
+            numpy.ndarray: Matching rows, best match first (all rows in name order for an empty term)
+        """
+        if not search_index.search_key(term or ""):
+            return self._all_rows
+        return self.search_index.search(term)
+
+    def frame(self, rows=None, selected=None):
+        """
+        Get a table of country names and codes for display, taken from the cached base table.
+        Args:
+            rows (numpy.ndarray): Rows to include, in this order; all countries if None
+            selected (iterable): ISO codes to mark in a "Visited" column; no such column if None
+        Returns:
+            pandas.DataFrame: Categorical "name" and "code" columns, plus "Visited" if selected is given
+        """
+        frame = self.table.take(self._all_rows if rows is None else rows)
+        if selected is not None:
+            frame["Visited"] = frame["code"].isin(selected).to_numpy()
+        return frame
+
+    def countries(self):
+        """
+        Get the country list as {"name", "code"} dicts sorted by name.
+        Returns:
+            list: One dict per country
+        """
+        return [{"name": name, "code": code} for name, code in zip(self.names.tolist(), self.codes.tolist())]
+
+    def summary(self, codes):
+        """
+        Summarise a set of countries against the whole index.
+        Args:
+            codes (iterable): ISO codes, e.g. a player's visited set
+        Returns:
+            dict: countries, continents, area (km²) and population covered, plus their shares of the totals
+        """
+        mask = self.mask(codes)
+        continents = np.unique(self.continents[mask & (self.continents != "")])
+        area = float(self.areas[mask].sum())
+        population = float(np.nansum(self.populations[mask]))
+        total_area = float(self.areas.sum())
+        total_population = float(np.nansum(self.populations))
+        return {
+            "countries": int(mask.sum()),
+            "continents": len(continents),
+            "area": area,
+            "population": population,
+            "country_share": float(mask.sum()) / len(self) if len(self) else 0.0,
+            "area_share": area / total_area if total_area else 0.0,
+            "population_share": population / total_population if total_population else 0.0,
+        }
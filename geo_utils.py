@@ -0,0 +1,598 @@
+import copy
+import json
+import os
+
+import numpy as np
+
+DEFAULT_GEOJSON_PATH = os.path.join("JSON", "countries.geojson")
+
+# Simplified geometry levels: name -> (Douglas-Peucker tolerance in degrees, decimal places kept)
+GEOMETRY_LEVELS = {
+    "low": (0.1, 2),
+    "medium": (0.02, 3),
+    "high": (0.005, 4),
+}
+
+# Name of the object holding the countries in the TopoJSON assets
+TOPOJSON_OBJECT = "countries"
+# Decimal places kept when quantizing the full-resolution geometry (about 11 m at the equator)
+TOPOJSON_DIGITS = 4
+# Mean radius used for country areas
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Shared geometry data is read-only; use copy.deepcopy() for a changeable copy")
+
+
+class FrozenDict(dict):
+    """
+    dict that refuses changes, for geometry shared by every session.
+
+    It is still a dict, so json.dumps(), isinstance() checks and dict(frozen) work unchanged;
+    copy.deepcopy() returns plain, changeable dicts and lists.
+    """
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    """list that refuses changes; the list counterpart of FrozenDict."""
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = clear = extend = insert = pop = remove = reverse = \
+        sort = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(data):
+    """
+    Make parsed JSON read-only, so one copy can be shared by every session without being copied per use.
+    Args:
+        data: Parsed JSON value (dicts, lists, strings, numbers, booleans, None)
+    Returns:
+        The same value with FrozenDict and FrozenList in place of its dicts and lists
+    """
+    if isinstance(data, dict):
+        return FrozenDict((key, freeze(value)) for key, value in data.items())
+    if isinstance(data, list):
+        return FrozenList(freeze(value) for value in data)
+    return data
+
+
+def add_feature_ids(data):
+    """
+    Give every feature of a GeoJSON FeatureCollection a unique id, as folium.GeoJson does when it finds none.
+
+    folium identifies features by a unique id or else by a property unique to each of them, and otherwise
+    writes ids into the data it is given, which fails on frozen data; so call this before freeze().
+    Args:
+        data (dict): GeoJSON or TopoJSON data, changed in place; topologies are left as they are
+    Returns:
+        dict: The same data
+    """
+    if not isinstance(data, dict) or data.get("type") != "FeatureCollection":
+        return data
+    features = data.get("features", [])
+    ids = {feature.get("id") for feature in features}
+    if None not in ids and len(ids) == len(features):
+        return data
+    if features and all(isinstance(feature.get("properties"), dict) for feature in features):
+        for key in features[0]["properties"]:
+            values = {feature["properties"].get(key) for feature in features
+                      if isinstance(feature["properties"].get(key), (str, int))}
+            if len(values) == len(features):
+                return data
+    for i, feature in enumerate(features):
+        feature["id"] = str(i)
+    return data
+
+
+def geometry_level_path(level, source_path=DEFAULT_GEOJSON_PATH):
+    """
+    Get the path of a simplified geometry level next to its source file.
+    Args:
+        level (str): Name of the level in GEOMETRY_LEVELS
+        source_path (str): Path to the full-resolution GeoJSON file
+    Returns:
+        str: e.g. JSON/countries.low.geojson
+    """
+    root, ext = os.path.splitext(source_path)
+    return f"{root}.{level}{ext}"
+
+
+def topojson_path(level=None, source_path=DEFAULT_GEOJSON_PATH):
+    """
+    Get the path of the TopoJSON asset built from a GeoJSON file.
+    Args:
+        level (str): Name of the level in GEOMETRY_LEVELS, or None for the full-resolution asset
+        source_path (str): Path to the full-resolution GeoJSON file
+    Returns:
+        str: e.g. JSON/countries.topojson or JSON/countries.low.topojson
+    """
+    root, _ = os.path.splitext(source_path)
+    return f"{root}.{level}.topojson" if level else f"{root}.topojson"
+
+
+def is_topology(geo_data):
+    """Check whether loaded country data is a TopoJSON topology rather than GeoJSON."""
+    return isinstance(geo_data, dict) and geo_data.get("type") == "Topology"
+
+
+def _topology_object(topology):
+    """Return the countries object of a topology, or its first object."""
+    objects = topology.get("objects", {})
+    if TOPOJSON_OBJECT in objects:
+        return objects[TOPOJSON_OBJECT]
+    return next(iter(objects.values()), {"type": "GeometryCollection", "geometries": []})
+
+
+def feature_properties(geo_data):
+    """
+    Get the properties of every country in either a GeoJSON FeatureCollection or a TopoJSON topology.
+    Args:
+        geo_data (dict): GeoJSON or TopoJSON data for countries
+    Returns:
+        list: Property dicts in feature order
+    """
+    if is_topology(geo_data):
+        return [geometry.get("properties", {}) for geometry in _topology_object(geo_data).get("geometries", [])]
+    return [feature["properties"] for feature in geo_data.get("features", [])]
+
+
+def copy_topology_properties(topology):
+    """
+    Copy a topology deep enough that its geometries' properties can be changed safely.
+
+    folium.TopoJson writes each feature's style into its properties. The arcs, which
+    hold nearly all of the data, are shared with the original instead of copied.
+    Args:
+        topology (dict): TopoJSON topology
+    Returns:
+        dict: Topology with new objects, geometries and property dicts
+    """
+    objects = {}
+    for name, obj in topology.get("objects", {}).items():
+        geometries = [dict(geometry, properties=dict(geometry.get("properties", {})))
+                      for geometry in obj.get("geometries", [])]
+        objects[name] = dict(obj, geometries=geometries)
+    return dict(topology, objects=objects)
+
+
+def pick_geometry_level(width, height):
+    """
+    Pick the coarsest geometry level that still looks exact on a world map of the given size.
+
+    A level is good enough when its simplification error stays below half a
+    pixel when the whole world is shown.
+    Args:
+        width (int): Width of the map in pixels
+        height (int): Height of the map in pixels
+    Returns:
+        str: Name of the level in GEOMETRY_LEVELS
+    """
+    degrees_per_pixel = min(360.0 / max(width, 1), 180.0 / max(height, 1))
+    for level, (tolerance, _) in sorted(GEOMETRY_LEVELS.items(), key=lambda item: -item[1][0]):
+        if tolerance <= degrees_per_pixel / 2:
+            return level
+    return min(GEOMETRY_LEVELS, key=lambda name: GEOMETRY_LEVELS[name][0])
+
+
+def geometry_polygons(geometry):
+    """
+    Get the polygons of a geometry.
+    Args:
+        geometry (dict): GeoJSON geometry, or None
+    Returns:
+        list: Polygons (lists of rings) of a Polygon or MultiPolygon geometry; empty for other types
+    """
+    if geometry is None:
+        return []
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def flatten_geometry(features):
+    """
+    Pack the polygons of GeoJSON features into flat coordinate and offset arrays.
+
+    Ring i is coords[ring_offsets[i]:ring_offsets[i + 1]], polygon j is rings
+    polygon_offsets[j] to polygon_offsets[j + 1], and feature k is polygons
+    feature_offsets[k] to feature_offsets[k + 1].
+    Args:
+        features (list): GeoJSON features with Polygon/MultiPolygon geometries
+    Returns:
+        tuple: (coords, ring_offsets, polygon_offsets, feature_offsets) NumPy arrays
+    """
+    coords, ring_offsets, polygon_offsets, feature_offsets = [], [0], [0], [0]
+    for feature in features:
+        for polygon in geometry_polygons(feature["geometry"]):
+            for ring in polygon:
+                coords.extend(point[:2] for point in ring)
+                ring_offsets.append(len(coords))
+            polygon_offsets.append(len(ring_offsets) - 1)
+        feature_offsets.append(len(polygon_offsets) - 1)
+    return (np.array(coords, dtype=np.float64).reshape(-1, 2), np.array(ring_offsets, dtype=np.int64),
+            np.array(polygon_offsets, dtype=np.int64), np.array(feature_offsets, dtype=np.int64))
+
+
+def feature_areas(coords, ring_offsets, polygon_offsets, feature_offsets):
+    """
+    Compute the area of every feature on a spherical Earth from flattened geometry.
+
+    Each polygon's first ring counts as its outline and the others as holes,
+    whatever their winding order.
+    Args:
+        coords, ring_offsets, polygon_offsets, feature_offsets (numpy.ndarray): Output of flatten_geometry()
+    Returns:
+        numpy.ndarray: Area of each feature in square kilometres
+    """
+    n_rings = len(ring_offsets) - 1
+    n_polygons = len(polygon_offsets) - 1
+    coords = np.radians(np.asarray(coords, dtype=np.float64)).reshape(-1, 2)
+    ring_ids = np.repeat(np.arange(n_rings), np.diff(ring_offsets))
+
+    # Spherical excess of each edge; the last point of a ring has no edge to the next ring
+    lon, sin_lat = coords[:, 0], np.sin(coords[:, 1])
+    edges = np.zeros(len(coords))
+    edges[:-1] = (lon[1:] - lon[:-1]) * (2 + sin_lat[:-1] + sin_lat[1:])
+    edges[np.asarray(ring_offsets[1:]) - 1] = 0.0
+    ring_areas = np.abs(np.bincount(ring_ids, weights=edges, minlength=n_rings)) * EARTH_RADIUS_KM ** 2 / 2
+
+    # Holes are every ring but the first of its polygon
+    polygon_ids = np.repeat(np.arange(n_polygons), np.diff(polygon_offsets))
+    signs = np.ones(n_rings)
+    signs[np.isin(np.arange(n_rings), polygon_offsets[:-1], invert=True)] = -1.0
+    polygon_areas = np.bincount(polygon_ids, weights=ring_areas * signs, minlength=n_polygons)
+
+    feature_ids = np.repeat(np.arange(len(feature_offsets) - 1), np.diff(feature_offsets))
+    return np.bincount(feature_ids, weights=polygon_areas, minlength=len(feature_offsets) - 1)
+
+
+def _douglas_peucker(points, tolerance):
+    """
+    Simplify an open polyline, always keeping its first and last point.
+    Args:
+        points (numpy.ndarray): (N, 2) array of coordinates
+        tolerance (float): Maximum distance of removed points from the simplified line
+    Returns:
+        numpy.ndarray: Boolean mask of the points to keep
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def _quantize_ring(ring, digits):
+    """Round a ring's coordinates and drop consecutive duplicates created by rounding."""
+    points = np.round(np.asarray(ring, dtype=np.float64)[:, :2], digits)
+    if len(points) > 1:
+        changed = np.any(points[1:] != points[:-1], axis=1)
+        points = points[np.concatenate([[True], changed])]
+    return [tuple(point) for point in points.tolist()]
+
+
+def _find_junctions(rings):
+    """
+    Find the points where shared borders start or end.
+
+    A point is a junction when it is seen with more than one distinct pair of
+    neighbours, i.e. where the border between two countries meets a third.
+    Splitting rings at junctions yields arcs that neighbouring countries share
+    exactly, so simplifying each arc once keeps the borders consistent.
+    """
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        points = ring[:-1]
+        count = len(points)
+        for i, point in enumerate(points):
+            pair = frozenset((points[i - 1], points[(i + 1) % count]))
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair:
+                junctions.add(point)
+    return junctions
+
+
+def _simplify_arc(arc, tolerance, cache):
+    """Simplify an arc the same way whichever direction it is traversed in."""
+    reverse = arc[-1] < arc[0] or (arc[-1] == arc[0] and arc[::-1] < arc)
+    key = tuple(arc[::-1]) if reverse else tuple(arc)
+    if key not in cache:
+        points = np.array(key)
+        cache[key] = [point for point, kept in zip(key, _douglas_peucker(points, tolerance)) if kept]
+    simplified = cache[key]
+    return simplified[::-1] if reverse else simplified
+
+
+def _ring_arcs(ring, junctions):
+    """
+    Split a closed ring into arcs at its junctions.
+
+    A ring without junctions (e.g. an island) is one closed arc; it is rotated to a
+    canonical start and split at its farthest point, so the arcs do not depend on
+    where or in which direction the ring starts.
+    Args:
+        ring (list): Closed ring of coordinate tuples
+        junctions (set): Junction points from _find_junctions
+    Returns:
+        list: Arcs as lists of coordinate tuples, each starting where the previous one ends
+    """
+    points = ring[:-1]
+    cuts = [i for i, point in enumerate(points) if point in junctions]
+    if not cuts:
+        start = points.index(min(points))
+        rotated = points[start:] + points[:start]
+        # Split the closed arc at its farthest point so both halves keep some shape
+        distances = np.hypot(*(np.array(rotated, dtype=np.float64) - rotated[0]).T)
+        far = int(distances.argmax())
+        cuts = [start, (start + far) % len(points)] if far else [start]
+
+    arcs = []
+    for n, cut in enumerate(cuts):
+        end = cuts[(n + 1) % len(cuts)]
+        if end > cut:
+            arcs.append(points[cut:end + 1])
+        else:
+            arcs.append(points[cut:] + points[:end + 1])
+    return arcs
+
+
+def _simplify_ring(ring, junctions, tolerance, cache):
+    """Simplify a closed ring arc by arc, splitting it at junctions."""
+    simplified = []
+    for arc in _ring_arcs(ring, junctions):
+        simplified.extend(_simplify_arc(arc, tolerance, cache)[:-1])
+    simplified.append(simplified[0])
+    return simplified
+
+
+def simplify_geojson(geo_data, tolerance, digits):
+    """
+    Produce a simplified, quantized copy of a GeoJSON FeatureCollection.
+
+    Coordinates are rounded to the given number of decimal places, then each
+    arc between junction points is simplified with Douglas-Peucker. Arcs shared
+    by neighbouring countries are simplified identically, so borders stay
+    gap-free. Rings that collapse below a triangle are dropped; a feature always
+    keeps at least its largest exterior ring.
+    Args:
+        geo_data (dict): GeoJSON FeatureCollection of Polygon/MultiPolygon features
+        tolerance (float): Douglas-Peucker tolerance in degrees
+        digits (int): Decimal places kept in coordinates
+    Returns:
+        dict: New GeoJSON FeatureCollection with the same properties
+    """
+    features = []
+    quantized = []
+    for feature in geo_data.get("features", []):
+        polygons = [[_quantize_ring(ring, digits) for ring in polygon]
+                    for polygon in geometry_polygons(feature["geometry"])]
+        quantized.append(polygons)
+
+    junctions = _find_junctions(ring for polygons in quantized for polygon in polygons for ring in polygon
+                                if len(ring) >= 4)
+    cache = {}
+    for feature, polygons in zip(geo_data.get("features", []), quantized):
+        simplified_polygons = []
+        for polygon in polygons:
+            rings = [_simplify_ring(ring, junctions, tolerance, cache) if len(ring) >= 4 else ring
+                     for ring in polygon]
+            if len(rings[0]) < 4:
+                continue
+            simplified_polygons.append([rings[0]] + [ring for ring in rings[1:] if len(ring) >= 4])
+
+        if not simplified_polygons and polygons:
+            # Keep tiny countries visible with their unsimplified outline
+            simplified_polygons = [[max((polygon[0] for polygon in polygons), key=len)]]
+
+        geometry = feature["geometry"]
+        if simplified_polygons:
+            coordinates = [[[list(point) for point in ring] for ring in polygon] for polygon in simplified_polygons]
+            if len(coordinates) == 1:
+                geometry = {"type": "Polygon", "coordinates": coordinates[0]}
+            else:
+                geometry = {"type": "MultiPolygon", "coordinates": coordinates}
+        features.append({"type": "Feature", "properties": feature["properties"], "geometry": geometry})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_geometry_levels(source_path=DEFAULT_GEOJSON_PATH, levels=None):
+    """
+    Write a simplified copy of the GeoJSON file for each geometry level.
+    Args:
+        source_path (str): Path to the full-resolution GeoJSON file
+        levels (list): Names of the levels to build. If None, builds all GEOMETRY_LEVELS.
+    Returns:
+        dict: Level name -> (path written, size in bytes)
+    """
+    with open(source_path, encoding="utf-8") as f:
+        geo_data = json.load(f)
+
+    written = {}
+    for level in levels or GEOMETRY_LEVELS:
+        tolerance, digits = GEOMETRY_LEVELS[level]
+        path = geometry_level_path(level, source_path)
+        with open(path, "w", encoding="utf-8") as f:
+            # Compact separators: the file is embedded verbatim into the map HTML
+            json.dump(simplify_geojson(geo_data, tolerance, digits), f, separators=(",", ":"))
+        written[level] = (path, os.path.getsize(path))
+    return written
+
+
+def _grid_ring(ring, scale):
+    """Snap a ring to the integer grid of a topology and drop consecutive duplicates."""
+    points = np.round(np.asarray(ring, dtype=np.float64)[:, :2] / scale).astype(np.int64)
+    if len(points) > 1:
+        changed = np.any(points[1:] != points[:-1], axis=1)
+        points = points[np.concatenate([[True], changed])]
+    return [tuple(point) for point in points.tolist()]
+
+
+def geojson_to_topojson(geo_data, digits=TOPOJSON_DIGITS):
+    """
+    Convert a GeoJSON FeatureCollection of countries into a quantized TopoJSON topology.
+
+    Coordinates are snapped to a grid of 10^-digits degrees and rings are split into
+    arcs at junctions, so every shared border is stored once and referenced by both
+    neighbours. Arcs are delta-encoded, which keeps most numbers to a few digits.
+    Args:
+        geo_data (dict): GeoJSON FeatureCollection of Polygon/MultiPolygon features
+        digits (int): Decimal places kept in coordinates
+    Returns:
+        dict: TopoJSON topology with one GeometryCollection named TOPOJSON_OBJECT
+    """
+    scale = 10.0 ** -digits
+    features = geo_data.get("features", [])
+    gridded = [[[_grid_ring(ring, scale) for ring in polygon] for polygon in geometry_polygons(feature["geometry"])]
+               for feature in features]
+    rings = [ring for polygons in gridded for polygon in polygons for ring in polygon if len(ring) >= 4]
+
+    # Shift the grid so every quantized position is non-negative
+    origin = np.min([point for ring in rings for point in ring], axis=0) if rings else np.zeros(2, dtype=np.int64)
+    origin = tuple(int(value) for value in origin)
+    junctions = _find_junctions(rings)
+
+    arcs = []
+    arc_index = {}
+
+    def ring_arcs(ring):
+        indices = []
+        for arc in _ring_arcs(ring, junctions):
+            key = tuple(arc)
+            if key in arc_index:
+                indices.append(arc_index[key])
+            elif key[::-1] in arc_index:
+                indices.append(~arc_index[key[::-1]])
+            else:
+                arc_index[key] = len(arcs)
+                indices.append(len(arcs))
+                points = np.array(arc, dtype=np.int64) - origin
+                arcs.append(np.concatenate([points[:1], np.diff(points, axis=0)]).tolist())
+        return indices
+
+    geometries = []
+    for feature, polygons in zip(features, gridded):
+        polygon_arcs = []
+        for polygon in polygons:
+            if len(polygon[0]) < 4:
+                # The exterior ring collapsed onto the grid
+                continue
+            polygon_arcs.append([ring_arcs(ring) for ring in polygon if len(ring) >= 4])
+
+        if not polygon_arcs:
+            geometry = {"type": None}
+        elif len(polygon_arcs) == 1:
+            geometry = {"type": "Polygon", "arcs": polygon_arcs[0]}
+        else:
+            geometry = {"type": "MultiPolygon", "arcs": polygon_arcs}
+        geometry["properties"] = feature["properties"]
+        geometries.append(geometry)
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": [scale, scale], "translate": [origin[0] * scale, origin[1] * scale]},
+        "objects": {TOPOJSON_OBJECT: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
+
+
+def topojson_to_geojson(topology):
+    """
+    Decode a TopoJSON topology built by geojson_to_topojson back into GeoJSON.
+    Args:
+        topology (dict): TopoJSON topology
+    Returns:
+        dict: GeoJSON FeatureCollection with the same properties
+    """
+    transform = topology.get("transform")
+    arcs = []
+    for arc in topology.get("arcs", []):
+        points = np.asarray(arc, dtype=np.float64).reshape(-1, 2)
+        if transform:
+            scale = np.asarray(transform["scale"], dtype=np.float64)
+            points = np.cumsum(points, axis=0) * scale + transform["translate"]
+            # Undo floating point noise from the transform
+            points = np.round(points, max(0, int(np.ceil(-np.log10(scale.min())))) + 1)
+        arcs.append(points.tolist())
+
+    def ring(indices):
+        points = []
+        for index in indices:
+            arc = arcs[index] if index >= 0 else arcs[~index][::-1]
+            points.extend(arc[1:] if points else arc)
+        return points
+
+    features = []
+    for geometry in _topology_object(topology).get("geometries", []):
+        if geometry.get("type") == "Polygon":
+            geojson_geometry = {"type": "Polygon", "coordinates": [ring(r) for r in geometry["arcs"]]}
+        elif geometry.get("type") == "MultiPolygon":
+            geojson_geometry = {"type": "MultiPolygon",
+                                "coordinates": [[ring(r) for r in polygon] for polygon in geometry["arcs"]]}
+        else:
+            geojson_geometry = None
+        features.append({"type": "Feature", "properties": geometry.get("properties", {}),
+                         "geometry": geojson_geometry})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_topojson_assets(source_path=DEFAULT_GEOJSON_PATH, levels=None):
+    """
+    Write the full-resolution TopoJSON asset and a TopoJSON copy of each geometry level.
+    Args:
+        source_path (str): Path to the full-resolution GeoJSON file
+        levels (list): Names of the levels to build. If None, builds all GEOMETRY_LEVELS.
+    Returns:
+        dict: Level name (None for full resolution) -> (path written, size in bytes)
+    """
+    with open(source_path, encoding="utf-8") as f:
+        geo_data = json.load(f)
+
+    topologies = {None: geojson_to_topojson(geo_data)}
+    for level in levels or GEOMETRY_LEVELS:
+        tolerance, digits = GEOMETRY_LEVELS[level]
+        topologies[level] = geojson_to_topojson(simplify_geojson(geo_data, tolerance, digits), digits)
+
+    written = {}
+    for level, topology in topologies.items():
+        path = topojson_path(level, source_path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(topology, f, separators=(",", ":"))
+        written[level] = (path, os.path.getsize(path))
+    return written
@@ -1,9 +1,30 @@
 import h5py
+import contextlib
 import datetime
 from datetime import UTC
 import numpy as np
 import json
 import os
+import threading
+
+import colour_utils
+
+
+# Packed record of the time-indexed visits dataset (/players/<id>/visit_dates).
+# country_idx points into /countries/codes, day counts days since 1970-01-01.
+VISIT_DTYPE = np.dtype([("country_idx", "<u2"), ("day", "<i4")])
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Serializes HDF5 file access within the process: HDF5 refuses to open a file for writing while
+# another handle has it open, e.g. the autosave writer thread while a script run reads the players
+FILE_LOCK = threading.RLock()
+
+
+@contextlib.contextmanager
+def _open(filename, mode):
+    """Open an HDF5 file while holding FILE_LOCK."""
+    with FILE_LOCK, h5py.File(filename, mode) as f:
+        yield f
 
 
 class Colors:
@@ -90,6 +111,8 @@ class Colors:
     }
 
     # Reverse mapping for looking up color names by hex code
+    _NAME_BY_HEX = {code.lower(): name for name, code in COLOR_MAP.items()}
+
     @classmethod
     def get_color_name(cls, hex_code):
         """
@@ -105,13 +128,8 @@ class Colors:
         if not hex_code.startswith('#'):
             hex_code = f"#{hex_code}"
 
-        # Look up in the color map
-        for name, code in cls.COLOR_MAP.items():
-            if code.lower() == hex_code.lower():
-                return name
-
-        # Return the original hex code if not found
-        return hex_code
+        # Look up in the reverse color map, returning the original hex code if not found
+        return cls._NAME_BY_HEX.get(hex_code.lower(), hex_code)
 
 
 def init_h5(filename="countries_visited.h5", palette_hexes=None):
@@ -129,7 +147,7 @@ def init_h5(filename="countries_visited.h5", palette_hexes=None):
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
 
-        with h5py.File(filename, "w") as f:
+        with _open(filename, "w") as f:
             # Creating players group
             f.create_group("/players")
             # Saving palette (optional)
@@ -159,7 +177,7 @@ def add_player(player_id, colour, filename="countries_visited.h5"):
         colour (str): Hex color code for the player (e.g. "#7ebce6")
         filename (str): Path to the HDF5 file
     """
-    with h5py.File(filename, "a") as f:
+    with _open(filename, "a") as f:
         g = f.require_group(f"/players/{player_id}")
         if "visited" not in g:  # create once
             dt = h5py.string_dtype(encoding='utf-8')
@@ -169,20 +187,206 @@ def add_player(player_id, colour, filename="countries_visited.h5"):
         g.attrs["created"] = datetime.datetime.now(UTC).isoformat()
 
 
-def update_visits(player_id, iso_codes, filename="countries_visited.h5"):
+def update_visits(player_id, iso_codes, filename="countries_visited.h5", visit_dates=None):
     """
     Update the list of countries visited by a player.
     Args:
         player_id (str): Unique identifier for the player
         iso_codes (list): List of ISO-3166-1 alpha-2 country codes
         filename (str): Path to the HDF5 file
+        visit_dates (list): Optional list of visit dates parallel to iso_codes
+                            (datetime.date, datetime.datetime or ISO-8601 strings).
+                            Entries that are None are stored without a date.
     """
-    with h5py.File(filename, "a") as f:
+    if visit_dates is not None and len(visit_dates) != len(iso_codes):
+        raise ValueError("visit_dates must have the same length as iso_codes")
+
+    with _open(filename, "a") as f:
         dset = f[f"/players/{player_id}/visited"]
         now = len(dset)
         dset.resize((now + len(iso_codes),))
         dset[now:] = iso_codes  # to write new slice
 
+        if visit_dates is not None:
+            dated = [(code, day) for code, day in zip(iso_codes, visit_dates) if day is not None]
+            if dated:
+                records = np.empty(len(dated), dtype=VISIT_DTYPE)
+                records["country_idx"] = _country_indices(f, [code for code, _ in dated])
+                records["day"] = [_to_day(day) for _, day in dated]
+                _merge_visit_dates(f[f"/players/{player_id}"], records)
+
+
+def _to_day(value):
+    """Convert a date, datetime or ISO-8601 string to days since 1970-01-01."""
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    elif isinstance(value, datetime.datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def _from_day(day):
+    """Convert days since 1970-01-01 back to a datetime.date."""
+    return datetime.date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def _country_codes(f):
+    """Return the country code registry of an open HDF5 file as a list of strings."""
+    if "/countries/codes" not in f:
+        return []
+    return list(f["/countries/codes"].asstr()[...])
+
+
+def _country_indices(f, iso_codes):
+    """
+    Map ISO codes to their index in /countries/codes, registering unknown codes.
+    Args:
+        f (h5py.File): HDF5 file opened for writing
+        iso_codes (list): ISO-3166-1 alpha-2 country codes
+    Returns:
+        numpy.ndarray: uint16 indices into the country code registry
+    """
+    if "/countries/codes" not in f:
+        dt = h5py.string_dtype(encoding='utf-8')
+        f.create_dataset("/countries/codes", shape=(0,), maxshape=(None,), dtype=dt)
+    dset = f["/countries/codes"]
+    index = {code: i for i, code in enumerate(dset.asstr()[...])}
+    new_codes = []
+    for code in iso_codes:
+        if code not in index:
+            index[code] = len(index)
+            new_codes.append(code)
+    if new_codes:
+        now = len(dset)
+        dset.resize((now + len(new_codes),))
+        dset[now:] = new_codes
+    return np.array([index[code] for code in iso_codes], dtype=VISIT_DTYPE["country_idx"])
+
+
+def _merge_visit_dates(grp, records):
+    """Merge new visit records into a player's visit_dates dataset, keeping it sorted by day."""
+    if "visit_dates" in grp:
+        dset = grp["visit_dates"]
+        records = np.concatenate([dset[...], records])
+    else:
+        dset = grp.create_dataset("visit_dates", shape=(0,), maxshape=(None,),
+                                  dtype=VISIT_DTYPE, chunks=True)
+    records = records[np.argsort(records["day"], kind="stable")]
+    dset.resize((len(records),))
+    dset[...] = records
+
+
+def _prune_visit_dates(f, grp, iso_codes):
+    """Drop a player's visit records of countries no longer in their visited set; the others are kept."""
+    if "visit_dates" not in grp:
+        return
+    dset = grp["visit_dates"]
+    records = dset[...]
+    codes = np.array(_country_codes(f), dtype=object)
+    keep = np.isin(codes[records["country_idx"]], list(iso_codes)) if len(records) else np.ones(0, dtype=bool)
+    if not keep.all():
+        records = records[keep]
+        dset.resize((len(records),))
+        dset[...] = records
+
+
+def _day_range(days, start, end):
+    """Binary search the sorted day column for the slice covering start <= day <= end."""
+    lo = np.searchsorted(days, _to_day(start), side="left")
+    hi = np.searchsorted(days, _to_day(end), side="right")
+    return int(lo), int(hi)
+
+
+def get_visits_between(player_id, start, end, filename="countries_visited.h5"):
+    """
+    Get a player's dated visits between two dates (both inclusive).
+    Args:
+        player_id (str): Unique identifier for the player
+        start: First date of the range (datetime.date or ISO-8601 string)
+        end: Last date of the range (datetime.date or ISO-8601 string)
+        filename (str): Path to the HDF5 file
+    Returns:
+        list: (iso_code, datetime.date) tuples in chronological order
+    """
+    if not os.path.exists(filename):
+        return []
+    with _open(filename, "r") as f:
+        path = f"/players/{player_id}/visit_dates"
+        if path not in f:
+            return []
+        dset = f[path]
+        lo, hi = _day_range(dset.fields("day")[...], start, end)
+        if lo >= hi:
+            return []
+        records = dset[lo:hi]
+        codes = _country_codes(f)
+    return [(codes[idx], _from_day(day)) for idx, day in zip(records["country_idx"], records["day"])]
+
+
+def _year_range(dset, year):
+    """Binary search a visit_dates dataset for the slice of records dated in the given year."""
+    return _day_range(dset.fields("day")[...], datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+
+
+def _first_visited_in(dset, lo, hi):
+    """Return the country indices of records lo:hi that do not appear in any earlier record."""
+    if lo >= hi:
+        return np.empty(0, dtype=VISIT_DTYPE["country_idx"])
+    idx = dset.fields("country_idx")[:hi]
+    return np.setdiff1d(idx[lo:], idx[:lo])
+
+
+def get_countries_first_visited_in(player_id, year, filename="countries_visited.h5"):
+    """
+    Get the countries a player visited for the first time in a given year.
+    Args:
+        player_id (str): Unique identifier for the player
+        year (int): Calendar year
+        filename (str): Path to the HDF5 file
+    Returns:
+        set: ISO codes whose earliest dated visit falls in the year
+    """
+    if not os.path.exists(filename):
+        return set()
+    with _open(filename, "r") as f:
+        path = f"/players/{player_id}/visit_dates"
+        if path not in f:
+            return set()
+        dset = f[path]
+        first = _first_visited_in(dset, *_year_range(dset, year))
+        codes = _country_codes(f)
+    return {codes[idx] for idx in first}
+
+
+def get_year_in_review(year, filename="countries_visited.h5"):
+    """
+    Summarise one calendar year of dated visits for every player.
+    Args:
+        year (int): Calendar year
+        filename (str): Path to the HDF5 file
+    Returns:
+        dict: Player id -> {"visits": number of dated visits in the year,
+                            "new_countries": set of ISO codes first visited in the year}
+    """
+    if not os.path.exists(filename):
+        return {}
+    review = {}
+    with _open(filename, "r") as f:
+        if "/players" not in f:
+            return {}
+        codes = _country_codes(f)
+        for name, grp in f["/players"].items():
+            if "visit_dates" not in grp:
+                review[name] = {"visits": 0, "new_countries": set()}
+                continue
+            dset = grp["visit_dates"]
+            lo, hi = _year_range(dset, year)
+            review[name] = {
+                "visits": hi - lo,
+                "new_countries": {codes[idx] for idx in _first_visited_in(dset, lo, hi)}
+            }
+    return review
+
 
 def get_players(filename="countries_visited.h5"):
     """
@@ -194,7 +398,7 @@ def get_players(filename="countries_visited.h5"):
     """
     if not os.path.exists(filename):
         return {}
-    with h5py.File(filename, "r") as f:
+    with _open(filename, "r") as f:
         if "/players" not in f:
             return {}
         players = {
@@ -228,57 +432,12 @@ def get_palettes(json_path=None):
             print(f"Full path: {os.path.abspath(json_path)}")
             return {}
 
-        with open(json_path, encoding="utf-8") as f:
-            palettes_data = json.load(f)
-
-        # Extracting color information from each palette
-        palettes = {}
-        color_info = {}  # Dictionary to store color information
-
-        for palette in palettes_data.get("palettes", []):
-            name = palette.get("paletteName", "Unknown")
-            colors_info = []
-            hex_codes = []
-
-            for color in palette.get("colors", []):
-                hex_code = color.get("hex", "")
-                if not hex_code:
-                    continue
-
-                # Format hex code with # prefix if needed
-                hex_code = "#" + hex_code if not hex_code.startswith("#") else hex_code
-
-                # Get color name with a descriptive fallback if not provided
-                color_name = color.get("name", "")
-                if not color_name or color_name.startswith(palette.get("paletteName", "")):
-                    # For shades palettes, provide more descriptive names
-                    if "shades" in name:
-                        position = color.get("position", 0)
-                        if position <= 3:
-                            color_name = f"Dark {name.split('_')[0].title()}"
-                        elif position >= 7:
-                            color_name = f"Light {name.split('_')[0].title()}"
-                        else:
-                            color_name = f"Medium {name.split('_')[0].title()}"
-                    else:
-                        # Default to hex code if no better name is available
-                        color_name = f"Color {hex_code}"
-
-                colors_info.append({
-                    "hex": hex_code,
-                    "name": color_name
-                })
-                hex_codes.append(hex_code)
-
-                # Store color information in the global color_info dictionary
-                if hex_code not in color_info:
-                    color_info[hex_code] = color_name
-
-            # Store hex codes for backward compatibility
-            palettes[name] = hex_codes
+        # The registry is compiled once per file version and shared, so hand out copies
+        registry = colour_utils.load_palette_registry(json_path)
+        palettes = {name: list(hex_codes) for name, hex_codes in registry.palettes.items()}
 
         # Add color information to the palettes dictionary with a special key
-        palettes["_color_info"] = color_info
+        palettes["_color_info"] = dict(registry.color_info)
 
         return palettes
     except FileNotFoundError:
@@ -303,10 +462,40 @@ def clear_player_visits(player_id, filename="countries_visited.h5"):
         player_id (str): Unique identifier for the player
         filename (str): Path to the HDF5 file
     """
-    with h5py.File(filename, "a") as f:
+    with _open(filename, "a") as f:
         if f"/players/{player_id}" in f:
             dset = f[f"/players/{player_id}/visited"]
             dset.resize((0,))
+            if f"/players/{player_id}/visit_dates" in f:
+                f[f"/players/{player_id}/visit_dates"].resize((0,))
+
+
+def save_selections(selections, filename="countries_visited.h5"):
+    """
+    Replace the visited countries of several players in one write.
+
+    This is how a selection is saved: the visited set is rewritten and the visit dates of countries
+    still in it are kept, so saving does not lose the visit history. The file is opened once for the
+    whole batch. Players no longer in the file are skipped.
+    Args:
+        selections (dict): Player ID -> iterable of ISO-3166-1 alpha-2 country codes
+        filename (str): Path to the HDF5 file
+    Returns:
+        list: IDs of the players written
+    """
+    written = []
+    with _open(filename, "a") as f:
+        for player_id, iso_codes in selections.items():
+            if f"/players/{player_id}" not in f:
+                continue
+            iso_codes = sorted(iso_codes)
+            dset = f[f"/players/{player_id}/visited"]
+            dset.resize((len(iso_codes),))
+            if iso_codes:
+                dset[:] = iso_codes
+            _prune_visit_dates(f, f[f"/players/{player_id}"], iso_codes)
+            written.append(player_id)
+    return written
 
 
 def delete_player(player_id, filename="countries_visited.h5"):
@@ -316,6 +505,6 @@ def delete_player(player_id, filename="countries_visited.h5"):
         player_id (str): Unique identifier for the player
         filename (str): Path to the HDF5 file
     """
-    with h5py.File(filename, "a") as f:
+    with _open(filename, "a") as f:
         if f"/players/{player_id}" in f:
             del f[f"/players/{player_id}"]
@@ -0,0 +1,248 @@
+"""
+Global leaderboard across every map file.
+
+Each map file (an HDF5 file as written by h5_utils) holds the players of one
+map. A refresh scans the map files that changed since the last one in a
+process pool and folds their players into a summary: per-country global
+visitor counts, rarity weights, and the top players by countries and by
+rarity score. The summary is written to a JSON file, so the app serves the
+leaderboard without touching the map files.
+
+Run `python leaderboard.py` (e.g. from cron) to refresh it; the app refreshes it
+in a background thread with refresh_in_background().
+"""
+
+import argparse
+import collections
+import datetime
+import glob
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import h5_utils
+
+# Leaderboard configuration
+# Directory holding the map files to rank, and where the summary is kept
+MAPS_DIR = os.environ.get('MAPS_DIR', '.')
+LEADERBOARD_PATH = os.environ.get('LEADERBOARD_PATH', 'leaderboard.json')
+LEADERBOARD_WORKERS = int(os.environ.get('LEADERBOARD_WORKERS', os.cpu_count() or 1))
+
+LEADERBOARD_FORMAT = 1
+# Entries kept in each precomputed ranking
+LEADERBOARD_SIZE = 10
+
+# Background refresh started by the app: at most one per process
+_refresh_lock = threading.Lock()
+_refresh = {"thread": None, "error": None}
+
+
+def map_files(maps_dir=MAPS_DIR):
+    """
+    List the map files to rank.
+    Args:
+        maps_dir (str): Directory holding the .h5 map files
+    Returns:
+        list: Sorted paths of the map files
+    """
+    return sorted(glob.glob(os.path.join(maps_dir, "*.h5")))
+
+
+def _signature(path):
+    """Size and mtime of a file, to tell whether it changed since the last scan."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def scan_map_file(path):
+    """
+    Read the visited countries of every player in a map file; runs in the worker processes.
+    Args:
+        path (str): Path to the map file
+    Returns:
+        tuple: (path, {player ID: sorted list of ISO codes}); no players if the file cannot be read
+    """
+    try:
+        players = h5_utils.get_players(path)
+    except Exception as scan_error:
+        print(f"Error scanning map file {path}: {str(scan_error)}")
+        return path, {}
+    return path, {player: sorted(str(code) for code in info["visited"]) for player, info in players.items()}
+
+
+def rarity_weights(visitor_counts, total_players):
+    """
+    Weight countries by how few players visited them: 1 + ln(players / visitors).
+
+    A country everyone visited is worth 1; one visited by a single player of 1,000 is worth about 7.9.
+    Args:
+        visitor_counts (dict): ISO code -> number of players who visited it
+        total_players (int): Number of players across all maps
+    Returns:
+        dict: ISO code -> weight
+    """
+    return {code: 1.0 + math.log(total_players / count) for code, count in visitor_counts.items() if count > 0}
+
+
+def _rankings(files, visitor_counts, size):
+    """Top players by countries and by rarity score, and the rarest countries."""
+    total_players = sum(len(entry["players"]) for entry in files.values())
+    weights = rarity_weights(visitor_counts, total_players)
+    players = [
+        (os.path.splitext(os.path.basename(path))[0], player, codes)
+        for path, entry in sorted(files.items()) for player, codes in sorted(entry["players"].items())
+    ]
+    most_countries = heapq.nlargest(size, players, key=lambda item: len(item[2]))
+    rarest_travellers = heapq.nlargest(size, ((round(sum(weights[code] for code in codes), 3), map_name, player,
+                                               codes) for map_name, player, codes in players),
+                                       key=lambda item: item[0])
+    rarest_countries = heapq.nsmallest(size, ((count, code) for code, count in visitor_counts.items() if count > 0))
+    return {
+        "players": total_players,
+        "most_countries": [{"map": map_name, "player": player, "countries": len(codes)}
+                           for map_name, player, codes in most_countries],
+        "rarest_travellers": [{"map": map_name, "player": player, "score": score, "countries": len(codes)}
+                              for score, map_name, player, codes in rarest_travellers],
+        "rarest_countries": [{"code": code, "visitors": count, "weight": round(weights[code], 3)}
+                             for count, code in rarest_countries],
+    }
+
+
+def load_leaderboard(path=LEADERBOARD_PATH):
+    """
+    Load the precomputed leaderboard summary.
+    Args:
+        path (str): Path to the summary file
+    Returns:
+        dict: The summary, or None if it is missing, unreadable or from another format
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return summary if summary.get("format") == LEADERBOARD_FORMAT else None
+
+
+def load_rankings(path=LEADERBOARD_PATH):
+    """
+    Load what the leaderboard page shows, without the per-player scan results the summary keeps.
+    Args:
+        path (str): Path to the summary file
+    Returns:
+        dict: {"rankings", "maps": number of map files, "updated"}, or None if there is no usable summary
+    """
+    summary = load_leaderboard(path)
+    if summary is None:
+        return None
+    return {"rankings": summary["rankings"], "maps": len(summary["files"]), "updated": summary["updated"]}
+
+
+def refresh_leaderboard(maps_dir=MAPS_DIR, path=LEADERBOARD_PATH, workers=LEADERBOARD_WORKERS,
+                        size=LEADERBOARD_SIZE):
+    """
+    Bring the leaderboard summary up to date with the map files.
+
+    Only new and changed files are scanned; the visitor counts of removed and
+    changed files are subtracted from the global counts before the new scans
+    are added.
+    Args:
+        maps_dir (str): Directory holding the .h5 map files
+        path (str): Path to the summary file, rewritten atomically
+        workers (int): Worker processes for scanning; 1 scans in this process
+        size (int): Entries kept in each ranking
+    Returns:
+        dict: The updated summary
+    """
+    summary = load_leaderboard(path) or {"format": LEADERBOARD_FORMAT, "files": {}, "visitor_counts": {}}
+    files = summary["files"]
+    visitor_counts = collections.Counter(summary["visitor_counts"])
+
+    current = {map_path: _signature(map_path) for map_path in map_files(maps_dir)}
+    stale = [map_path for map_path in files if current.get(map_path) != files[map_path]["signature"]]
+    for map_path in stale:
+        for codes in files.pop(map_path)["players"].values():
+            visitor_counts.subtract(codes)
+    changed = [map_path for map_path in current if map_path not in files]
+
+    if workers > 1 and len(changed) > 1:
+        # Spawned workers: a forked copy of a threaded server could inherit a held h5_utils.FILE_LOCK
+        with ProcessPoolExecutor(max_workers=min(workers, len(changed)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            scans = list(pool.map(scan_map_file, changed))
+    else:
+        scans = [scan_map_file(map_path) for map_path in changed]
+    for map_path, players in scans:
+        files[map_path] = {"signature": current[map_path], "players": players}
+        for codes in players.values():
+            visitor_counts.update(codes)
+
+    summary["visitor_counts"] = {code: count for code, count in sorted(visitor_counts.items()) if count > 0}
+    summary["rankings"] = _rankings(files, summary["visitor_counts"], size)
+    summary["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f)
+    os.replace(temp_path, path)
+    return summary
+
+
+def refresh_in_background(maps_dir=MAPS_DIR, path=LEADERBOARD_PATH, workers=LEADERBOARD_WORKERS):
+    """
+    Refresh the summary in a background thread, so the caller does not wait for the scan.
+    Args:
+        maps_dir (str): Directory holding the .h5 map files
+        path (str): Path to the summary file
+        workers (int): Worker processes for scanning
+    Returns:
+        bool: True if a refresh was started, False if one is already running
+    """
+    def run():
+        try:
+            refresh_leaderboard(maps_dir, path, workers)
+            error = None
+        except Exception as refresh_error:
+            error = f"Error refreshing leaderboard: {str(refresh_error)}"
+            print(error)
+        with _refresh_lock:
+            _refresh["error"] = error
+
+    with _refresh_lock:
+        if _refresh["thread"] is not None and _refresh["thread"].is_alive():
+            return False
+        _refresh["thread"] = threading.Thread(target=run, name="leaderboard-refresh", daemon=True)
+        _refresh["error"] = None
+        _refresh["thread"].start()
+        return True
+
+
+def refresh_status():
+    """
+    Get the state of the background refresh.
+    Returns:
+        tuple: (running, error message of the last refresh or None)
+    """
+    with _refresh_lock:
+        thread = _refresh["thread"]
+        return thread is not None and thread.is_alive(), _refresh["error"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the global leaderboard from the map files.")
+    parser.add_argument("--maps-dir", default=MAPS_DIR, help="Directory holding the .h5 map files")
+    parser.add_argument("--output", default=LEADERBOARD_PATH, help="Summary file to update")
+    parser.add_argument("--workers", type=int, default=LEADERBOARD_WORKERS, help="Worker processes for scanning")
+    args = parser.parse_args()
+
+    summary = refresh_leaderboard(args.maps_dir, args.output, args.workers)
+    rankings = summary["rankings"]
+    print(f"Ranked {rankings['players']} players from {len(summary['files'])} map files into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Persistent client-side country map for Streamlit.
+
+The component keeps one Leaflet map alive in the browser. The country geometry
+is sent once per component instance; after that each rerun only sends the
+styles that changed since the previous one. The browser acknowledges what it
+holds through the component value, and asks for a full resync whenever it
+misses an update (e.g. after the iframe was recreated).
+"""
+
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+_country_map = components.declare_component("country_map", path=_FRONTEND_DIR)
+
+
+def style_delta(old_styles, new_styles):
+    """
+    Compute the style changes between two renders.
+    Args:
+        old_styles (dict): ISO code -> style dict sent previously
+        new_styles (dict): ISO code -> style dict to show now
+    Returns:
+        dict: ISO code -> new style, or None for codes that fall back to the default style
+    """
+    changes = {code: style for code, style in new_styles.items() if old_styles.get(code) != style}
+    changes.update({code: None for code in old_styles if code not in new_styles})
+    return changes
+
+
+def new_sync_state():
+    """Server-side record of what has been sent to one component instance."""
+    return {"styles": {}, "seq": 0, "request": 0}
+
+
+def plan_update(sync, ack, styles, geometry_version):
+    """
+    Decide what to send to the browser and record it in the sync state.
+
+    A full update (with the geometry if the browser does not hold this version)
+    is sent on first render and whenever the browser raises its request counter;
+    otherwise only the style changes since the last update are sent.
+    Args:
+        sync (dict): Sync state from new_sync_state(), updated in place
+        ack (dict): Last component value reported by the browser, or None
+        styles (dict): ISO code -> style dict for every country not drawn with the default style
+        geometry_version (str): Version of the geometry the map should show
+    Returns:
+        dict: Component arguments, plus "send_geometry" telling whether to attach the geometry
+    """
+    ack = ack or {}
+    has_geometry = ack.get("geometry") == geometry_version
+    request = ack.get("request", 0)
+
+    if not has_geometry or request != sync["request"]:
+        sync["seq"] += 1
+        sync["request"] = request
+        sync["styles"] = dict(styles)
+        return {"send_geometry": not has_geometry, "full": True, "styles": sync["styles"],
+                "seq": sync["seq"], "base": None}
+
+    changes = style_delta(sync["styles"], styles)
+    base = sync["seq"]
+    if changes:
+        sync["seq"] += 1
+        sync["styles"] = dict(styles)
+    return {"send_geometry": False, "full": False, "changes": changes, "seq": sync["seq"], "base": base}
+
+
+def country_map(geometry, geometry_version, styles, default_style, legend=None, height=600, key="country_map"):
+    """
+    Show the country map, sending the geometry only when the browser does not have it yet.
+    Args:
+        geometry (dict): GeoJSON or TopoJSON data for countries
+        geometry_version (str): Identifier of the geometry; the browser reloads it when this changes
+        styles (dict): ISO code -> style dict for every country not drawn with default_style
+        default_style (dict): Style of the remaining countries
+        legend (list): Players shown in the legend as {"name", "colour", "count"} dicts
+        height (int): Height of the map in pixels
+        key (str): Streamlit key of the component; use one per map on the page
+    Returns:
+        dict: What the browser reported holding, or None before its first report
+    """
+    sync_key = f"{key}_sync"
+    if sync_key not in st.session_state:
+        st.session_state[sync_key] = new_sync_state()
+    args = plan_update(st.session_state[sync_key], st.session_state.get(key), styles, geometry_version)
+    geometry = geometry if args.pop("send_geometry") else None
+    return _country_map(geometry=geometry, geometry_version=geometry_version, default_style=default_style,
+                        legend=legend or [], height=height, key=key, default=None, **args)
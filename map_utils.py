@@ -0,0 +1,179 @@
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+import colour_utils
+import geo_utils
+
+# GeoJSON property holding the ISO-3166-1 alpha-2 code of a feature
+ISO_PROPERTY = "ISO3166-1-Alpha-2"
+# Code used by the GeoJSON for territories that are not countries
+NON_COUNTRY_CODE = "-99"
+
+UNVISITED_STYLE = {"fillColor": "#ffffff", "color": "#999", "weight": 0.5}
+NON_COUNTRY_STYLE = {"fillColor": "#ffffff", "fillOpacity": 0.1, "color": "#999", "weight": 0.5}
+
+
+def feature_codes(geo_data):
+    """
+    Get the ISO code of every feature in a GeoJSON FeatureCollection or TopoJSON topology.
+    Args:
+        geo_data (dict): GeoJSON or TopoJSON data for countries
+    Returns:
+        list: Unique ISO codes in feature order (empty string for features without a code)
+    """
+    return list(dict.fromkeys(properties.get(ISO_PROPERTY, "")
+                              for properties in geo_utils.feature_properties(geo_data)))
+
+
+def owners_matrix(player_data, codes):
+    """
+    Build a boolean players x countries ownership matrix.
+    Args:
+        player_data (dict): Dictionary of players with their visited countries and colors
+        codes (list): ISO codes defining the matrix columns
+    Returns:
+        numpy.ndarray: (len(player_data), len(codes)) bool array, rows in player_data order
+    """
+    column = {code: i for i, code in enumerate(codes)}
+    owners = np.zeros((len(player_data), len(codes)), dtype=bool)
+    for row, info in enumerate(player_data.values()):
+        cols = [column[code] for code in info["visited"] if code in column]
+        owners[row, cols] = True
+    return owners
+
+
+def build_style_table(player_data, codes, mixer=None):
+    """
+    Precompute the map style of every country in one vectorized pass.
+
+    Countries visited by one player get that player's colour. Countries visited
+    by several players get the mix of their colours from the colour mixer
+    (root-mean-square by default).
+    Args:
+        player_data (dict): Dictionary of players with their visited countries and colors
+        codes (list): ISO codes to compute styles for
+        mixer (colour_utils.ColourMixer): Mixer for shared countries; defaults to the shared mixer
+    Returns:
+        dict: ISO code -> folium style dict
+    """
+    codes = list(codes)
+    table = {code: UNVISITED_STYLE for code in codes}
+    if NON_COUNTRY_CODE in table:
+        table[NON_COUNTRY_CODE] = NON_COUNTRY_STYLE
+    if not player_data or not codes:
+        return table
+
+    colours = [info["colour"] for info in player_data.values()]
+    owners = owners_matrix(player_data, codes)
+    counts = owners.sum(axis=0)
+    if NON_COUNTRY_CODE in table:
+        # Non-country territories keep their own style even if listed as visited
+        counts[codes.index(NON_COUNTRY_CODE)] = 0
+
+    # Single owner -> their colour
+    first_owner = owners.argmax(axis=0)
+    for col in np.flatnonzero(counts == 1):
+        table[codes[col]] = {"fillColor": colours[first_owner[col]],
+                             "fillOpacity": 0.7,
+                             "color": "#444", "weight": 0.5}
+
+    # Multiple owners -> memoized mix of the owners' colours
+    mixer = mixer or colour_utils.DEFAULT_MIXER
+    colours = np.array(colours, dtype=object)
+    for col in np.flatnonzero(counts > 1):
+        table[codes[col]] = {"fillColor": mixer.mix(colours[owners[:, col]]),
+                             "fillOpacity": 0.7,
+                             "color": "#222", "weight": 0.5}
+    return table
+
+
+def styled_countries(style_table):
+    """
+    Keep only the countries that are not drawn with the unvisited style.
+    Args:
+        style_table (dict): ISO code -> style dict from build_style_table()
+    Returns:
+        dict: ISO code -> style dict of visited and non-country features
+    """
+    return {code: style for code, style in style_table.items() if style != UNVISITED_STYLE}
+
+
+def state_hash(player_data, geometry_version):
+    """
+    Compute a stable hash of everything a rendered map depends on.
+    Args:
+        player_data (dict): Dictionary of players with their visited countries and colors
+        geometry_version (str): Identifier of the geometry the map is drawn from
+    Returns:
+        str: Hex digest that is equal for equal map states, regardless of dict or set order
+    """
+    digest = hashlib.sha256(str(geometry_version).encode("utf-8"))
+    for player_id in sorted(player_data):
+        info = player_data[player_id]
+        digest.update(b"\0player\0" + str(player_id).encode("utf-8"))
+        digest.update(b"\0colour\0" + str(info["colour"]).encode("utf-8"))
+        digest.update(b"\0visited\0" + "\0".join(sorted(info["visited"])).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Thread-safe LRU cache of rendered maps (HTML or PNG bytes), bounded by total size in bytes.
+
+    Keys are state hashes from state_hash(). The instance is meant to be shared
+    across sessions, so all access is guarded by a lock.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Maximum total size of the cached documents
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """
+        Get a cached render for a state hash.
+        Args:
+            key (str): State hash
+        Returns:
+            str or bytes: The cached render, or None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, html):
+        """
+        Cache a render for a state hash, evicting least recently used entries when over budget.
+        Args:
+            key (str): State hash
+            html (str or bytes): Rendered map HTML or image bytes
+        Returns:
+            bool: True if the entry was cached, False if it is larger than the whole budget
+        """
+        size = len(html) if isinstance(html, bytes) else len(html.encode("utf-8"))
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (html, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return True
@@ -0,0 +1,132 @@
+"""
+Static PNG rendering of the visited-countries map.
+
+The country shapes are rasterized once per image size into a label image that
+holds each pixel's country index. Colouring a map for a given visit state is
+then a palette lookup on that array, with no geometry work at all.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import colour_utils
+import geo_utils
+import map_utils
+
+# Colours of the parts of the picture not covered by a country style
+OCEAN_COLOUR = "#cfe0ec"
+LAND_COLOUR = "#f2efe9"
+# Leaflet's default fill opacity, used for styles without one
+DEFAULT_FILL_OPACITY = 0.2
+
+
+def _css_rgb(colours):
+    """Convert CSS hex colours, including the #rgb shorthand used by the map styles, to RGB."""
+    expanded = []
+    for colour in colours:
+        digits = colour.lstrip("#")
+        expanded.append("".join(c * 2 for c in digits) if len(digits) == 3 else digits)
+    return colour_utils.hex_to_rgb(expanded)
+
+
+def _to_pixels(ring, width, height):
+    """Map a lon/lat ring onto an equirectangular image of the given size."""
+    points = np.asarray(ring, dtype=np.float64)[:, :2]
+    x = (points[:, 0] + 180.0) / 360.0 * width
+    y = (90.0 - points[:, 1]) / 180.0 * height
+    return list(zip(x.tolist(), y.tolist()))
+
+
+class RasterMap:
+    """
+    Precomputed pixel masks of the countries for one image size.
+
+    labels holds, for every pixel, 0 for the ocean or 1 + the index of the
+    country's code in codes. borders marks the pixels on the edge of a country.
+    """
+
+    def __init__(self, geo_data, width=1200, height=600):
+        """
+        Args:
+            geo_data (dict): GeoJSON or TopoJSON data for countries
+            width (int): Width of the image in pixels
+            height (int): Height of the image in pixels
+        """
+        if geo_utils.is_topology(geo_data):
+            geo_data = geo_utils.topojson_to_geojson(geo_data)
+        self.width = width
+        self.height = height
+        self.codes = map_utils.feature_codes(geo_data)
+        self.labels = self._rasterize(geo_data)
+
+        # A pixel is on a border when its right or lower neighbour belongs to another country,
+        # or on the coast when any neighbour is ocean, so every edge is one pixel wide
+        land = self.labels > 0
+        edges = np.zeros_like(land)
+        edges[:, :-1] |= self.labels[:, :-1] != self.labels[:, 1:]
+        edges[:-1, :] |= self.labels[:-1, :] != self.labels[1:, :]
+        edges[:, 1:] |= ~land[:, :-1]
+        edges[1:, :] |= ~land[:-1, :]
+        self.borders = edges & land
+
+    def _rasterize(self, geo_data):
+        """Draw each country into its bounding box and stamp its label into the label image."""
+        labels = np.zeros((self.height, self.width), dtype=np.uint16)
+        index = {code: i + 1 for i, code in enumerate(self.codes)}
+        for feature in geo_data.get("features", []):
+            label = index[feature["properties"].get(map_utils.ISO_PROPERTY, "")]
+            for polygon in geo_utils.geometry_polygons(feature["geometry"]):
+                rings = [_to_pixels(ring, self.width, self.height) for ring in polygon if len(ring) >= 3]
+                if not rings:
+                    continue
+                exterior = np.array(rings[0])
+                x0, y0 = np.floor(exterior.min(axis=0)).astype(int).clip(0, (self.width - 1, self.height - 1))
+                x1, y1 = np.ceil(exterior.max(axis=0)).astype(int).clip(0, (self.width - 1, self.height - 1))
+                mask = Image.new("1", (x1 - x0 + 1, y1 - y0 + 1), 0)
+                draw = ImageDraw.Draw(mask)
+                draw.polygon([(x - x0, y - y0) for x, y in rings[0]], fill=1)
+                for hole in rings[1:]:
+                    draw.polygon([(x - x0, y - y0) for x, y in hole], fill=0)
+                labels[y0:y1 + 1, x0:x1 + 1][np.asarray(mask, dtype=bool)] = label
+        return labels
+
+    def render(self, player_data, mixer=None):
+        """
+        Colour the map for a visit state.
+        Args:
+            player_data (dict): Dictionary of players with their visited countries and colors
+            mixer (colour_utils.ColourMixer): Mixer for countries visited by several players
+        Returns:
+            numpy.ndarray: (height, width, 3) uint8 RGB image
+        """
+        table = map_utils.build_style_table(player_data, self.codes, mixer)
+        styles = [table[code] for code in self.codes]
+
+        land = _css_rgb([LAND_COLOUR]).astype(np.float64)
+        fills = _css_rgb([style["fillColor"] for style in styles]).astype(np.float64)
+        opacity = np.array([style.get("fillOpacity", DEFAULT_FILL_OPACITY) for style in styles])[:, None]
+
+        # Row 0 is the ocean; row i + 1 is the fill of codes[i] blended over the land colour
+        fill_palette = np.vstack([_css_rgb([OCEAN_COLOUR]),
+                                  np.round(opacity * fills + (1 - opacity) * land).astype(np.uint8)])
+        border_palette = np.vstack([_css_rgb([OCEAN_COLOUR]),
+                                    _css_rgb([style["color"] for style in styles])])
+
+        image = fill_palette[self.labels]
+        image[self.borders] = border_palette[self.labels[self.borders]]
+        return image
+
+    def render_png(self, player_data, mixer=None):
+        """
+        Colour the map for a visit state and encode it as PNG.
+        Args:
+            player_data (dict): Dictionary of players with their visited countries and colors
+            mixer (colour_utils.ColourMixer): Mixer for countries visited by several players
+        Returns:
+            bytes: PNG image
+        """
+        buffer = io.BytesIO()
+        Image.fromarray(self.render(player_data, mixer)).save(buffer, format="PNG")
+        return buffer.getvalue()
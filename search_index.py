@@ -0,0 +1,182 @@
+"""
+Ranked country search over names, ISO codes and aliases.
+
+Every searchable text (name, code or alias) is folded to lower case without
+accents or punctuation and split into padded trigrams, as in PostgreSQL's
+pg_trgm: "cote d ivoire" gives "  c", " co", "cot", "ote", "te ", ... An
+inverted index maps each trigram to the texts containing it, so a query only
+looks at the texts that share all of its trigrams instead of scanning every
+name. Matches are ranked:
+
+0. exact code, e.g. "us" or "usa"
+1. exact name or alias
+2. name or alias starting with the query
+3. a word starting with the query
+4. the query anywhere in the text
+5. no substring match, but similar trigrams (typos), best similarity first
+
+Queries shorter than three characters have no trigram of their own, so they
+are matched by a linear scan of the texts instead, e.g. "an" finds "Japan".
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+
+# Kinds of searchable text
+CODE = 0
+NAME = 1
+ALIAS = 2
+
+# Minimum trigram similarity (shared / union) for a typo match
+FUZZY_THRESHOLD = 0.3
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def fold_text(text):
+    """
+    Fold text for matching: accents removed and case folded.
+    Args:
+        text (str): Name or search term, e.g. "Côte d'Ivoire"
+    Returns:
+        str: e.g. "cote d'ivoire"
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def search_key(text):
+    """
+    Fold text and reduce punctuation to single spaces, so "Côte d'Ivoire" and "cote divoire" share words.
+    Args:
+        text (str): Name, code, alias or search term
+    Returns:
+        str: e.g. "cote d ivoire"
+    """
+    return _NON_WORD.sub(" ", fold_text(text)).strip()
+
+
+def _trigrams(key):
+    """Trigrams of a key with two spaces before and one after each word."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _inner_trigrams(key):
+    """Unpadded trigrams of a query, which any text containing it must have."""
+    return {key[i:i + 3] for i in range(len(key) - 2) if " " not in key[i:i + 3]} | {
+        f" {word[:2]}" for word in key.split()[1:] if len(word) >= 2} | {
+        f"{word[-2:]} " for word in key.split()[:-1] if len(word) >= 2}
+
+
+class SearchIndex:
+    """
+    Trigram index of the searchable texts of a list of rows.
+
+    Attributes:
+        texts (list): Search key of every text
+        rows (numpy.ndarray): Row each text belongs to
+        kinds (numpy.ndarray): CODE, NAME or ALIAS for each text
+    """
+
+    def __init__(self, entries):
+        """
+        Args:
+            entries (iterable): (text, row, kind) tuples; texts are folded with search_key()
+        """
+        texts, rows, kinds = [], [], []
+        for text, row, kind in entries:
+            key = search_key(text)
+            if key:
+                texts.append(key)
+                rows.append(row)
+                kinds.append(kind)
+        self.texts = texts
+        self.rows = np.array(rows, dtype=np.intp)
+        self.kinds = np.array(kinds, dtype=np.int8)
+
+        self._exact = {}
+        postings = {}
+        gram_counts = []
+        for i, key in enumerate(texts):
+            self._exact.setdefault(key, []).append(i)
+            grams = _trigrams(key)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.array(ids, dtype=np.intp) for gram, ids in postings.items()}
+        self._gram_counts = np.array(gram_counts, dtype=np.float64)
+
+    def _candidates(self, query):
+        """Texts that may contain the query: those sharing all of its trigrams, or all texts for short queries."""
+        if len(query) < 3:
+            return [i for i, text in enumerate(self.texts) if query in text]
+        candidates = None
+        for gram in sorted(_inner_trigrams(query), key=lambda g: len(self._postings.get(g, ()))):
+            ids = self._postings.get(gram)
+            if ids is None:
+                return []
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+            if not len(candidates):
+                return []
+        if candidates is None:
+            return range(len(self.texts))
+        return candidates.tolist()
+
+    def _fuzzy(self, query):
+        """Texts whose trigram similarity to the query reaches FUZZY_THRESHOLD, with their similarity."""
+        grams = _trigrams(query)
+        ids = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not ids:
+            return np.array([], dtype=np.intp), np.array([])
+        shared = np.bincount(np.concatenate(ids), minlength=len(self.texts))
+        similarity = shared / (len(grams) + self._gram_counts - shared)
+        matches = np.flatnonzero(similarity >= FUZZY_THRESHOLD)
+        return matches, similarity[matches]
+
+    def search(self, query):
+        """
+        Find the rows matching a query, best matches first.
+        Args:
+            query (str): Search term
+        Returns:
+            numpy.ndarray: Matching rows, each once, ranked as described in the module docstring
+        """
+        query = search_key(query or "")
+        if not query:
+            return np.array([], dtype=np.intp)
+
+        exact = self._exact.get(query, [])
+        ids, ranks = [], []
+        for i in self._candidates(query):
+            text = self.texts[i]
+            position = text.find(query)
+            if position < 0:
+                continue
+            if i in exact:
+                rank = 0 if self.kinds[i] == CODE else 1
+            elif position == 0:
+                rank = 2
+            elif f" {query}" in text:
+                rank = 3
+            else:
+                rank = 4
+            ids.append(i)
+            ranks.append(rank)
+        similarity = np.zeros(len(ids))
+        if not ids:
+            ids, similarity = self._fuzzy(query)
+            ranks = np.full(len(ids), 5)
+
+        ids = np.asarray(ids, dtype=np.intp)
+        rows = self.rows[ids]
+        # Rank, then similarity, then row (name order); keep each row's best match
+        order = np.lexsort((rows, -similarity, np.asarray(ranks)))
+        rows = rows[order]
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)]
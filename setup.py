@@ -50,6 +50,7 @@ setup(
     name="countries_visited",
     version="0.0.1",
     packages=find_packages(exclude=["examples"]),
+    package_data={"map_component": ["frontend/*.html"]},
     license='MIT',
     description='Code base related to a map app with HDF5 serialization',
     author='Torda Balázs',
@@ -0,0 +1,195 @@
+"""
+Overlap statistics over the visited countries of many players.
+
+Visits are held as a packed bit matrix: one row per player, one bit per
+country (np.packbits along the countries), so 10,000 players x 256 countries
+take 320 KB. Questions such as "visited by all players" or "by at least N"
+reduce to bitwise AND/OR over rows, bit counts per column, and popcounts
+through a 256-entry lookup table. Pairwise similarity between players comes
+from matrix products of the unpacked rows, computed a block of rows at a time
+so memory stays bounded for large groups.
+"""
+
+import numpy as np
+
+import map_utils
+
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+# Similarity measures between two players' visited sets A and B
+SIMILARITY_METRICS = {
+    "jaccard": "shared / visited by either (|A ∩ B| / |A ∪ B|)",
+    "overlap": "shared / visited by the one with fewer countries (|A ∩ B| / min(|A|, |B|))",
+}
+# Rows per block in pairwise similarity: a block holds SIMILARITY_BLOCK x players float32 values
+SIMILARITY_BLOCK = 512
+
+
+class VisitMatrix:
+    """
+    Packed players x countries matrix of visits.
+
+    Attributes:
+        players (list): Player IDs, one per row
+        codes (numpy.ndarray): ISO codes, one per column
+        bits (numpy.ndarray): (players, ceil(countries / 8)) uint8 array, bit j of row i set if player i visited
+            country j (most significant bit first, as np.packbits)
+    """
+
+    def __init__(self, players, codes, bits):
+        """
+        Args:
+            players (list): Player IDs, one per row
+            codes (sequence): ISO codes, one per column
+            bits (numpy.ndarray): Packed visits, see the class attributes
+        """
+        self.players = list(players)
+        self.codes = np.asarray(codes, dtype=np.str_)
+        self.bits = bits
+
+    @classmethod
+    def from_players(cls, player_data, codes):
+        """
+        Pack the visits of players as returned by h5_utils.get_players().
+        Args:
+            player_data (dict): Player ID -> {"visited": set of ISO codes, ...}
+            codes (sequence): ISO codes of the columns; visits to other codes are ignored
+        Returns:
+            VisitMatrix: The packed matrix, rows in player_data order
+        """
+        owners = map_utils.owners_matrix(player_data, list(codes))
+        return cls(player_data.keys(), codes, np.packbits(owners, axis=1))
+
+    def __len__(self):
+        return len(self.players)
+
+    def subset(self, players):
+        """
+        Get the matrix of some of the players.
+        Args:
+            players (iterable): Player IDs to keep, in the order wanted
+        Returns:
+            VisitMatrix: Matrix sharing the columns of this one
+        """
+        row = {player: i for i, player in enumerate(self.players)}
+        players = [player for player in players if player in row]
+        return VisitMatrix(players, self.codes, self.bits[[row[player] for player in players]])
+
+    def _unpack(self, packed):
+        """Unpack one packed row into a boolean column per country."""
+        return np.unpackbits(packed, count=len(self.codes)).astype(bool)
+
+    def player_totals(self):
+        """
+        Count the countries visited by each player.
+        Returns:
+            numpy.ndarray: One count per player
+        """
+        return POPCOUNT[self.bits].sum(axis=1, dtype=np.int64)
+
+    def visitor_counts(self):
+        """
+        Count the players who visited each country.
+        Returns:
+            numpy.ndarray: One count per country
+        """
+        counts = np.zeros(self.bits.shape[1] * 8, dtype=np.int64)
+        # One pass per bit position: column 8 * byte + bit is bit (7 - bit) of that byte
+        for bit in range(8):
+            counts[bit::8] = ((self.bits >> (7 - bit)) & 1).sum(axis=0, dtype=np.int64)
+        return counts[:len(self.codes)]
+
+    def visited_by_all(self):
+        """
+        Get the mask of countries every player visited.
+        Returns:
+            numpy.ndarray: Boolean array with one entry per country (all False without players)
+        """
+        if not len(self):
+            return np.zeros(len(self.codes), dtype=bool)
+        return self._unpack(np.bitwise_and.reduce(self.bits, axis=0))
+
+    def visited_by_any(self):
+        """
+        Get the mask of countries at least one player visited.
+        Returns:
+            numpy.ndarray: Boolean array with one entry per country
+        """
+        return self._unpack(np.bitwise_or.reduce(self.bits, axis=0))
+
+    def visited_by_at_least(self, n):
+        """
+        Get the mask of countries visited by at least n players.
+        Args:
+            n (int): Minimum number of visitors
+        Returns:
+            numpy.ndarray: Boolean array with one entry per country
+        """
+        return self.visitor_counts() >= n
+
+    def _similarity_rows(self, start, stop, visits, totals, metric):
+        """Similarity of players start:stop to every player, as a (stop - start, players) float32 array."""
+        shared = visits[start:stop] @ visits.T
+        if metric == "jaccard":
+            denominator = totals[start:stop, None] + totals[None, :]
+            denominator -= shared
+        elif metric == "overlap":
+            denominator = np.minimum(totals[start:stop, None], totals[None, :])
+        else:
+            raise ValueError(f"Unknown similarity metric: {metric}")
+        # The denominator is only 0 where nothing is shared, so those entries stay 0
+        np.divide(shared, denominator, out=shared, where=denominator > 0)
+        return shared
+
+    def similarity_blocks(self, metric="jaccard", block=SIMILARITY_BLOCK):
+        """
+        Compute pairwise similarity between all players, one block of rows at a time.
+        Args:
+            metric (str): A key of SIMILARITY_METRICS
+            block (int): Rows per block
+        Returns:
+            generator: (start, rows) pairs, rows being the similarity of players start:start + len(rows)
+                to every player; players who visited nothing have similarity 0
+        """
+        visits = np.unpackbits(self.bits, axis=1, count=len(self.codes)).astype(np.float32)
+        totals = visits.sum(axis=1)
+        for start in range(0, len(self), block):
+            yield start, self._similarity_rows(start, min(start + block, len(self)), visits, totals, metric)
+
+    def similarity(self, metric="jaccard"):
+        """
+        Get the full players x players similarity matrix; meant for groups small enough to display.
+        Args:
+            metric (str): A key of SIMILARITY_METRICS
+        Returns:
+            numpy.ndarray: (players, players) float32 array
+        """
+        return np.concatenate([rows for _, rows in self.similarity_blocks(metric)]) if len(self) else \
+            np.zeros((0, 0), dtype=np.float32)
+
+    def nearest(self, k=3, metric="jaccard", block=SIMILARITY_BLOCK):
+        """
+        Find each player's k most similar other players.
+        Args:
+            k (int): Number of neighbours per player
+            metric (str): A key of SIMILARITY_METRICS
+            block (int): Rows per block; memory use is about block x players x 4 bytes
+        Returns:
+            tuple: (neighbours, scores), (players, min(k, players - 1)) arrays of row numbers and
+                similarities, most similar first
+        """
+        k = max(0, min(k, len(self) - 1))
+        neighbours = np.zeros((len(self), k), dtype=np.intp)
+        scores = np.zeros((len(self), k), dtype=np.float32)
+        if not k:
+            return neighbours, scores
+        for start, rows in self.similarity_blocks(metric, block):
+            # A player is not their own neighbour
+            rows[np.arange(len(rows)), np.arange(start, start + len(rows))] = -1
+            top = np.argpartition(-rows, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(rows, top, axis=1)
+            order = np.lexsort((top, -top_scores), axis=1)
+            neighbours[start:start + len(rows)] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + len(rows)] = np.take_along_axis(top_scores, order, axis=1)
+        return neighbours, scores
@@ -0,0 +1,205 @@
+"""
+Benchmarks of the h5_utils map file operations at realistic scale.
+
+Needs pytest-benchmark (requirements-dev.txt). Run them and keep the results as JSON, e.g.:
+
+    H5_BENCHMARK_PLAYERS=10,1000,100000 pytest tests/benchmarks/test_h5_storage.py --no-cov \
+        --benchmark-json=h5_benchmark.json
+
+Each result's extra_info holds the number of players in the map file, the visits written and the file
+size. The default scales are small enough to run with the rest of the suite; at 100000 players reading
+every player takes about a minute, so add --benchmark-min-rounds=1 to time it once.
+"""
+
+import datetime
+import itertools
+import os
+import shutil
+import string
+import sys
+
+import h5py
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# Add the parent directory to sys.path to import h5_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import h5_utils
+
+# Players per map file, comma-separated; a 100000-player file takes about two minutes to build
+H5_BENCHMARK_PLAYERS = [int(n) for n in os.environ.get('H5_BENCHMARK_PLAYERS', '10,1000').split(',')]
+H5_BENCHMARK_SEED = int(os.environ.get('H5_BENCHMARK_SEED', 1))
+# Timed calls of each operation that changes the file
+H5_BENCHMARK_ROUNDS = int(os.environ.get('H5_BENCHMARK_ROUNDS', 20))
+
+# As many two-letter codes as there are ISO 3166-1 alpha-2 countries
+COUNTRY_CODES = ["".join(pair) for pair in itertools.product(string.ascii_uppercase, repeat=2)][:249]
+# Visits written by one call: a single country, a typical traveller, every country
+VISIT_COUNTS = [1, 25, len(COUNTRY_CODES)]
+COLOURS = ["#7ebce6", "#f7941d", "#a2ad00", "#522398"]
+
+
+def synthetic_players(n, seed=H5_BENCHMARK_SEED):
+    """
+    Generate players and their visited countries, the same for the same arguments.
+
+    Most players visited a few countries and a few visited nearly all of them: the counts follow a
+    geometric distribution with a mean of about 20, capped at the full country list.
+    Args:
+        n (int): Number of players
+        seed (int): Seed of the random generator
+    Returns:
+        dict: Player ID -> {"colour": hex code, "visited": sorted list of ISO codes}
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.minimum(rng.geometric(1 / 20, size=n) - 1, len(COUNTRY_CODES))
+    codes = np.array(COUNTRY_CODES)
+    return {
+        f"player{i:06d}": {"colour": COLOURS[i % len(COLOURS)],
+                           "visited": sorted(codes[rng.choice(len(codes), size=count, replace=False)].tolist())}
+        for i, count in enumerate(counts)
+    }
+
+
+def build_map_file(path, players):
+    """
+    Write a map file holding the players.
+
+    The layout is the one add_player() and update_visits() write, but the file is opened once instead of
+    twice per player, so even the largest scale builds in reasonable time.
+    Args:
+        path (str): Path of the map file to create
+        players (dict): Players as returned by synthetic_players()
+    Returns:
+        str: The path
+    """
+    h5_utils.init_h5(path)
+    dt = h5py.string_dtype(encoding='utf-8')
+    created = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC).isoformat()
+    with h5py.File(path, "a") as f:
+        for player_id, info in players.items():
+            g = f.create_group(f"/players/{player_id}")
+            g.create_dataset("visited", data=np.array(info["visited"], dtype=object), maxshape=(None,), dtype=dt)
+            g.attrs["colour"] = info["colour"]
+            g.attrs["created"] = created
+    return path
+
+
+def stored_visits(path, player_id):
+    """Read back one player's visited countries, without reading every player as get_players() does."""
+    with h5py.File(path, "r") as f:
+        return set(f[f"/players/{player_id}/visited"][...].astype(str))
+
+
+def player_count(path):
+    """Count the players in a map file."""
+    with h5py.File(path, "r") as f:
+        return len(f["/players"])
+
+
+def record(benchmark, path, players, visits=0):
+    """Attach the scale of a run to its benchmark result."""
+    benchmark.extra_info.update({"players": players, "visits": visits, "file_bytes": os.path.getsize(path)})
+
+
+@pytest.fixture(scope="module", params=H5_BENCHMARK_PLAYERS, ids=lambda n: f"{n}_players")
+def map_file(request, tmp_path_factory):
+    """A map file of synthetic players, built once per scale; benchmarks must not change it."""
+    players = synthetic_players(request.param)
+    path = str(tmp_path_factory.mktemp("h5_benchmark") / f"players_{request.param}.h5")
+    return build_map_file(path, players), players
+
+
+@pytest.fixture
+def map_copy(map_file, tmp_path):
+    """A copy of the map file for benchmarks that change it."""
+    path, players = map_file
+    return shutil.copy(path, str(tmp_path / os.path.basename(path))), players
+
+
+class TestH5Storage:
+    """Benchmarks of h5_utils.py."""
+
+    def test_synthetic_players(self):
+        """Test that the generator is deterministic and stays within the country list."""
+        players = synthetic_players(200)
+        assert players == synthetic_players(200)
+        assert players != synthetic_players(200, seed=H5_BENCHMARK_SEED + 1)
+        assert all(set(info["visited"]) <= set(COUNTRY_CODES) for info in players.values())
+        assert max(len(info["visited"]) for info in players.values()) > 25
+
+    def test_init_h5(self, benchmark, tmp_path):
+        """Benchmark creating an empty map file."""
+        paths = (str(tmp_path / f"map_{i}.h5") for i in itertools.count())
+        result = benchmark.pedantic(h5_utils.init_h5, setup=lambda: ((next(paths),), {}),
+                                    rounds=H5_BENCHMARK_ROUNDS)
+        assert result
+        record(benchmark, str(tmp_path / "map_0.h5"), 0)
+
+    def test_add_player(self, benchmark, map_copy):
+        """Benchmark adding a player to a map file."""
+        path, players = map_copy
+        added = []
+
+        def setup():
+            added.append(f"new{len(added):06d}")
+            return (added[-1], "#7ebce6", path), {}
+
+        # --benchmark-disable runs a single round, so count the players added instead of assuming every round ran
+        benchmark.pedantic(h5_utils.add_player, setup=setup, rounds=H5_BENCHMARK_ROUNDS)
+        assert added
+        assert player_count(path) == len(players) + len(added)
+        record(benchmark, path, len(players))
+
+    @pytest.mark.parametrize("visits", VISIT_COUNTS, ids=lambda n: f"{n}_visits")
+    def test_update_visits(self, benchmark, map_copy, visits):
+        """Benchmark writing the visited countries of a player who has none yet."""
+        path, players = map_copy
+        player_id = next(iter(players))
+        codes = COUNTRY_CODES[:visits]
+
+        def setup():
+            h5_utils.clear_player_visits(player_id, path)
+            return (player_id, codes, path), {}
+
+        benchmark.pedantic(h5_utils.update_visits, setup=setup, rounds=H5_BENCHMARK_ROUNDS)
+        assert stored_visits(path, player_id) == set(codes)
+        record(benchmark, path, len(players), visits)
+
+    def test_get_players(self, benchmark, map_file):
+        """Benchmark reading every player of a map file."""
+        path, players = map_file
+        result = benchmark(h5_utils.get_players, path)
+        assert {player_id: sorted(info["visited"]) for player_id, info in result.items()} == \
+            {player_id: info["visited"] for player_id, info in players.items()}
+        record(benchmark, path, len(players), sum(len(info["visited"]) for info in players.values()))
+
+    def test_clear_player_visits(self, benchmark, map_copy):
+        """Benchmark clearing a player who visited every country."""
+        path, players = map_copy
+        player_id = next(iter(players))
+
+        def setup():
+            h5_utils.save_selections({player_id: COUNTRY_CODES}, path)
+            return (player_id, path), {}
+
+        benchmark.pedantic(h5_utils.clear_player_visits, setup=setup, rounds=H5_BENCHMARK_ROUNDS)
+        assert stored_visits(path, player_id) == set()
+        record(benchmark, path, len(players), len(COUNTRY_CODES))
+
+    def test_delete_player(self, benchmark, map_copy):
+        """Benchmark deleting a player who visited every country."""
+        path, players = map_copy
+        new_ids = (f"new{i:06d}" for i in itertools.count())
+
+        def setup():
+            player_id = next(new_ids)
+            h5_utils.add_player(player_id, "#7ebce6", path)
+            h5_utils.update_visits(player_id, COUNTRY_CODES, path)
+            return (player_id, path), {}
+
+        benchmark.pedantic(h5_utils.delete_player, setup=setup, rounds=H5_BENCHMARK_ROUNDS)
+        assert player_count(path) == len(players)
+        record(benchmark, path, len(players), len(COUNTRY_CODES))
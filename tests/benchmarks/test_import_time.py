@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+# Root of the repository, put on sys.path of the measured interpreter
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules the welcome screen must not load; they are imported where they are first used
+LAZY_MODULES = ["folium", "branca", "pandas", "PIL", "redis", "streamlit_oauth", "stats_utils", "leaderboard",
+                "raster_utils", "tile_server", "map_component"]
+
+# Imports app.py in a fresh interpreter, which renders the welcome screen, and reports the time and modules loaded
+MEASURE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import streamlit
+streamlit_done = time.perf_counter()
+import app
+app_done = time.perf_counter()
+print(json.dumps({{"streamlit": streamlit_done - start, "app": app_done - streamlit_done,
+                  "loaded": [name for name in {modules!r} if name in sys.modules]}}))
+"""
+
+
+def make_app_dir(path, geo_data):
+    """Lay out the JSON files app.py needs to reach the welcome screen: the countries and the palettes."""
+    os.makedirs(os.path.join(path, "JSON"))
+    shutil.copy(os.path.join(ROOT, "JSON", "palettes.json"), os.path.join(path, "JSON", "palettes.json"))
+    with open(os.path.join(path, "JSON", "countries.geojson"), "w", encoding="utf-8") as f:
+        json.dump(geo_data, f)
+
+
+def measure_import(cwd):
+    """
+    Import app.py in a new interpreter run from cwd; returns the timings and the lazy modules loaded.
+
+    The warm-up is turned off: its thread loads the data while the import is measured and prints alongside the
+    measured result.
+    """
+    result = subprocess.run([sys.executable, "-c", MEASURE.format(root=ROOT, modules=LAZY_MODULES)], cwd=cwd,
+                            env={**os.environ, "WARMUP": "false"}, capture_output=True, text=True, timeout=300,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestImportTime:
+    """Import-time benchmark of app.py."""
+
+    def test_welcome_screen_skips_heavy_imports(self, temp_dir, make_geo_data):
+        """Test that importing app.py and showing the welcome screen loads none of the lazy modules."""
+        make_app_dir(temp_dir, make_geo_data([{"code": "FR", "name": "France"}]))
+        timings = measure_import(temp_dir)
+        print(f"import streamlit: {timings['streamlit'] * 1000:.0f} ms, "
+              f"import app (welcome screen): {timings['app'] * 1000:.0f} ms")
+        assert timings["loaded"] == []
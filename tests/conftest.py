@@ -92,4 +92,39 @@ def mock_countries_geojson(temp_dir):
     with open(geojson_path, "w", encoding="utf-8") as f:
         json.dump(geojson_data, f)
     
-    yield geojson_path
\ No newline at end of file
+    yield geojson_path
+
+def rectangle(x0, y0, x1, y1):
+    """Return the closed ring of the rectangle from (x0, y0) to (x1, y1)."""
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+@pytest.fixture
+def make_geo_data():
+    """
+    Return a factory of small country FeatureCollections for testing.
+
+    The factory takes a list of countries, each an ISO code or a dict with a "code" and optionally:
+        name (str): Country name, "Country <code>" by default
+        box (tuple): (x0, y0, x1, y1) of the country's rectangle, by default the unit square at x = its position
+        holes (list): Boxes cut out of the rectangle
+        parts (list): Boxes of a MultiPolygon, drawn instead of the rectangle
+        properties (dict): Further feature properties
+    Every call returns new data, so tests may change it.
+    """
+    def make(countries):
+        features = []
+        for i, country in enumerate(countries):
+            if isinstance(country, str):
+                country = {"code": country}
+            if "parts" in country:
+                geometry = {"type": "MultiPolygon", "coordinates": [[rectangle(*box)] for box in country["parts"]]}
+            else:
+                rings = [rectangle(*country.get("box", (i, 0, i + 1, 1)))]
+                rings += [rectangle(*box) for box in country.get("holes", [])]
+                geometry = {"type": "Polygon", "coordinates": rings}
+            properties = {"name": country.get("name", f"Country {country['code']}"),
+                          "ISO3166-1-Alpha-2": country["code"], **country.get("properties", {})}
+            features.append({"type": "Feature", "properties": properties, "geometry": geometry})
+        return {"type": "FeatureCollection", "features": features}
+
+    return make
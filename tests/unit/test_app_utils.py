@@ -1,4 +1,5 @@
 import os
+import datetime
 import pytest
 import json
 import sys
@@ -9,6 +10,7 @@ from unittest.mock import patch, MagicMock
 # Add the parent directory to sys.path to import app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 import app
+import raster_utils
 
 
 class TestAppUtils:
@@ -77,6 +79,8 @@ class TestAppUtils:
             }
         }
         mock_get_palettes.return_value = mock_palettes
+        # Drop palettes cached by earlier tests, e.g. by a warm-up thread their main() started
+        app.load_palettes.clear()
 
         # Call the function
         palettes = app.load_palettes()
@@ -127,6 +131,301 @@ class TestAppUtils:
 
         assert geojson_layer is not None
 
+    def test_render_map_uses_cache(self, make_geo_data):
+        """Test that an unchanged map state is rendered once and then served from the cache."""
+        geo_data = make_geo_data([{"code": "US", "name": "United States"}, {"code": "CA", "name": "Canada"}])
+        players = {"player1": {"colour": "#FF0000", "visited": {"US"}}}
+        app.get_render_cache.clear()
+
+        with patch('app.MAP_COMPONENT', False), \
+                patch('app.build_map', wraps=app.build_map) as mock_build_map, \
+                patch('app.components.html') as mock_html:
+            app.render_map(players, geo_data)
+            app.render_map(players, geo_data)
+            assert mock_build_map.call_count == 1
+            assert mock_html.call_count == 2
+            assert mock_html.call_args_list[0] == mock_html.call_args_list[1]
+
+            players["player1"]["visited"].add("CA")
+            app.render_map(players, geo_data)
+            assert mock_build_map.call_count == 2
+
+    def test_render_map_png_uses_cache(self, make_geo_data):
+        """Test that PNG renders are cached by map state."""
+        geo_data = make_geo_data([{"code": "US", "name": "United States", "box": (0, 0, 10, 10)}])
+        players = {"player1": {"colour": "#FF0000", "visited": {"US"}}}
+        app.get_render_cache.clear()
+
+        with patch('raster_utils.RasterMap.render_png', autospec=True,
+                   side_effect=raster_utils.RasterMap.render_png) as mock_render_png:
+            png = app.render_map_png(players, geo_data, width=120, height=60)
+            assert png.startswith(b"\x89PNG")
+            assert app.render_map_png(players, geo_data, width=120, height=60) == png
+            assert mock_render_png.call_count == 1
+
+            players["player1"]["visited"] = set()
+            assert app.render_map_png(players, geo_data, width=120, height=60) != png
+            assert mock_render_png.call_count == 2
+
+    def test_map_png_download_is_deferred(self):
+        """Test that the PNG is only rendered when the download is clicked, from the selection at render time."""
+        selection = {"US"}
+        players = {"player1": {"colour": "#FF0000", "visited": selection}}
+
+        with patch('app.render_map_png', return_value=b"png") as mock_render_png, \
+                patch('app.st.download_button') as mock_download_button:
+            app.map_png_download(players, None, key="test_download")
+            mock_render_png.assert_not_called()
+
+            selection.add("CA")
+            data = mock_download_button.call_args[1]["data"]
+            assert data() == b"png"
+        mock_render_png.assert_called_once_with({"player1": {"colour": "#FF0000", "visited": frozenset({"US"})}},
+                                                None)
+        assert mock_download_button.call_args[1]["key"] == "test_download"
+
+    def test_render_map_component(self, make_geo_data):
+        """Test that the map component receives the visited styles and the legend."""
+        geo_data = make_geo_data([{"code": "US", "name": "United States"}, {"code": "CA", "name": "Canada"}])
+        players = {"player1": {"colour": "#FF0000", "visited": {"US"}}}
+
+        with patch('app.MAP_COMPONENT', True), patch('map_component.country_map') as mock_country_map:
+            app.render_map(players, geo_data, key="test_map")
+
+        args, kwargs = mock_country_map.call_args
+        assert args[0] is geo_data
+        assert args[2] == {"US": {"fillColor": "#FF0000", "fillOpacity": 0.7, "color": "#444", "weight": 0.5}}
+        assert kwargs["legend"] == [{"name": "player1", "colour": "#FF0000", "count": 1}]
+        assert kwargs["key"] == "test_map"
+
+    def test_build_map_with_tiles(self, make_geo_data):
+        """Test that a tile-backed map carries the visited styles but not the shapes."""
+        geo_data = make_geo_data([{"code": "US", "name": "United States"}])
+        players = {"player1": {"colour": "#FF0000", "visited": {"US"}}}
+        m = app.build_map(players, geo_data, tile_url="http://localhost:8765/tiles/{z}/{x}/{y}.json")
+        html = m.get_root().render()
+        assert "http://localhost:8765/tiles/{z}/{x}/{y}.json" in html
+        assert '"fillColor": "#FF0000"' in html
+        assert "coordinates" not in html
+
+    def test_apply_edited_rows(self):
+        """Test that only the edited rows of a data editor change the selection."""
+        codes = ["CA", "FR", "US"]
+        selection = {"US"}
+        edited_rows = {0: {"Visited": True}, 2: {"Visited": False}, 1: {"name": "ignored"}}
+        assert app.apply_edited_rows(selection, edited_rows, codes) == 2
+        assert selection == {"CA"}
+
+        # Edits are cumulative, so applying them again changes nothing
+        app.apply_edited_rows(selection, edited_rows, codes)
+        assert selection == {"CA"}
+
+    def test_sync_editor_selection(self):
+        """Test the editor callback in both modes."""
+        session_state = MagicMock()
+        session_state.single_player_selected_countries = {"US"}
+        session_state.multi_player_selections = {}
+        session_state.get.return_value = {"edited_rows": {1: {"Visited": True}}, "added_rows": [], "deleted_rows": []}
+
+        with patch('app.st.session_state', session_state):
+            app.sync_editor_selection("editor", ["CA", "FR"])
+            app.sync_editor_selection("editor", ["CA", "FR"], player_id="player1")
+
+        session_state.get.assert_called_with("editor")
+        assert session_state.single_player_selected_countries == {"US", "FR"}
+        assert session_state.multi_player_selections == {"player1": {"FR"}}
+
+    def test_reset_editors(self):
+        """Test that resetting gives editors keys never used before, so their edited rows are not replayed."""
+        for key in ["editor_generations", "editor_epoch", "single_player_selected_countries"]:
+            st.session_state.pop(key, None)
+        seen = {app.editor_generation("player1")}
+        other = app.editor_generation("player2")
+
+        app.reset_editors("player1")
+        assert app.editor_generation("player1") not in seen
+        assert app.editor_generation("player2") == other
+        seen.add(app.editor_generation("player1"))
+
+        st.session_state.single_player_selected_countries = {"US"}
+        app.reload_selections()
+        assert "single_player_selected_countries" not in st.session_state
+        assert app.editor_generation("player1") not in seen
+        assert app.editor_generation("player2") != other
+        for key in ["editor_generations", "editor_epoch"]:
+            st.session_state.pop(key, None)
+
+    def test_save_player_callback(self, temp_h5_file):
+        """Test that a player's save button writes the selection, keeps its visit dates and leaves a message."""
+        import h5_utils
+        h5_utils.add_player("player1", "#FF0000", temp_h5_file)
+        h5_utils.add_player("player2", "#00FF00", temp_h5_file)
+        h5_utils.update_visits("player1", ["US", "CA"], temp_h5_file, visit_dates=["2023-03-01", "2022-07-01"])
+        h5_utils.update_visits("player2", ["MX"], temp_h5_file, visit_dates=["2023-05-01"])
+        session_state = MagicMock()
+        session_state.multi_player_selections = {"player1": {"FR", "US"}, "player2": set()}
+
+        with patch('app.st.session_state', session_state), patch('app.DEFAULT_H5_FILE', temp_h5_file):
+            app.save_player_callback("player1")
+            app.save_player_callback("player2")
+
+        players = h5_utils.get_players(temp_h5_file)
+        assert players["player1"]["visited"] == {"FR", "US"}
+        assert players["player2"]["visited"] == set()
+        # Saving keeps the dated visits of the countries still visited
+        assert h5_utils.get_visits_between("player1", "2022-01-01", "2023-12-31", temp_h5_file) == \
+            [("US", datetime.date(2023, 3, 1))]
+        assert h5_utils.get_year_in_review(2023, temp_h5_file)["player1"]["new_countries"] == {"US"}
+        assert h5_utils.get_visits_between("player2", "2022-01-01", "2023-12-31", temp_h5_file) == []
+        session_state.__setitem__.assert_any_call(
+            "save_player1_success", "Updated visited countries for player1: 2 countries marked as visited")
+
+    def test_ensure_map_file(self, temp_dir):
+        """Test that the map file is created, opened once per version and replaced when corrupt."""
+        import h5py
+        path = os.path.join(temp_dir, "map.h5")
+        app.ensure_map_file(path)
+        assert h5py.is_hdf5(path)
+
+        with patch('h5py.File', wraps=h5py.File) as mock_file:
+            app.ensure_map_file(path)
+            app.ensure_map_file(path)
+        assert mock_file.call_count == 1
+
+        with open(path, "wb") as f:
+            f.write(b"not an HDF5 file")
+        app.ensure_map_file(path)
+        assert h5py.is_hdf5(path)
+        assert os.path.exists(f"{path}.bak")
+
+    def test_country_data_is_shared(self, temp_dir, monkeypatch, make_geo_data):
+        """Test that every rerun gets the same read-only geometry instead of a new copy."""
+        monkeypatch.chdir(temp_dir)
+        os.makedirs("JSON")
+        geo_data = make_geo_data([{"code": "FR", "name": "France"}])
+        for path in [app.GEOJSON_PATH, os.path.join("JSON", "countries.low.geojson")]:
+            with open(path, "w") as f:
+                json.dump(geo_data, f)
+        app.load_country_data.clear()
+        app.load_geometry_level.clear()
+
+        with patch('json.load', wraps=json.load) as mock_load:
+            shared, countries = app.load_country_data()
+            assert app.load_country_data()[0] is shared
+            level = app.load_geometry_level(os.path.join("JSON", "countries.low.geojson"))
+            assert app.load_geometry_level(os.path.join("JSON", "countries.low.geojson")) is level
+        assert mock_load.call_count == 2
+        assert shared == geo_data
+        assert countries == [{"name": "France", "code": "FR"}]
+
+        with pytest.raises(TypeError):
+            shared["features"][0]["properties"]["name"] = "Spain"
+        with pytest.raises(TypeError):
+            level["features"].clear()
+        app.load_country_data.clear()
+        app.load_geometry_level.clear()
+
+    def test_build_map_from_shared_data(self, temp_dir, monkeypatch, make_geo_data):
+        """Test that folium can draw the read-only country data when no property tells the features apart."""
+        monkeypatch.chdir(temp_dir)
+        os.makedirs("JSON")
+        geo_data = make_geo_data([{"code": "-99", "name": "Disputed"}] * 2)
+        with open(app.GEOJSON_PATH, "w") as f:
+            json.dump(geo_data, f)
+        app.load_country_data.clear()
+
+        shared, _ = app.load_country_data()
+        with patch('app.st.warning') as mock_warning:
+            m = app.build_map({"player1": {"colour": "#FF0000", "visited": {"US"}}}, shared)
+            html = m.get_root().render()
+        mock_warning.assert_not_called()
+        assert any(isinstance(child, folium.features.GeoJson) for child in m._children.values())
+        assert [feature["id"] for feature in shared["features"]] == ["0", "1"]
+        assert "Disputed" in html
+        app.load_country_data.clear()
+
+    def test_validate_data_files(self, temp_dir, monkeypatch):
+        """Test that a missing data file is reported and that a successful check is cached."""
+        monkeypatch.chdir(temp_dir)
+        app.validate_data_files.clear()
+        error, info = app.validate_data_files()
+        assert "JSON directory not found" in error
+
+        os.makedirs("JSON")
+        for name in ["countries.geojson", "palettes.json"]:
+            with open(os.path.join("JSON", name), "w") as f:
+                f.write("{}")
+        app.validate_data_files.clear()
+        assert app.validate_data_files() is None
+
+        with patch('os.path.exists') as mock_exists:
+            assert app.validate_data_files() is None
+        mock_exists.assert_not_called()
+        app.validate_data_files.clear()
+
+    @patch('app.start_warmup')
+    @patch('app.single_player_mode')
+    @patch('app.welcome_screen')
+    @patch('app.load_palettes')
+    @patch('app.get_country_index')
+    @patch('app.ensure_map_file')
+    def test_main_defers_data_loading(self, mock_ensure, mock_index, mock_palettes, mock_welcome, mock_single,
+                                      mock_warmup):
+        """Test that the welcome screen loads no data and a logged-in session does."""
+        st.session_state.logged_in = False
+        app.main()
+        mock_welcome.assert_called_once()
+        mock_warmup.assert_called_once()
+        for mock_loader in [mock_ensure, mock_index, mock_palettes]:
+            mock_loader.assert_not_called()
+
+        mock_index.return_value = ["FR"]
+        mock_palettes.return_value = {"default": ["#7ebce6"]}
+        st.session_state.logged_in = True
+        st.session_state.current_mode = "single"
+        with patch('app.validate_data_files', return_value=None):
+            try:
+                app.main()
+            finally:
+                st.session_state.logged_in = False
+        mock_ensure.assert_called_once()
+        mock_single.assert_called_once_with(None, ["FR"])
+
+    @patch('app.start_warmup')
+    @patch('app.load_country_data')
+    @patch('app.get_country_index', return_value=[])
+    @patch('app.ensure_map_file')
+    def test_main_retries_failed_load(self, mock_ensure, mock_index, mock_load, mock_warmup):
+        """Test that a failed load, e.g. by the warm-up thread, is not kept for later runs."""
+        st.session_state.logged_in = True
+        with patch('app.validate_data_files', return_value=None), patch('app.st.error') as mock_error:
+            try:
+                app.main()
+            finally:
+                st.session_state.logged_in = False
+        mock_error.assert_called_once()
+        mock_index.clear.assert_called_once()
+        mock_load.clear.assert_called_once()
+
+    @patch('app.get_map_geometry')
+    @patch('app.load_palettes')
+    @patch('app.get_country_index')
+    def test_start_warmup(self, mock_index, mock_palettes, mock_geometry):
+        """Test that the warm-up thread fills the caches once per process, once the data files are there."""
+        app.start_warmup_thread.clear()
+        with patch('app.validate_data_files', return_value=("JSON directory not found", "")):
+            assert app.start_warmup() is None
+        mock_index.assert_not_called()
+
+        with patch('app.validate_data_files', return_value=None):
+            thread = app.start_warmup()
+            thread.join(timeout=5)
+            assert app.start_warmup() is thread
+        mock_index.assert_called_once()
+        mock_palettes.assert_called_once()
+        mock_geometry.assert_called_once_with(None)
+        app.start_warmup_thread.clear()
+
     @patch('streamlit.secrets.get')
     def test_setup_oauth(self, mock_secrets_get):
         """Test setting up OAuth configuration."""
@@ -138,7 +437,7 @@ class TestAppUtils:
         }.get(key, default)
 
         # Mock the OAuth2Component class
-        with patch('app.OAuth2Component') as mock_oauth2_component:
+        with patch('streamlit_oauth.OAuth2Component') as mock_oauth2_component:
             mock_oauth2_instance = MagicMock()
             mock_oauth2_component.return_value = mock_oauth2_instance
 
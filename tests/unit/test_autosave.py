@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import autosave
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import autosave
+import h5_utils
+
+
+class TestAutosave:
+    """Test suite for autosave.py."""
+
+    @patch('autosave.h5_utils.save_selections')
+    def test_coalesces_changes(self, mock_save):
+        """Test that a burst of changes becomes one batched write of the latest selections."""
+        writer = autosave.AutosaveWriter("test.h5", delay=60, max_delay=60)
+        selection = {"US"}
+        writer.submit("player1", selection)
+        selection.add("FR")
+        writer.submit("player1", selection)
+        writer.submit("player2", {"CA"})
+        # The queued selection is a copy
+        selection.add("MX")
+        assert writer.pending() == 2
+        assert not mock_save.called
+
+        assert writer.flush(timeout=5)
+        mock_save.assert_called_once_with({"player1": frozenset({"US", "FR"}), "player2": frozenset({"CA"})},
+                                          "test.h5")
+        assert writer.pending() == 0
+        assert writer.saved_at is not None
+        assert writer.close(timeout=5)
+
+    @patch('autosave.h5_utils.save_selections')
+    def test_debounce(self, mock_save):
+        """Test that changes are written once no change arrived for the delay, without a flush."""
+        written = threading.Event()
+        mock_save.side_effect = lambda batch, filename: written.set()
+        writer = autosave.AutosaveWriter("test.h5", delay=0.05, max_delay=1)
+        writer.submit("player1", {"US"})
+        assert written.wait(timeout=5)
+        mock_save.assert_called_once_with({"player1": frozenset({"US"})}, "test.h5")
+        writer.close(timeout=5)
+
+    @patch('autosave.h5_utils.save_selections')
+    def test_failed_write_is_retried(self, mock_save):
+        """Test that a failed write keeps the changes queued, behind any newer selection."""
+        mock_save.side_effect = [OSError("disk full"), None]
+        writer = autosave.AutosaveWriter("test.h5", delay=60, max_delay=60)
+        writer.submit("player1", {"US"})
+
+        assert not writer.flush(timeout=5)
+        assert "disk full" in writer.error
+        assert writer.pending() == 1
+
+        writer.submit("player1", {"US", "FR"})
+        assert writer.flush(timeout=5)
+        assert writer.error is None
+        assert mock_save.call_args[0][0] == {"player1": frozenset({"US", "FR"})}
+        writer.close(timeout=5)
+
+    @patch('autosave.h5_utils.save_selections')
+    def test_discard(self, mock_save):
+        """Test that discarded changes are never written."""
+        writer = autosave.AutosaveWriter("test.h5", delay=60, max_delay=60)
+        writer.submit("player1", {"US"})
+        writer.submit("player2", {"CA"})
+        writer.discard("player1")
+        assert writer.flush(timeout=5)
+        mock_save.assert_called_once_with({"player2": frozenset({"CA"})}, "test.h5")
+
+        writer.submit("player1", {"US"})
+        writer.discard()
+        assert writer.pending() == 0
+        writer.close(timeout=5)
+
+    @patch('autosave.h5_utils.save_selections')
+    def test_discard_during_write(self, mock_save):
+        """Test that a batch the writer already took is not written or retried for a discarded player."""
+        writer = autosave.AutosaveWriter("test.h5", delay=60, max_delay=60)
+        writer.submit("player1", {"US"})
+        writer.submit("player2", {"CA"})
+
+        # The writer takes the batch, then waits for the file while the player is cleared
+        with h5_utils.FILE_LOCK:
+            assert not writer.flush(timeout=0.2)
+            assert not writer._pending
+            writer.discard("player1")
+        assert writer.flush(timeout=5)
+        mock_save.assert_called_once_with({"player2": frozenset({"CA"})}, "test.h5")
+
+        # A failed batch is not queued again for players discarded meanwhile
+        mock_save.reset_mock()
+        mock_save.side_effect = [OSError("disk full"), None]
+        writer.submit("player1", {"US"})
+        writer.submit("player2", {"CA", "MX"})
+        assert not writer.flush(timeout=5)
+        writer.discard()
+        assert writer.pending() == 0
+        assert writer.flush(timeout=5)
+        assert mock_save.call_count == 1
+
+        # Selections made after a discard are written again
+        writer.submit("player1", {"FR"})
+        assert writer.flush(timeout=5)
+        mock_save.assert_called_with({"player1": frozenset({"FR"})}, "test.h5")
+        writer.close(timeout=5)
+
+    def test_writes_while_reading(self, temp_h5_file):
+        """Test that the writer thread and readers share the file without HDF5 open errors."""
+        h5_utils.add_player("player1", "#FF0000", temp_h5_file)
+        writer = autosave.get_writer(temp_h5_file)
+        assert autosave.get_writer(temp_h5_file) is writer
+        assert autosave.get_writer(os.path.join(os.path.dirname(temp_h5_file), "other.h5"), create=False) is None
+
+        codes = ["US", "CA", "MX", "FR", "DE"]
+        for i in range(len(codes)):
+            writer.submit("player1", codes[:i + 1])
+            h5_utils.get_players(temp_h5_file)
+            time.sleep(0.01)
+        assert writer.flush(timeout=10)
+        assert writer.error is None
+        assert h5_utils.get_players(temp_h5_file)["player1"]["visited"] == set(codes)
+        assert writer.close(timeout=5)
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path to import bundle_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import bundle_utils
+import geo_utils
+
+
+# Countries with mixed property types, a MultiPolygon, a hole and a non-country feature
+COUNTRIES = [
+    {"code": "ZZ", "name": "Zeta", "box": (0, 0, 4, 4), "holes": [(1, 1, 2, 2)],
+     "properties": {"pop_est": 1000, "area": 1.5}},
+    {"code": "AA", "name": "Alpha", "parts": [(10, 0, 11, 1), (12, 0, 13, 1)],
+     "properties": {"pop_est": 20, "area": None}},
+    {"code": "-99", "name": "Disputed", "box": (20, 0, 21, 1)},
+]
+
+
+@pytest.fixture
+def source_path(temp_dir, make_geo_data):
+    """Write the sample countries to a GeoJSON file."""
+    path = os.path.join(temp_dir, "countries.geojson")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_geo_data(COUNTRIES), f)
+    return path
+
+
+class TestBundleUtils:
+    """Test suite for bundle_utils.py functions."""
+
+    def test_round_trip(self, source_path, make_geo_data):
+        """Test that a bundle reproduces the country list, properties and geometry."""
+        path = bundle_utils.build_country_bundle(source_path)
+        assert path == bundle_utils.bundle_path(source_path) == source_path + ".bundle"
+
+        bundle = bundle_utils.load_country_bundle(source_path)
+        assert len(bundle) == 3
+        assert bundle.countries() == [{"name": "Alpha", "code": "AA"}, {"name": "Zeta", "code": "ZZ"}]
+        assert isinstance(bundle.coords, np.memmap)
+
+        # Properties keep their types; missing keys stay missing
+        assert bundle.feature_properties(0) == {"name": "Zeta", "ISO3166-1-Alpha-2": "ZZ", "pop_est": 1000,
+                                                "area": 1.5}
+        assert isinstance(bundle.feature_properties(0)["pop_est"], int)
+        assert bundle.feature_properties(2) == {"name": "Disputed", "ISO3166-1-Alpha-2": "-99"}
+
+        geo_data = make_geo_data(COUNTRIES)
+        rebuilt = bundle.to_geojson()
+        for original, feature in zip(geo_data["features"], rebuilt["features"]):
+            assert feature["geometry"] == original["geometry"]
+
+    def test_topojson_source(self, temp_dir, make_geo_data):
+        """Test bundling a TopoJSON file."""
+        path = os.path.join(temp_dir, "countries.topojson")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(geo_utils.geojson_to_topojson(make_geo_data(COUNTRIES)), f)
+
+        bundle_utils.build_country_bundle(path)
+        bundle = bundle_utils.load_country_bundle(path)
+        assert [c["code"] for c in bundle.countries()] == ["AA", "ZZ"]
+        assert bundle.to_geojson()["features"][1]["geometry"]["type"] == "MultiPolygon"
+
+    def test_invalidation(self, source_path, make_geo_data):
+        """Test that the bundle is dropped when the source changes, but not when it is only touched."""
+        assert bundle_utils.load_country_bundle(source_path) is None
+        bundle_utils.build_country_bundle(source_path)
+
+        # Same contents, new mtime: still valid, and the new mtime is recorded
+        os.utime(source_path, ns=(0, 1))
+        assert bundle_utils.load_country_bundle(source_path) is not None
+        with open(os.path.join(bundle_utils.bundle_path(source_path), "meta.json"), encoding="utf-8") as f:
+            assert json.load(f)["mtime_ns"] == 1
+
+        geo_data = make_geo_data(COUNTRIES)
+        geo_data["features"][0]["properties"]["name"] = "Omega"
+        with open(source_path, "w", encoding="utf-8") as f:
+            json.dump(geo_data, f)
+        assert bundle_utils.load_country_bundle(source_path) is None
+
+        bundle_utils.build_country_bundle(source_path)
+        assert bundle_utils.load_country_bundle(source_path).countries()[1]["name"] == "Omega"
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import numpy as np
+
+# Add the parent directory to sys.path to import colour_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import colour_utils
+import h5_utils
+
+PALETTES_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "JSON", "palettes.json")
+
+
+class TestColourUtils:
+    """Test suite for colour_utils.py functions."""
+
+    def test_hex_conversions(self):
+        """Test hex <-> RGB conversion and normalization."""
+        rgb = colour_utils.hex_to_rgb(["#FF0000", "00ff80", "bad", "#zzzzzz"])
+        assert rgb.tolist() == [[255, 0, 0], [0, 255, 128], [119, 119, 119], [119, 119, 119]]
+        assert colour_utils.rgb_to_hex(rgb[:2]) == ["#ff0000", "#00ff80"]
+
+    def test_rgb_to_lab_matches_palettes_json(self):
+        """Test that the Lab conversion agrees with the Lab values shipped in palettes.json."""
+        with open(PALETTES_JSON, encoding="utf-8") as f:
+            colors = [c for p in json.load(f)["palettes"] for c in p["colors"] if c.get("lab")]
+        lab = colour_utils.rgb_to_lab([c["rgb"] for c in colors])
+        np.testing.assert_allclose(lab, [c["lab"] for c in colors], atol=1.5)
+
+    def test_registry_exact_lookup(self, mock_palettes_json):
+        """Test the O(1) exact-hex index."""
+        registry = colour_utils.PaletteRegistry.from_json(mock_palettes_json)
+
+        assert len(registry) == 3
+        assert registry.index_of("ff0000") == registry.index_of("#FF0000") >= 0
+        assert registry.index_of("#123456") == -1
+        assert registry.name_of("#00FF00") == "Color #00FF00"
+        assert registry.name_of("#123456", "unknown") == "unknown"
+        assert registry.palettes["Test Palette"] == ["#FF0000", "#00FF00", "#0000FF"]
+
+    def test_registry_nearest_names(self):
+        """Test the vectorized nearest-colour lookup."""
+        registry = colour_utils.PaletteRegistry.from_json(PALETTES_JSON)
+
+        # Exact palette colours map to themselves
+        assert list(registry.nearest_names(["#a24936", "#7ebce6"])) == ["Chestnut", "Maya Blue"]
+        # Slightly perturbed colours map to the closest palette colour
+        assert list(registry.nearest_names(["#a04a38", "#80bde5"])) == ["Chestnut", "Maya Blue"]
+
+        many = registry.nearest(["#a24936"] * 5000)
+        assert many.shape == (5000,)
+        assert (many == registry.index_of("#a24936")).all()
+
+    def test_load_palette_registry_is_cached(self, mock_palettes_json):
+        """Test that the registry is compiled once per file version."""
+        first = colour_utils.load_palette_registry(mock_palettes_json)
+        assert colour_utils.load_palette_registry(mock_palettes_json) is first
+
+        with open(mock_palettes_json, "w", encoding="utf-8") as f:
+            json.dump({"palettes": [{"paletteName": "Other", "colors": [{"hex": "123456", "name": "Ink"}]}]}, f)
+        os.utime(mock_palettes_json, ns=(0, 1))
+
+        second = colour_utils.load_palette_registry(mock_palettes_json)
+        assert second is not first
+        assert second.name_of("#123456") == "Ink"
+
+    def test_get_color_name(self):
+        """Test the Colors class reverse lookup."""
+        assert h5_utils.Colors.get_color_name("#16697A") == "CARIBBEAN_CURRENT"
+        assert h5_utils.Colors.get_color_name("16697a") == "CARIBBEAN_CURRENT"
+        assert h5_utils.Colors.get_color_name("#123456") == "#123456"
+
+    def test_lab_round_trip(self):
+        """Test that Lab -> RGB inverts RGB -> Lab."""
+        rgb = np.array([[0, 0, 0], [255, 255, 255], [162, 73, 54], [22, 105, 122]])
+        np.testing.assert_allclose(colour_utils.lab_to_rgb(colour_utils.rgb_to_lab(rgb)), rgb, atol=0.01)
+
+    def test_colour_mixer_rms(self):
+        """Test RMS mixing and memoization by colour set."""
+        mixer = colour_utils.ColourMixer(maxsize=2)
+
+        # sqrt((255^2 + 0) / 2) = 180.3 -> 180 = 0xb4
+        assert mixer.mix(["#FF0000", "#0000FF"]) == "#b400b4"
+        # Same set in another order and case is a cache hit
+        assert mixer.mix(["0000ff", "#ff0000"]) == "#b400b4"
+        assert mixer.cache_info()["hits"] == 1
+        assert mixer.cache_info()["misses"] == 1
+
+    def test_colour_mixer_duplicate_colours(self):
+        """Test that a colour shared by several owners counts once per owner."""
+        mixer = colour_utils.ColourMixer()
+
+        # sqrt(2 * 255^2 / 3) = 208.2 -> 0xd0 and sqrt(255^2 / 3) = 147.2 -> 0x93
+        assert mixer.mix(["#ff0000", "#FF0000", "#0000ff"]) == "#d00093"
+        assert mixer.mix(["#0000ff", "#ff0000"]) == "#b400b4"
+        assert mixer.cache_info()["misses"] == 2
+
+    def test_colour_mixer_lru_eviction(self):
+        """Test that the memo is bounded with least-recently-used eviction."""
+        mixer = colour_utils.ColourMixer(maxsize=2)
+        mixer.mix(["#ff0000", "#0000ff"])
+        mixer.mix(["#ff0000", "#00ff00"])
+        mixer.mix(["#ff0000", "#0000ff"])  # refresh the first entry
+        mixer.mix(["#00ff00", "#0000ff"])  # evicts the red/green entry
+
+        assert mixer.cache_info()["size"] == 2
+        mixer.mix(["#ff0000", "#0000ff"])
+        assert mixer.cache_info()["hits"] == 2
+        mixer.mix(["#ff0000", "#00ff00"])
+        assert mixer.cache_info()["misses"] == 4
+
+    def test_colour_mixer_lab_model(self):
+        """Test the Lab model and custom pluggable models."""
+        registry = colour_utils.PaletteRegistry.from_json(PALETTES_JSON)
+        lab_mixer = colour_utils.ColourMixer(model=colour_utils.LabMix(registry))
+
+        # Mixing a colour with itself returns (approximately) the same colour
+        mixed = colour_utils.hex_to_rgb([lab_mixer.mix(["#7ebce6"])])[0].astype(int)
+        assert np.abs(mixed - [126, 188, 230]).max() <= 3
+        # Black and white average to a mid grey in Lab space
+        assert lab_mixer.mix(["#000000", "#ffffff"]) == "#777777"
+
+        custom_mixer = colour_utils.ColourMixer(model=lambda hex_codes: [1, 2, 3])
+        assert custom_mixer.mix(["#ff0000", "#00ff00"]) == "#010203"
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path to import country_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import bundle_utils
+import country_index
+import geo_utils
+
+
+# Three countries, one without population or continent, and a non-country feature
+COUNTRIES = [
+    {"code": "ZZ", "name": "Zeta", "box": (0, 0, 2, 2), "properties": {"continent": "Europe", "pop_est": 1000}},
+    {"code": "CI", "name": "Côte d'Ivoire", "box": (10, 0, 11, 1),
+     "properties": {"ISO3166-1-Alpha-3": "CIV", "continent": "Africa", "pop_est": 30}},
+    {"code": "AA", "name": "Alpha", "box": (20, 0, 21, 1)},
+    {"code": "-99", "name": "Disputed", "box": (30, 0, 31, 1), "properties": {"pop_est": 5}},
+]
+
+
+class TestCountryIndex:
+    """Test suite for country_index.py."""
+
+    def test_columns(self, make_geo_data):
+        """Test that the index holds the countries sorted by name, with read-only columns."""
+        index = country_index.CountryIndex.from_geo_data(make_geo_data(COUNTRIES))
+        assert len(index) == 3
+        assert index.codes.tolist() == ["AA", "CI", "ZZ"]
+        assert index.codes3.tolist() == ["", "CIV", ""]
+        assert index.normalized.tolist() == ["alpha", "cote d'ivoire", "zeta"]
+        assert index.continents.tolist() == ["", "Africa", "Europe"]
+        assert np.isnan(index.populations[0]) and index.populations[2] == 1000
+        assert index.rows["ZZ"] == 2
+        assert index.countries()[1] == {"name": "Côte d'Ivoire", "code": "CI"}
+
+        # A 1x1 degree cell at the equator is about 12,364 km²; the 2x2 one is four times that
+        assert index.areas[0] == pytest.approx(12364, rel=0.01)
+        assert index.areas[2] == pytest.approx(4 * index.areas[0], rel=0.01)
+
+        with pytest.raises(ValueError):
+            index.codes[0] = "XX"
+        with pytest.raises(TypeError):
+            index.rows["XX"] = 0
+
+    def test_search_and_frame(self, make_geo_data):
+        """Test search by name, code and alias, and the table built from the matches."""
+        index = country_index.CountryIndex.from_geo_data(make_geo_data(COUNTRIES))
+        assert index.search("").tolist() == [0, 1, 2]
+        assert index.search("CÔTE").tolist() == [1]
+        assert index.search("cote").tolist() == [1]
+        assert index.search("ivory").tolist() == [1]
+        assert index.search("civ").tolist() == [1]
+        assert index.search("nowhere").tolist() == []
+
+        # Queries match inside words, however short
+        assert index.search("eta").tolist() == [2]
+        assert index.search("ph").tolist() == [0]
+        frame = index.frame(index.search("z"))
+        assert frame["code"].tolist() == ["ZZ"]
+        assert list(frame.columns) == ["name", "code"]
+        assert index.mask({"ZZ", "unknown"})[index.search("")].tolist() == [False, False, True]
+
+    def test_frame(self, make_geo_data):
+        """Test that tables are categorical copies of the base table with a vectorized Visited column."""
+        index = country_index.CountryIndex.from_geo_data(make_geo_data(COUNTRIES))
+        frame = index.frame(np.array([2, 0]), selected={"ZZ"})
+        assert frame["code"].tolist() == ["ZZ", "AA"]
+        assert frame["Visited"].tolist() == [True, False]
+        assert str(frame["code"].dtype) == "category" and str(frame["name"].dtype) == "category"
+
+        # The shared base table is never changed
+        frame.loc[frame.index[0], "Visited"] = False
+        assert list(index.table.columns) == ["name", "code"]
+        assert index.frame(selected=set())["Visited"].tolist() == [False, False, False]
+
+    def test_duplicate_codes(self, make_geo_data):
+        """Test that every row with a selected code is marked, as the country list did before."""
+        geo_data = make_geo_data(COUNTRIES)
+        geo_data["features"][2]["properties"]["ISO3166-1-Alpha-2"] = "ZZ"
+        index = country_index.CountryIndex.from_geo_data(geo_data)
+        assert index.rows["ZZ"] == 0
+        assert index.mask({"ZZ"}).tolist() == [True, False, True]
+        assert index.frame(selected={"ZZ"})["Visited"].tolist() == [True, False, True]
+
+    def test_summary(self, make_geo_data):
+        """Test the statistics of a visited set."""
+        index = country_index.CountryIndex.from_geo_data(make_geo_data(COUNTRIES))
+        summary = index.summary({"ZZ", "AA", "unknown"})
+        assert summary["countries"] == 2
+        assert summary["continents"] == 1
+        assert summary["population"] == 1000
+        assert summary["population_share"] == pytest.approx(1000 / 1030)
+        assert summary["area_share"] == pytest.approx(5 / 6, rel=0.01)
+        assert index.summary(set())["countries"] == 0
+
+    def test_from_bundle(self, temp_dir, make_geo_data):
+        """Test that an index read from a bundle matches one built from the source data."""
+        path = os.path.join(temp_dir, "countries.topojson")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(geo_utils.geojson_to_topojson(make_geo_data(COUNTRIES)), f)
+        bundle_utils.build_country_bundle(path)
+
+        expected = country_index.CountryIndex.from_geo_data(make_geo_data(COUNTRIES))
+        index = country_index.CountryIndex.from_bundle(bundle_utils.load_country_bundle(path))
+        assert index.codes.tolist() == expected.codes.tolist()
+        assert index.codes3.tolist() == expected.codes3.tolist()
+        assert index.continents.tolist() == expected.continents.tolist()
+        np.testing.assert_array_equal(index.populations, expected.populations)
+        np.testing.assert_allclose(index.areas, expected.areas, rtol=1e-3)
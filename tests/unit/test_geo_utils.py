@@ -0,0 +1,198 @@
+import copy
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path to import geo_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import geo_utils
+
+
+def wiggly_line(start, end, n=50, amplitude=0.001):
+    """Points from start to end with tiny noise that simplification should remove."""
+    t = np.linspace(0, 1, n)
+    points = np.outer(1 - t, start) + np.outer(t, end)
+    points[1:-1, 1] += amplitude * np.sin(np.arange(1, n - 1))
+    return [list(p) for p in points.round(6)]
+
+
+def two_neighbours():
+    """Two squares sharing a noisy border along x=1."""
+    border = wiggly_line((1, 0), (1, 1))
+    west = [[0, 0]] + border + [[0, 1], [0, 0]]
+    east = [[1, 1]] + border[::-1][1:] + [[2, 0], [2, 1], [1, 1]]
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {"name": "West", "ISO3166-1-Alpha-2": "WW"},
+             "geometry": {"type": "Polygon", "coordinates": [west]}},
+            {"type": "Feature", "properties": {"name": "East", "ISO3166-1-Alpha-2": "EE"},
+             "geometry": {"type": "MultiPolygon", "coordinates": [
+                 [east],
+                 # A tiny island that collapses when simplified
+                 [[[5, 5], [5.0001, 5], [5.0001, 5.0001], [5, 5]]],
+             ]}},
+        ]
+    }
+
+
+class TestGeoUtils:
+    """Test suite for geo_utils.py functions."""
+
+    def test_geometry_level_path(self):
+        """Test derived level file names."""
+        path = geo_utils.geometry_level_path("low", os.path.join("JSON", "countries.geojson"))
+        assert path == os.path.join("JSON", "countries.low.geojson")
+
+    def test_pick_geometry_level(self):
+        """Test that larger maps get finer levels."""
+        assert geo_utils.pick_geometry_level(1200, 600) == "low"
+        assert geo_utils.pick_geometry_level(8000, 4000) == "medium"
+        assert geo_utils.pick_geometry_level(100000, 50000) == "high"
+
+    def test_simplify_preserves_shared_border(self):
+        """Test that both neighbours keep exactly the same simplified border."""
+        simplified = geo_utils.simplify_geojson(two_neighbours(), tolerance=0.01, digits=4)
+        west, east = simplified["features"]
+
+        west_ring = [tuple(p) for p in west["geometry"]["coordinates"][0]]
+        east_ring = [tuple(p) for p in east["geometry"]["coordinates"][0]]
+        west_border = [p for p in west_ring if p[0] == 1]
+        east_border = [p for p in east_ring if p[0] == 1]
+
+        # The noisy border collapses to its endpoints on both sides
+        assert sorted(set(west_border)) == sorted(set(east_border)) == [(1.0, 0.0), (1.0, 1.0)]
+        assert len(west_ring) < 10
+        assert west_ring[0] == west_ring[-1]
+
+        # The collapsed island is dropped and the properties are preserved
+        assert east["geometry"]["type"] == "Polygon"
+        assert east["properties"] == {"name": "East", "ISO3166-1-Alpha-2": "EE"}
+
+    def test_simplify_keeps_tiny_countries(self, make_geo_data):
+        """Test that a country too small for the tolerance keeps its outline."""
+        geo_data = make_geo_data([{"code": "TT", "name": "Tiny", "box": (0, 0, 0.001, 0.001)}])
+        simplified = geo_utils.simplify_geojson(geo_data, tolerance=1.0, digits=4)
+        assert simplified["features"][0]["geometry"] == geo_data["features"][0]["geometry"]
+
+    def test_build_geometry_levels(self, temp_dir):
+        """Test that each level is written and smaller than the source."""
+        source = os.path.join(temp_dir, "countries.geojson")
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(two_neighbours(), f)
+
+        written = geo_utils.build_geometry_levels(source)
+
+        assert set(written) == set(geo_utils.GEOMETRY_LEVELS)
+        for level, (path, size) in written.items():
+            assert path == geo_utils.geometry_level_path(level, source)
+            assert size < os.path.getsize(source)
+            with open(path, encoding="utf-8") as f:
+                assert len(json.load(f)["features"]) == 2
+
+    def test_topojson_round_trip(self):
+        """Test that TopoJSON stores the shared border once and decodes back to the same shapes."""
+        geo_data = two_neighbours()
+        topology = geo_utils.geojson_to_topojson(geo_data, digits=4)
+
+        assert geo_utils.is_topology(topology)
+        assert not geo_utils.is_topology(geo_data)
+        west, east = topology["objects"][geo_utils.TOPOJSON_OBJECT]["geometries"]
+        # The border is one arc, referenced forwards by one neighbour and backwards by the other
+        shared = {i if i >= 0 else ~i for i in west["arcs"][0]} & {i if i >= 0 else ~i for i in east["arcs"][0][0]}
+        assert len(shared) == 1
+        assert all(isinstance(value, int) for arc in topology["arcs"] for point in arc for value in point)
+
+        decoded = geo_utils.topojson_to_geojson(topology)
+        for original, feature in zip(geo_data["features"], decoded["features"]):
+            assert feature["properties"] == original["properties"]
+            assert feature["geometry"]["type"] == original["geometry"]["type"]
+            for ring, original_ring in zip(geo_utils.geometry_polygons(feature["geometry"])[0],
+                                           geo_utils.geometry_polygons(original["geometry"])[0]):
+                # Rings start at a junction, so match each point to its nearest original point
+                assert len(ring) == len(original_ring)
+                assert ring[0] == ring[-1]
+                offsets = np.abs(np.array(ring)[:, None, :] - np.array(original_ring)[None, :, :]).max(axis=2)
+                assert offsets.min(axis=1).max() <= 0.00005 + 1e-9
+
+    def test_geometry_polygons(self):
+        """Test getting the polygons of Polygon, MultiPolygon and other geometries."""
+        square = [[[0, 0], [1, 0], [1, 1], [0, 0]]]
+        assert geo_utils.geometry_polygons({"type": "Polygon", "coordinates": square}) == [square]
+        assert geo_utils.geometry_polygons({"type": "MultiPolygon", "coordinates": [square, square]}) == \
+            [square, square]
+        assert geo_utils.geometry_polygons({"type": "Point", "coordinates": [0, 0]}) == []
+        assert geo_utils.geometry_polygons(None) == []
+
+    def test_feature_properties(self):
+        """Test reading properties from GeoJSON and TopoJSON alike."""
+        geo_data = two_neighbours()
+        topology = geo_utils.geojson_to_topojson(geo_data)
+        expected = [{"name": "West", "ISO3166-1-Alpha-2": "WW"}, {"name": "East", "ISO3166-1-Alpha-2": "EE"}]
+        assert geo_utils.feature_properties(geo_data) == expected
+        assert geo_utils.feature_properties(topology) == expected
+
+    def test_copy_topology_properties(self):
+        """Test that styling a copy leaves the original topology untouched."""
+        topology = geo_utils.geojson_to_topojson(two_neighbours())
+        copy = geo_utils.copy_topology_properties(topology)
+        for geometry in copy["objects"][geo_utils.TOPOJSON_OBJECT]["geometries"]:
+            geometry["properties"]["style"] = {"fillColor": "#ff0000"}
+
+        assert copy["arcs"] is topology["arcs"]
+        assert all("style" not in properties for properties in geo_utils.feature_properties(topology))
+
+    def test_freeze(self):
+        """Test that frozen data refuses changes but still serializes, compares and copies like JSON."""
+        geo_data = geo_utils.freeze(two_neighbours())
+        feature = geo_data["features"][0]
+        with pytest.raises(TypeError):
+            feature["properties"]["name"] = "North"
+        with pytest.raises(TypeError):
+            geo_data["features"].append(feature)
+        with pytest.raises(TypeError):
+            feature["geometry"]["coordinates"][0].pop()
+        assert geo_data == two_neighbours()
+        assert json.loads(json.dumps(geo_data)) == two_neighbours()
+
+        # Styling a topology copy still works, as build_map does for folium.TopoJson
+        topology = geo_utils.freeze(geo_utils.geojson_to_topojson(two_neighbours()))
+        styled = geo_utils.copy_topology_properties(topology)
+        styled["objects"][geo_utils.TOPOJSON_OBJECT]["geometries"][0]["properties"]["style"] = {}
+
+        changeable = copy.deepcopy(geo_data)
+        changeable["features"][0]["properties"]["name"] = "North"
+        assert type(changeable["features"]) is list
+        assert geo_data["features"][0]["properties"]["name"] == "West"
+
+    def test_add_feature_ids(self):
+        """Test that ids are only added where folium would add them, i.e. when nothing tells features apart."""
+        geo_data = two_neighbours()
+        assert geo_utils.add_feature_ids(geo_data) == two_neighbours()
+
+        for feature in geo_data["features"]:
+            feature["properties"] = {"name": "Disputed"}
+        geo_utils.add_feature_ids(geo_data)
+        assert [feature["id"] for feature in geo_data["features"]] == ["0", "1"]
+        frozen = geo_utils.freeze(geo_data)
+        assert geo_utils.add_feature_ids(frozen) is frozen
+
+        topology = geo_utils.geojson_to_topojson(two_neighbours())
+        assert geo_utils.add_feature_ids(topology) == geo_utils.geojson_to_topojson(two_neighbours())
+
+    def test_build_topojson_assets(self, temp_dir):
+        """Test that the TopoJSON assets are written and smaller than the source."""
+        source = os.path.join(temp_dir, "countries.geojson")
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(two_neighbours(), f)
+
+        written = geo_utils.build_topojson_assets(source, ["low"])
+
+        assert written[None][0] == os.path.join(temp_dir, "countries.topojson")
+        assert written["low"][0] == os.path.join(temp_dir, "countries.low.topojson")
+        for path, size in written.values():
+            assert size < os.path.getsize(source)
+            with open(path, encoding="utf-8") as f:
+                assert len(geo_utils.feature_properties(json.load(f))) == 2
@@ -2,7 +2,7 @@ import os
 import pytest
 import h5py
 import numpy as np
-from datetime import datetime, UTC
+from datetime import date, datetime, UTC
 import sys
 import json
 
@@ -90,6 +90,65 @@ class TestH5Utils:
             for i, country in enumerate(all_countries):
                 assert visited[i] == country
 
+    def test_update_visits_with_dates(self, temp_h5_file):
+        """Test that dated visits are stored as packed records sorted by day."""
+        h5_utils.add_player("test_player", "#FF0000", temp_h5_file)
+
+        h5_utils.update_visits("test_player", ["FR", "US", "CA"], temp_h5_file,
+                               visit_dates=["2023-06-01", date(2021, 3, 15), None])
+        h5_utils.update_visits("test_player", ["FR"], temp_h5_file,
+                               visit_dates=[datetime(2022, 1, 2, 10, 30)])
+
+        with h5py.File(temp_h5_file, "r") as f:
+            # The plain visited list is unchanged by dates
+            assert len(f["/players/test_player/visited"]) == 4
+            records = f["/players/test_player/visit_dates"][...]
+            codes = list(f["/countries/codes"].asstr()[...])
+
+        assert records.dtype == h5_utils.VISIT_DTYPE
+        assert list(np.diff(records["day"]) >= 0) == [True, True]
+        assert [codes[i] for i in records["country_idx"]] == ["US", "FR", "FR"]
+        # Each code is registered once
+        assert sorted(codes) == ["FR", "US"]
+
+        with pytest.raises(ValueError):
+            h5_utils.update_visits("test_player", ["DE"], temp_h5_file, visit_dates=[])
+
+    def test_get_visits_between(self, temp_h5_file):
+        """Test range queries over dated visits."""
+        h5_utils.add_player("test_player", "#FF0000", temp_h5_file)
+        h5_utils.update_visits("test_player", ["FR", "US", "DE", "IT"], temp_h5_file,
+                               visit_dates=["2023-06-01", "2021-03-15", "2023-12-31", "2024-01-01"])
+
+        visits = h5_utils.get_visits_between("test_player", "2023-01-01", "2023-12-31", temp_h5_file)
+        assert visits == [("FR", date(2023, 6, 1)), ("DE", date(2023, 12, 31))]
+
+        assert h5_utils.get_visits_between("test_player", "1999-01-01", "1999-12-31", temp_h5_file) == []
+        assert h5_utils.get_visits_between("non_existent", "2023-01-01", "2023-12-31", temp_h5_file) == []
+
+    def test_get_countries_first_visited_in(self, temp_h5_file):
+        """Test that only first visits count towards a year."""
+        h5_utils.add_player("test_player", "#FF0000", temp_h5_file)
+        h5_utils.update_visits("test_player", ["FR", "US", "FR", "DE"], temp_h5_file,
+                               visit_dates=["2021-05-01", "2023-02-01", "2023-06-01", "2023-07-01"])
+
+        assert h5_utils.get_countries_first_visited_in("test_player", 2023, temp_h5_file) == {"US", "DE"}
+        assert h5_utils.get_countries_first_visited_in("test_player", 2021, temp_h5_file) == {"FR"}
+        assert h5_utils.get_countries_first_visited_in("test_player", 2022, temp_h5_file) == set()
+
+    def test_get_year_in_review(self, temp_h5_file):
+        """Test the per-player year summary."""
+        h5_utils.add_player("player1", "#FF0000", temp_h5_file)
+        h5_utils.add_player("player2", "#00FF00", temp_h5_file)
+        h5_utils.update_visits("player1", ["FR", "FR", "ES"], temp_h5_file,
+                               visit_dates=["2022-05-01", "2023-06-01", "2023-07-01"])
+        h5_utils.update_visits("player2", ["US"], temp_h5_file)
+
+        review = h5_utils.get_year_in_review(2023, temp_h5_file)
+
+        assert review["player1"] == {"visits": 2, "new_countries": {"ES"}}
+        assert review["player2"] == {"visits": 0, "new_countries": set()}
+
     def test_get_players(self, temp_h5_file):
         """Test getting all players from the HDF5 file."""
         # Test with empty file
@@ -159,9 +218,35 @@ class TestH5Utils:
         with h5py.File(temp_h5_file, "r") as f:
             assert len(f[f"/players/{player_id}/visited"][...]) == 0
 
+        # Dated visits are cleared as well
+        h5_utils.update_visits(player_id, ["US"], temp_h5_file, visit_dates=["2023-01-01"])
+        h5_utils.clear_player_visits(player_id, temp_h5_file)
+        with h5py.File(temp_h5_file, "r") as f:
+            assert len(f[f"/players/{player_id}/visit_dates"]) == 0
+
         # Test with non-existent player (should not error)
         h5_utils.clear_player_visits("non_existent", temp_h5_file)
 
+    def test_save_selections(self, temp_h5_file):
+        """Test replacing the visits of several players in one write."""
+        h5_utils.add_player("player1", "#FF0000", temp_h5_file)
+        h5_utils.add_player("player2", "#00FF00", temp_h5_file)
+        h5_utils.update_visits("player1", ["US", "CA", "MX"], temp_h5_file,
+                               visit_dates=["2023-01-01", "2022-06-01", None])
+        h5_utils.update_visits("player2", ["FR"], temp_h5_file)
+
+        written = h5_utils.save_selections({"player1": {"MX", "US"}, "player2": set(), "non_existent": {"FR"}},
+                                           temp_h5_file)
+
+        assert written == ["player1", "player2"]
+        players = h5_utils.get_players(temp_h5_file)
+        assert players["player1"]["visited"] == {"MX", "US"}
+        assert players["player2"]["visited"] == set()
+        assert "non_existent" not in players
+        # Visit dates are kept for the countries still visited
+        assert h5_utils.get_visits_between("player1", "2022-01-01", "2023-12-31", temp_h5_file) == \
+            [("US", date(2023, 1, 1))]
+
     def test_delete_player(self, temp_h5_file):
         """Test deleting a player from the HDF5 file."""
         # Add some players
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import math
+import pytest
+
+# Add the parent directory to sys.path to import leaderboard
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import h5_utils
+import leaderboard
+
+
+def write_map(path, players):
+    """Write a map file with the given player -> visited codes."""
+    h5_utils.init_h5(path)
+    for player, codes in players.items():
+        h5_utils.add_player(player, "#FF0000", path)
+        if codes:
+            h5_utils.update_visits(player, codes, path)
+
+
+@pytest.fixture
+def maps_dir(temp_dir):
+    """Two map files with three players in total."""
+    write_map(os.path.join(temp_dir, "family.h5"), {"alice": ["US", "FR", "NZ"], "bob": ["US", "FR"]})
+    write_map(os.path.join(temp_dir, "friends.h5"), {"carol": ["US"]})
+    return temp_dir
+
+
+class TestLeaderboard:
+    """Test suite for leaderboard.py."""
+
+    def test_rarity_weights(self):
+        """Test that rare countries weigh more and universal ones weigh 1."""
+        weights = leaderboard.rarity_weights({"US": 4, "NZ": 1, "XX": 0}, 4)
+        assert weights["US"] == 1.0
+        assert weights["NZ"] == pytest.approx(1 + math.log(4))
+        assert "XX" not in weights
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_refresh(self, maps_dir, workers):
+        """Test the visitor counts and rankings of a full scan, in process and with a process pool."""
+        path = os.path.join(maps_dir, "leaderboard.json")
+        summary = leaderboard.refresh_leaderboard(maps_dir, path, workers=workers, size=2)
+        assert summary["visitor_counts"] == {"FR": 2, "NZ": 1, "US": 3}
+
+        rankings = summary["rankings"]
+        assert rankings["players"] == 3
+        assert rankings["most_countries"] == [{"map": "family", "player": "alice", "countries": 3},
+                                              {"map": "family", "player": "bob", "countries": 2}]
+        assert rankings["rarest_travellers"][0]["player"] == "alice"
+        assert rankings["rarest_countries"][0] == {"code": "NZ", "visitors": 1,
+                                                   "weight": round(1 + math.log(3), 3)}
+
+        # The app reads the same summary back from disk
+        assert leaderboard.load_leaderboard(path) == json.loads(json.dumps(summary))
+
+    def test_incremental_refresh(self, maps_dir, monkeypatch):
+        """Test that only changed files are rescanned and removed files drop out of the counts."""
+        path = os.path.join(maps_dir, "leaderboard.json")
+        leaderboard.refresh_leaderboard(maps_dir, path, workers=1)
+
+        scanned = []
+        scan = leaderboard.scan_map_file
+        monkeypatch.setattr(leaderboard, "scan_map_file", lambda map_path: scanned.append(map_path) or scan(map_path))
+
+        # Nothing changed: nothing is scanned
+        leaderboard.refresh_leaderboard(maps_dir, path, workers=1)
+        assert scanned == []
+
+        write_map(os.path.join(maps_dir, "friends.h5"), {"carol": ["US", "NZ"], "dave": []})
+        os.remove(os.path.join(maps_dir, "family.h5"))
+        summary = leaderboard.refresh_leaderboard(maps_dir, path, workers=1)
+        assert scanned == [os.path.join(maps_dir, "friends.h5")]
+        assert summary["visitor_counts"] == {"NZ": 1, "US": 1}
+        assert summary["rankings"]["players"] == 2
+
+    def test_load_rankings(self, maps_dir):
+        """Test that the page gets the rankings without the per-player scan results."""
+        path = os.path.join(maps_dir, "leaderboard.json")
+        assert leaderboard.load_rankings(path) is None
+        summary = leaderboard.refresh_leaderboard(maps_dir, path, workers=1)
+        rankings = leaderboard.load_rankings(path)
+        assert rankings == {"rankings": summary["rankings"], "maps": 2, "updated": summary["updated"]}
+
+    def test_refresh_in_background(self, maps_dir):
+        """Test that a background refresh writes the summary and that only one runs at a time."""
+        path = os.path.join(maps_dir, "leaderboard.json")
+        assert leaderboard.refresh_in_background(maps_dir, path, workers=1)
+        thread = leaderboard._refresh["thread"]
+        assert not leaderboard.refresh_in_background(maps_dir, path, workers=1) or not thread.is_alive()
+        thread.join(timeout=30)
+        assert leaderboard.refresh_status() == (False, None)
+        assert leaderboard.load_rankings(path)["rankings"]["players"] == 3
+
+        # A failed refresh reports its error
+        assert leaderboard.refresh_in_background(maps_dir, os.path.join(maps_dir, "missing", "out.json"), workers=1)
+        leaderboard._refresh["thread"].join(timeout=30)
+        running, error = leaderboard.refresh_status()
+        assert not running
+        assert "Error refreshing leaderboard" in error
+
+    def test_load_missing(self, temp_dir):
+        """Test that a missing or foreign summary is ignored."""
+        path = os.path.join(temp_dir, "leaderboard.json")
+        assert leaderboard.load_leaderboard(path) is None
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"format": 0}, f)
+        assert leaderboard.load_leaderboard(path) is None
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+
+# Add the parent directory to sys.path to import map_component
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import map_component
+
+RED = {"fillColor": "#FF0000"}
+GREEN = {"fillColor": "#00FF00"}
+
+
+class TestMapComponent:
+    """Test suite for the map_component package."""
+
+    def test_style_delta(self):
+        """Test added, changed and removed styles."""
+        old = {"US": RED, "CA": RED}
+        new = {"US": RED, "CA": GREEN, "MX": GREEN}
+        assert map_component.style_delta(old, new) == {"CA": GREEN, "MX": GREEN}
+        assert map_component.style_delta(new, {"US": RED}) == {"CA": None, "MX": None}
+        assert map_component.style_delta(new, new) == {}
+
+    def test_plan_update_sends_geometry_once(self):
+        """Test that the geometry is sent until the browser acknowledges it, then only deltas."""
+        sync = map_component.new_sync_state()
+
+        first = map_component.plan_update(sync, None, {"US": RED}, "v1")
+        assert first["send_geometry"] and first["full"]
+        assert first["styles"] == {"US": RED}
+
+        # The browser reports that it holds v1
+        ack = {"geometry": "v1", "request": 0}
+        unchanged = map_component.plan_update(sync, ack, {"US": RED}, "v1")
+        assert not unchanged["send_geometry"]
+        assert unchanged["changes"] == {}
+        assert unchanged["seq"] == unchanged["base"] == first["seq"]
+
+        toggled = map_component.plan_update(sync, ack, {"US": RED, "CA": GREEN}, "v1")
+        assert not toggled["send_geometry"] and not toggled["full"]
+        assert toggled["changes"] == {"CA": GREEN}
+        assert toggled["base"] == first["seq"]
+        assert toggled["seq"] == first["seq"] + 1
+        # A toggle moves bytes, not the whole map
+        assert len(json.dumps(toggled)) < 200
+
+    def test_plan_update_resync(self):
+        """Test full updates when the browser asks for one or the geometry changes."""
+        sync = map_component.new_sync_state()
+        map_component.plan_update(sync, None, {"US": RED}, "v1")
+
+        # Missed update: the browser raises its request counter but keeps the geometry
+        resync = map_component.plan_update(sync, {"geometry": "v1", "request": 1}, {"US": GREEN}, "v1")
+        assert resync["full"] and not resync["send_geometry"]
+        assert resync["styles"] == {"US": GREEN}
+        assert map_component.plan_update(sync, {"geometry": "v1", "request": 1}, {"US": GREEN}, "v1")["changes"] == {}
+
+        # New geometry version: send it again
+        reload = map_component.plan_update(sync, {"geometry": "v1", "request": 1}, {"US": GREEN}, "v2")
+        assert reload["full"] and reload["send_geometry"]
+
+    def test_frontend_exists(self):
+        """Test that the component's static frontend ships with the package."""
+        assert os.path.exists(os.path.join(map_component._FRONTEND_DIR, "index.html"))
@@ -0,0 +1,108 @@
+import os
+import sys
+import numpy as np
+
+# Add the parent directory to sys.path to import map_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import map_utils
+
+
+class TestMapUtils:
+    """Test suite for map_utils.py functions."""
+
+    def test_feature_codes(self, make_geo_data):
+        """Test extracting unique feature codes in order."""
+        geo_data = make_geo_data(["US", "-99", "CA", "-99"])
+        assert map_utils.feature_codes(geo_data) == ["US", "-99", "CA"]
+
+    def test_owners_matrix(self):
+        """Test the players x countries ownership matrix."""
+        players = {"a": {"colour": "#FF0000", "visited": {"US", "XX"}},
+                   "b": {"colour": "#00FF00", "visited": {"US", "CA"}}}
+        owners = map_utils.owners_matrix(players, ["US", "CA", "MX"])
+        assert owners.tolist() == [[True, False, False], [True, True, False]]
+
+    def test_build_style_table(self):
+        """Test single-owner, multi-owner, unvisited and non-country styles."""
+        players = {
+            "player1": {"colour": "#FF0000", "visited": {"US", "-99"}},
+            "player2": {"colour": "#00FF00", "visited": {"CA"}},
+            "player3": {"colour": "#0000FF", "visited": {"US", "CA"}},
+        }
+        table = map_utils.build_style_table(players, ["US", "CA", "MX", "-99"])
+
+        assert table["MX"] == map_utils.UNVISITED_STYLE
+        assert table["-99"] == map_utils.NON_COUNTRY_STYLE
+        # RMS mix: sqrt((255^2 + 0) / 2) = 180.3 -> 180 = 0xb4
+        assert table["US"] == {"fillColor": "#b400b4", "fillOpacity": 0.7, "color": "#222", "weight": 0.5}
+        assert table["CA"]["fillColor"] == "#00b4b4"
+
+        players["player3"]["visited"] = set()
+        table = map_utils.build_style_table(players, ["US", "CA"])
+        assert table["US"] == {"fillColor": "#FF0000", "fillOpacity": 0.7, "color": "#444", "weight": 0.5}
+
+        # Players sharing a colour each count towards the mix
+        players["player3"]["visited"] = {"US"}
+        players["player2"] = {"colour": "#ff0000", "visited": {"US"}}
+        table = map_utils.build_style_table(players, ["US"])
+        # sqrt(2 * 255^2 / 3) = 208.2 -> 0xd0 and sqrt(255^2 / 3) = 147.2 -> 0x93
+        assert table["US"]["fillColor"] == "#d00093"
+
+    def test_build_style_table_many_players(self):
+        """Test that the table scales to hundreds of players."""
+        rng = np.random.default_rng(0)
+        codes = [f"C{i}" for i in range(250)]
+        players = {
+            f"p{i}": {"colour": f"#{rng.integers(0, 0xFFFFFF):06x}",
+                      "visited": set(rng.choice(codes, size=40, replace=False))}
+            for i in range(500)
+        }
+        table = map_utils.build_style_table(players, codes)
+        assert len(table) == 250
+        assert all(style["fillColor"].startswith("#") for style in table.values())
+
+    def test_build_style_table_no_players(self):
+        """Test that an empty game leaves every country unvisited."""
+        table = map_utils.build_style_table({}, ["US", "-99"])
+        assert table == {"US": map_utils.UNVISITED_STYLE, "-99": map_utils.NON_COUNTRY_STYLE}
+
+    def test_state_hash(self):
+        """Test that the state hash ignores ordering but not content."""
+        players = {"a": {"colour": "#FF0000", "visited": {"US", "CA"}},
+                   "b": {"colour": "#00FF00", "visited": set()}}
+        reordered = {"b": {"colour": "#00FF00", "visited": set()},
+                     "a": {"colour": "#FF0000", "visited": {"CA", "US"}}}
+        key = map_utils.state_hash(players, "v1")
+
+        assert map_utils.state_hash(reordered, "v1") == key
+        assert map_utils.state_hash(players, "v2") != key
+        players["a"]["visited"].add("MX")
+        assert map_utils.state_hash(players, "v1") != key
+        players["a"]["visited"].discard("MX")
+        players["b"]["colour"] = "#0000FF"
+        assert map_utils.state_hash(players, "v1") != key
+
+    def test_render_cache_eviction(self):
+        """Test size-based LRU eviction of the render cache."""
+        cache = map_utils.RenderCache(max_bytes=10)
+        assert cache.put("a", "aaaa")
+        assert cache.put("b", "bbbb")
+        assert cache.get("a") == "aaaa"  # a is now most recently used
+        assert cache.put("c", "cccc")  # evicts b
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "aaaa"
+        assert cache.get("c") == "cccc"
+        assert cache.total_bytes == 8
+
+        # Replacing an entry updates the size accounting
+        cache.put("a", "aa")
+        assert cache.total_bytes == 6
+        # Entries larger than the whole budget are not cached
+        assert not cache.put("big", "x" * 11)
+        assert len(cache) == 2
+
+        # Image bytes are sized by their length
+        assert cache.put("png", b"\x89PNG")
+        assert cache.get("png") == b"\x89PNG"
+        assert cache.total_bytes == 10
@@ -0,0 +1,61 @@
+import os
+import sys
+import io
+from PIL import Image
+
+# Add the parent directory to sys.path to import raster_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import raster_utils
+
+
+# A large country with an enclave, and a second country elsewhere
+COUNTRIES = [
+    {"code": "OO", "name": "Outer", "box": (-90, -45, 0, 45), "holes": [(-60, -15, -30, 15)]},
+    {"code": "EN", "name": "Enclave", "box": (-60, -15, -30, 15)},
+    {"code": "EE", "name": "East", "box": (90, -45, 135, 45)},
+]
+
+
+class TestRasterUtils:
+    """Test suite for raster_utils.py functions."""
+
+    def test_labels(self, make_geo_data):
+        """Test that each pixel is labelled with its country, holes included."""
+        raster = raster_utils.RasterMap(make_geo_data(COUNTRIES), width=360, height=180)
+
+        assert raster.codes == ["OO", "EN", "EE"]
+        assert raster.labels.shape == (180, 360)
+        # Pixel (row, column) of lon/lat: column = lon + 180, row = 90 - lat
+        assert raster.labels[90 - 30, 180 - 75] == 1
+        assert raster.labels[90, 180 - 45] == 2
+        assert raster.labels[90, 180 + 110] == 3
+        assert raster.labels[90, 180 + 60] == 0
+        assert raster.borders[90, 180 - 90]
+        assert not raster.borders[90, 180 + 60]
+
+    def test_render(self, make_geo_data):
+        """Test that recolouring fills each country with its style."""
+        raster = raster_utils.RasterMap(make_geo_data(COUNTRIES), width=360, height=180)
+        players = {"a": {"colour": "#FF0000", "visited": {"EE"}}}
+
+        image = raster.render(players)
+        ocean = raster_utils._css_rgb([raster_utils.OCEAN_COLOUR])[0]
+
+        # 70% red over the land colour (#f2efe9)
+        assert image[90, 180 + 110].tolist() == [251, 72, 70]
+        assert image[90, 180 + 60].tolist() == ocean.tolist()
+        # The unvisited enclave is a faint white over land
+        assert image[90, 180 - 45].tolist() == [245, 242, 237]
+
+    def test_render_png(self, make_geo_data):
+        """Test PNG encoding of a render."""
+        raster = raster_utils.RasterMap(make_geo_data(COUNTRIES), width=120, height=60)
+        png = raster.render_png({})
+        image = Image.open(io.BytesIO(png))
+        assert image.size == (120, 60)
+        assert image.format == "PNG"
+
+    def test_css_rgb(self):
+        """Test that the #rgb shorthand used by the map styles is expanded."""
+        assert raster_utils._css_rgb(["#444", "#ff0000", "999"]).tolist() == [[68, 68, 68], [255, 0, 0],
+                                                                              [153, 153, 153]]
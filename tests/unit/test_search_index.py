@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import pytest
+
+# Add the parent directory to sys.path to import search_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import search_index
+from search_index import CODE, NAME, ALIAS
+
+
+@pytest.fixture
+def index():
+    """A small index with names, codes and aliases."""
+    entries = [
+        ("Australia", 0, NAME), ("AU", 0, CODE), ("AUS", 0, CODE),
+        ("Austria", 1, NAME), ("AT", 1, CODE), ("AUT", 1, CODE),
+        ("Côte d'Ivoire", 2, NAME), ("CI", 2, CODE), ("Ivory Coast", 2, ALIAS),
+        ("United States of America", 3, NAME), ("US", 3, CODE), ("USA", 3, CODE), ("America", 3, ALIAS),
+        ("Russia", 4, NAME), ("RU", 4, CODE),
+    ]
+    return search_index.SearchIndex(entries)
+
+
+class TestSearchIndex:
+    """Test suite for search_index.py."""
+
+    def test_search_key(self):
+        """Test accent, case and punctuation folding."""
+        assert search_index.search_key("Côte d'Ivoire") == "cote d ivoire"
+        assert search_index.search_key("  São-Tomé ") == "sao tome"
+        assert search_index.fold_text("ÅLAND") == "aland"
+
+    def test_ranking(self, index):
+        """Test that codes and exact names outrank prefixes, word starts and substrings."""
+        # The exact code comes first, then the names containing "us"
+        assert index.search("us").tolist() == [3, 0, 1, 4]
+        assert index.search("usa").tolist() == [3]
+        # Prefix of two names, name order decides
+        assert index.search("aus").tolist() == [0, 1]
+        # Alpha-3 code
+        assert index.search("aut").tolist() == [1]
+        assert index.search("america").tolist() == [3]
+        # "states" starts a word, "ssia" is inside one
+        assert index.search("states").tolist() == [3]
+        assert index.search("ssia").tolist() == [4]
+        assert index.search("").tolist() == []
+
+    def test_accents_and_aliases(self, index):
+        """Test that spellings with and without accents and aliases find the same row."""
+        for query in ["côte d'ivoire", "Cote dIvoire", "cote d iv", "IVORY", "ivory coast", "ci"]:
+            assert index.search(query).tolist() == [2], query
+
+    def test_short_queries(self, index):
+        """Test that queries shorter than a trigram still match anywhere in the text, as the plain filter did."""
+        # "ia" only occurs inside words
+        assert index.search("ia").tolist() == [0, 1, 4]
+        assert index.search("v").tolist() == [2]
+        # A word of "united states" starts with it, the other names contain it
+        assert index.search("st").tolist() == [3, 0, 1, 2]
+
+    def test_typos(self, index):
+        """Test that a misspelt query falls back to trigram similarity."""
+        assert index.search("austrlia").tolist()[0] == 0
+        assert index.search("rusia").tolist() == [4]
+        assert index.search("qqqq").tolist() == []
+
+    def test_latency(self):
+        """Test that a query over thousands of entries stays fast (sub-millisecond, with slack for CI)."""
+        words = ["ka", "lo", "mi", "ne", "ra", "tu", "sa", "ve", "do", "pi"]
+        entries = [(f"{words[i % 10]}{words[i // 10 % 10]}{words[i // 100 % 10]} {words[i // 7 % 10]}nia", i, NAME)
+                   for i in range(5000)]
+        large = search_index.SearchIndex(entries)
+        for query in ["k", "kalo", "lomi ra", "kalomx"]:
+            start = time.perf_counter()
+            for _ in range(20):
+                large.search(query)
+            assert (time.perf_counter() - start) / 20 < 0.005, query
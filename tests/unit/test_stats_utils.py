@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path to import stats_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import stats_utils
+
+# Nine codes, so the packed rows span two bytes
+CODES = ["AA", "BB", "CC", "DD", "EE", "FF", "GG", "HH", "II"]
+
+
+@pytest.fixture
+def players():
+    """Three players with overlapping visits, as returned by h5_utils.get_players()."""
+    return {
+        "alice": {"colour": "#FF0000", "visited": {"AA", "BB", "II", "XX"}},
+        "bob": {"colour": "#00FF00", "visited": {"AA", "II"}},
+        "carol": {"colour": "#0000FF", "visited": {"AA", "CC", "II"}},
+    }
+
+
+class TestStatsUtils:
+    """Test suite for stats_utils.py."""
+
+    def test_popcount_table(self):
+        """Test the byte popcount lookup table."""
+        assert stats_utils.POPCOUNT[0] == 0
+        assert stats_utils.POPCOUNT[255] == 8
+        assert stats_utils.POPCOUNT[0b10100001] == 3
+
+    def test_counts(self, players):
+        """Test per-player totals and per-country visitor counts; unknown codes are ignored."""
+        matrix = stats_utils.VisitMatrix.from_players(players, CODES)
+        assert matrix.bits.shape == (3, 2)
+        assert matrix.player_totals().tolist() == [3, 2, 3]
+        assert matrix.visitor_counts().tolist() == [3, 1, 1, 0, 0, 0, 0, 0, 3]
+
+    def test_overlap(self, players):
+        """Test all, any and at-least-N masks."""
+        matrix = stats_utils.VisitMatrix.from_players(players, CODES)
+        assert matrix.codes[matrix.visited_by_all()].tolist() == ["AA", "II"]
+        assert matrix.codes[matrix.visited_by_any()].tolist() == ["AA", "BB", "CC", "II"]
+        assert matrix.codes[matrix.visited_by_at_least(2)].tolist() == ["AA", "II"]
+
+        pair = matrix.subset(["carol", "alice", "nobody"])
+        assert pair.players == ["carol", "alice"]
+        assert pair.codes[pair.visited_by_all()].tolist() == ["AA", "II"]
+        assert pair.player_totals().tolist() == [3, 3]
+
+        empty = matrix.subset([])
+        assert not empty.visited_by_all().any()
+        assert not empty.visited_by_any().any()
+
+    def test_similarity(self, players):
+        """Test Jaccard and overlap similarity of every pair of players."""
+        matrix = stats_utils.VisitMatrix.from_players(players, CODES)
+        jaccard = matrix.similarity("jaccard")
+        # alice {AA, BB, II}, bob {AA, II}, carol {AA, CC, II}
+        np.testing.assert_allclose(jaccard, [[1, 2 / 3, 2 / 4], [2 / 3, 1, 2 / 3], [2 / 4, 2 / 3, 1]], rtol=1e-6)
+        overlap = matrix.similarity("overlap")
+        np.testing.assert_allclose(overlap[0], [1, 1, 2 / 3], rtol=1e-6)
+        with pytest.raises(ValueError):
+            matrix.similarity("cosine")
+
+        # A player without visits is similar to nobody
+        players["dave"] = {"colour": "#000000", "visited": set()}
+        assert not stats_utils.VisitMatrix.from_players(players, CODES).similarity()[3].any()
+
+    def test_nearest(self, players):
+        """Test top-k neighbours, computed in blocks smaller than the group."""
+        matrix = stats_utils.VisitMatrix.from_players(players, CODES)
+        neighbours, scores = matrix.nearest(k=1, block=2)
+        assert [matrix.players[row[0]] for row in neighbours] == ["bob", "alice", "bob"]
+        np.testing.assert_allclose(scores[:, 0], [2 / 3, 2 / 3, 2 / 3], rtol=1e-6)
+
+        # k is capped at the number of other players, and nobody is their own neighbour
+        neighbours, scores = matrix.nearest(k=5)
+        assert neighbours.shape == (3, 2)
+        assert all(i not in row for i, row in enumerate(neighbours))
+        assert (np.diff(scores, axis=1) <= 0).all()
+        assert matrix.subset(["alice"]).nearest()[0].shape == (1, 0)
+
+        # Blocked results match the full matrix on a larger random group
+        rng = np.random.default_rng(1)
+        owners = rng.random((300, 40)) < 0.3
+        large = stats_utils.VisitMatrix(list(range(300)), [str(i) for i in range(40)], np.packbits(owners, axis=1))
+        full = large.similarity()
+        np.fill_diagonal(full, -1)
+        _, scores = large.nearest(k=4, block=64)
+        np.testing.assert_allclose(scores, -np.sort(-full, axis=1)[:, :4], rtol=1e-6)
+
+    def test_large_group(self):
+        """Test that 10,000 players are answered interactively."""
+        rng = np.random.default_rng(0)
+        codes = [f"{chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(250)]
+        owners = rng.random((10000, 250)) < 0.1
+        matrix = stats_utils.VisitMatrix([f"p{i}" for i in range(10000)], codes, np.packbits(owners, axis=1))
+
+        start = time.perf_counter()
+        totals = matrix.player_totals()
+        counts = matrix.visitor_counts()
+        matrix.visited_by_all()
+        matrix.visited_by_any()
+        assert time.perf_counter() - start < 0.3
+        assert (totals == owners.sum(axis=1)).all()
+        assert (counts == owners.sum(axis=0)).all()
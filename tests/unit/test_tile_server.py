@@ -0,0 +1,94 @@
+import os
+import sys
+import gzip
+import json
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path to import tile_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import tile_server
+
+
+# Two countries on either side of the prime meridian
+COUNTRIES = [
+    {"code": "WW", "name": "West", "box": (-20, 10, -5, 30)},
+    {"code": "EE", "name": "East", "box": (5, -30, 20, -10)},
+]
+
+
+class TestTileServer:
+    """Test suite for tile_server.py functions."""
+
+    def test_project(self):
+        """Test the web-mercator projection to world units."""
+        projected = tile_server.project([[-180, 0], [0, 0], [180, 0], [0, 90]])
+        np.testing.assert_allclose(projected[:3], [[0, 0.5], [0.5, 0.5], [1, 0.5]])
+        # The poles are clamped to the top of the map
+        assert projected[3, 1] == pytest.approx(0, abs=1e-9)
+
+    def test_clip_ring(self):
+        """Test clipping rings to a rectangle."""
+        square = np.array([[0, 0], [2, 0], [2, 2], [0, 2]], dtype=float)
+
+        inside = tile_server.clip_ring(square, (-1, -1, 3, 3))
+        np.testing.assert_array_equal(inside, square)
+
+        clipped = tile_server.clip_ring(square, (1, 1, 3, 3))
+        assert sorted(map(tuple, clipped.tolist())) == [(1, 1), (1, 2), (2, 1), (2, 2)]
+
+        assert len(tile_server.clip_ring(square, (5, 5, 6, 6))) == 0
+
+    def test_tiles(self, make_geo_data):
+        """Test cutting tiles and addressing them by z/x/y."""
+        tileset = tile_server.TileSet(make_geo_data(COUNTRIES), max_zoom=2)
+
+        world = json.loads(tileset.tile(0, 0, 0))
+        assert [feature["c"] for feature in world["features"]] == ["WW", "EE"]
+        for feature in world["features"]:
+            for ring in feature["r"]:
+                assert all(isinstance(value, int) for value in ring)
+                assert all(0 <= value <= tile_server.TILE_EXTENT for value in ring)
+
+        # West is north-west of the origin, East is south-east
+        assert [f["c"] for f in json.loads(tileset.tile(1, 0, 0))["features"]] == ["WW"]
+        assert [f["c"] for f in json.loads(tileset.tile(1, 1, 1))["features"]] == ["EE"]
+        assert tileset.tile(1, 1, 0) == tile_server.EMPTY_TILE
+
+        assert tileset.tile(3, 0, 0) is None
+        assert tileset.tile(1, 2, 0) is None
+        assert tileset.precut() == 1 + 4 + 16
+
+    def test_tile_server(self, make_geo_data):
+        """Test serving tiles over HTTP from the in-process server."""
+        tileset = tile_server.TileSet(make_geo_data(COUNTRIES), max_zoom=1)
+        server = tile_server.start_tile_server(tileset, host="127.0.0.1", port=0)
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            url = tile_server.tile_url_template(base_url).format(z=0, x=0, y=0)
+            request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+            with urllib.request.urlopen(request) as response:
+                assert response.headers["Access-Control-Allow-Origin"] == "*"
+                assert response.headers["Content-Encoding"] == "gzip"
+                assert gzip.decompress(response.read()) == tileset.tile(0, 0, 0)
+
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f"{base_url}/tiles/5/0/0.json")
+            assert error.value.code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_country_tile_layer(self):
+        """Test that the layer embeds the tile URL and styles but no shapes."""
+        import folium
+
+        m = folium.Map()
+        tile_server.CountryTileLayer("http://localhost:8765/tiles/{z}/{x}/{y}.json",
+                                     {"WW": {"fillColor": "#ff0000"}}, {"fillColor": "#ffffff"}).add_to(m)
+        html = m.get_root().render()
+        assert "http://localhost:8765/tiles/{z}/{x}/{y}.json" in html
+        assert '"WW": {"fillColor": "#ff0000"}' in html
+        assert "coordinates" not in html
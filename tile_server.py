@@ -0,0 +1,391 @@
+"""
+Local vector tile service for the visited-countries layer.
+
+Country polygons are cut into web-mercator z/x/y tiles and served as compact
+JSON from a small HTTP server, either in-process (a daemon thread started by
+the app) or as a sidecar (python tile_server.py). The map then only embeds
+the code -> style mapping and the browser fetches the shapes tile by tile.
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+import geo_utils
+
+# Tile server configuration
+# TILE_SERVER: "off" (inline GeoJSON), "local" (in-process server) or "external" (sidecar at TILE_SERVER_URL)
+TILE_SERVER = os.environ.get('TILE_SERVER', 'off').lower()
+TILE_SERVER_HOST = os.environ.get('TILE_SERVER_HOST', '127.0.0.1')
+TILE_SERVER_PORT = int(os.environ.get('TILE_SERVER_PORT', 8765))
+# Base URL the browser uses to reach the server
+TILE_SERVER_URL = os.environ.get('TILE_SERVER_URL', f"http://localhost:{TILE_SERVER_PORT}")
+
+# Tile coordinates are integers in [0, TILE_EXTENT) across a 256 pixel tile
+TILE_EXTENT = 4096
+# Shapes are clipped this far outside the tile so borders on tile edges are not drawn
+TILE_BUFFER = 64
+DEFAULT_MAX_ZOOM = 6
+# Web mercator cuts off the poles at this latitude
+MAX_LATITUDE = 85.0511287798
+
+EMPTY_TILE = b'{"features":[]}'
+
+
+def tile_url_template(base_url=TILE_SERVER_URL):
+    """
+    Get the Leaflet URL template of the tiles served at a base URL.
+    Args:
+        base_url (str): Base URL of the tile server
+    Returns:
+        str: e.g. http://localhost:8765/tiles/{z}/{x}/{y}.json
+    """
+    return f"{base_url.rstrip('/')}/tiles/{{z}}/{{x}}/{{y}}.json"
+
+
+def project(coordinates):
+    """
+    Project lon/lat coordinates to web-mercator world units.
+    Args:
+        coordinates (numpy.ndarray): (N, 2) array of longitude/latitude pairs
+    Returns:
+        numpy.ndarray: (N, 2) array of x/y in [0, 1], with y = 0 at the top of the map
+    """
+    points = np.asarray(coordinates, dtype=np.float64)[:, :2]
+    lat = np.radians(np.clip(points[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    x = (points[:, 0] + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return np.column_stack([x, y])
+
+
+def zoom_tolerance(zoom):
+    """Simplification tolerance in degrees that stays below half a pixel at a zoom level."""
+    return 360.0 / (256 * 2 ** zoom) / 2
+
+
+def _clip_ring(points, axis, value, keep_below):
+    """
+    Clip an open ring against one axis-aligned half-plane (one Sutherland-Hodgman pass).
+    Args:
+        points (numpy.ndarray): (N, 2) ring without its closing point
+        axis (int): 0 to clip on x, 1 to clip on y
+        value (float): Position of the clipping line
+        keep_below (bool): Keep the side where the coordinate is <= value
+    Returns:
+        numpy.ndarray: Clipped ring without its closing point
+    """
+    if not len(points):
+        return points
+    inside = points[:, axis] <= value if keep_below else points[:, axis] >= value
+    if inside.all():
+        return points
+    following = np.roll(points, -1, axis=0)
+    crosses = inside != np.roll(inside, -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(crosses, (value - points[:, axis]) / (following[:, axis] - points[:, axis]), 0.0)
+    intersections = points + t[:, None] * (following - points)
+
+    # Each edge emits its start point if inside, then the crossing point if it leaves or enters
+    candidates = np.empty((2 * len(points), 2))
+    candidates[0::2] = points
+    candidates[1::2] = intersections
+    keep = np.empty(2 * len(points), dtype=bool)
+    keep[0::2] = inside
+    keep[1::2] = crosses
+    return candidates[keep]
+
+
+def clip_ring(points, bounds):
+    """
+    Clip an open ring to a rectangle.
+    Args:
+        points (numpy.ndarray): (N, 2) ring without its closing point
+        bounds (tuple): (min_x, min_y, max_x, max_y)
+    Returns:
+        numpy.ndarray: Clipped ring without its closing point (empty if outside)
+    """
+    min_x, min_y, max_x, max_y = bounds
+    points = _clip_ring(points, 0, min_x, False)
+    points = _clip_ring(points, 0, max_x, True)
+    points = _clip_ring(points, 1, min_y, False)
+    return _clip_ring(points, 1, max_y, True)
+
+
+class TileSet:
+    """
+    Country polygons cut into z/x/y tiles on demand and memoized.
+
+    Each zoom level is cut from a copy of the shapes simplified for that zoom, so
+    tiles stay small at every level. Tiles hold one entry per country with its
+    ISO code and its rings in integer tile coordinates.
+    """
+
+    def __init__(self, geo_data, max_zoom=DEFAULT_MAX_ZOOM):
+        """
+        Args:
+            geo_data (dict): GeoJSON or TopoJSON data for countries
+            max_zoom (int): Deepest zoom level served; Leaflet scales these tiles up beyond it
+        """
+        if geo_utils.is_topology(geo_data):
+            geo_data = geo_utils.topojson_to_geojson(geo_data)
+        self.geo_data = geo_data
+        self.max_zoom = max_zoom
+        self._zoom_shapes = {}
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def _shapes(self, zoom):
+        """Projected rings and bounding boxes of every country, simplified for a zoom level."""
+        with self._lock:
+            if zoom in self._zoom_shapes:
+                return self._zoom_shapes[zoom]
+        tolerance = zoom_tolerance(zoom)
+        digits = max(0, math.ceil(-math.log10(tolerance))) + 1
+        simplified = geo_utils.simplify_geojson(self.geo_data, tolerance, digits)
+
+        codes, rings, boxes = [], [], []
+        for feature in simplified["features"]:
+            feature_rings = [project(ring)[:-1] for polygon in geo_utils.geometry_polygons(feature["geometry"])
+                             for ring in polygon if len(ring) >= 4]
+            if not feature_rings:
+                continue
+            stacked = np.concatenate(feature_rings)
+            codes.append(feature["properties"].get("ISO3166-1-Alpha-2", ""))
+            rings.append(feature_rings)
+            boxes.append([*stacked.min(axis=0), *stacked.max(axis=0)])
+        shapes = (codes, rings, np.array(boxes).reshape(-1, 4))
+        with self._lock:
+            self._zoom_shapes[zoom] = shapes
+        return shapes
+
+    def _cut(self, zoom, x, y):
+        """Cut one tile and encode it as compact JSON."""
+        codes, rings, boxes = self._shapes(zoom)
+        size = 2 ** zoom
+        buffer = TILE_BUFFER / TILE_EXTENT / size
+        bounds = (x / size - buffer, y / size - buffer, (x + 1) / size + buffer, (y + 1) / size + buffer)
+        hits = np.flatnonzero((boxes[:, 0] <= bounds[2]) & (boxes[:, 2] >= bounds[0])
+                              & (boxes[:, 1] <= bounds[3]) & (boxes[:, 3] >= bounds[1]))
+
+        features = []
+        for i in hits:
+            tile_rings = []
+            for ring in rings[i]:
+                clipped = clip_ring(ring, bounds)
+                if len(clipped) < 3:
+                    continue
+                local = np.round((clipped * size - (x, y)) * TILE_EXTENT).astype(np.int64)
+                changed = np.any(local != np.roll(local, 1, axis=0), axis=1)
+                local = local[changed]
+                if len(local) >= 3:
+                    tile_rings.append(local.ravel().tolist())
+            if tile_rings:
+                features.append({"c": codes[i], "r": tile_rings})
+        if not features:
+            return EMPTY_TILE
+        return json.dumps({"features": features}, separators=(",", ":")).encode("utf-8")
+
+    def tile(self, zoom, x, y):
+        """
+        Get a tile, cutting it on first use.
+        Args:
+            zoom (int): Zoom level
+            x (int): Tile column
+            y (int): Tile row (0 at the top)
+        Returns:
+            bytes: Tile JSON, or None if the tile does not exist
+        """
+        if not (0 <= zoom <= self.max_zoom and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+            return None
+        key = (zoom, x, y)
+        with self._lock:
+            data = self._tiles.get(key)
+        if data is None:
+            data = self._cut(zoom, x, y)
+            with self._lock:
+                self._tiles[key] = data
+        return data
+
+    def precut(self, max_zoom=None):
+        """
+        Cut every tile up to a zoom level ahead of time.
+        Args:
+            max_zoom (int): Deepest level to cut. If None, uses the tile set's max_zoom.
+        Returns:
+            int: Number of tiles cut so far
+        """
+        deepest = self.max_zoom if max_zoom is None else min(max_zoom, self.max_zoom)
+        for zoom in range(deepest + 1):
+            for x in range(2 ** zoom):
+                for y in range(2 ** zoom):
+                    self.tile(zoom, x, y)
+        return len(self)
+
+
+def _make_handler(tileset):
+    """Build a request handler class serving a tile set."""
+
+    class TileRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            data = None
+            if len(parts) == 4 and parts[0] == "tiles" and parts[3].endswith(".json"):
+                try:
+                    data = tileset.tile(int(parts[1]), int(parts[2]), int(parts[3][:-5]))
+                except ValueError:
+                    data = None
+            if data is None:
+                self.send_error(404, "Tile not found")
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            # The map is rendered in a sandboxed iframe, so tiles are fetched cross-origin
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Cache-Control", "public, max-age=86400")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                data = gzip.compress(data, compresslevel=5)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # Tile requests would flood the Streamlit log
+            pass
+
+    return TileRequestHandler
+
+
+def start_tile_server(tileset, host=TILE_SERVER_HOST, port=TILE_SERVER_PORT):
+    """
+    Serve a tile set from a background daemon thread.
+    Args:
+        tileset (TileSet): Tiles to serve
+        host (str): Interface to bind
+        port (int): Port to bind, or 0 for any free port
+    Returns:
+        ThreadingHTTPServer: The running server; server.server_address holds the bound port
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(tileset))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="tile-server", daemon=True)
+    thread.start()
+    return server
+
+
+class CountryTileLayer(MacroElement):
+    """
+    Leaflet layer drawing the country tiles on canvases, styled by ISO code.
+
+    Only the styles of countries that differ from the default are embedded into the page.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                var styles = {{ this.styles|tojson }};
+                var fallback = {{ this.default_style|tojson }};
+                var extent = {{ this.extent }};
+                var Layer = L.GridLayer.extend({
+                    createTile: function(coords, done) {
+                        var tile = document.createElement("canvas");
+                        var size = this.getTileSize();
+                        tile.width = size.x;
+                        tile.height = size.y;
+                        var url = L.Util.template({{ this.url|tojson }}, coords);
+                        fetch(url).then(function(response) {
+                            return response.ok ? response.json() : {features: []};
+                        }).then(function(data) {
+                            var ctx = tile.getContext("2d");
+                            ctx.scale(size.x / extent, size.y / extent);
+                            data.features.forEach(function(feature) {
+                                var style = styles[feature.c] || fallback;
+                                ctx.beginPath();
+                                feature.r.forEach(function(ring) {
+                                    ctx.moveTo(ring[0], ring[1]);
+                                    for (var i = 2; i < ring.length; i += 2) {
+                                        ctx.lineTo(ring[i], ring[i + 1]);
+                                    }
+                                    ctx.closePath();
+                                });
+                                ctx.globalAlpha = style.fillOpacity === undefined ? 0.2 : style.fillOpacity;
+                                ctx.fillStyle = style.fillColor;
+                                ctx.fill("evenodd");
+                                ctx.globalAlpha = 1;
+                                ctx.strokeStyle = style.color;
+                                ctx.lineWidth = style.weight * extent / size.x;
+                                ctx.stroke();
+                            });
+                            done(null, tile);
+                        }).catch(function(error) {
+                            done(error, tile);
+                        });
+                        return tile;
+                    }
+                });
+                return new Layer({{ this.options|tojson }});
+            })();
+            {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, url, styles, default_style, max_native_zoom=DEFAULT_MAX_ZOOM):
+        """
+        Args:
+            url (str): Leaflet URL template of the tiles (see tile_url_template)
+            styles (dict): ISO code -> style dict for every country not drawn with default_style
+            default_style (dict): Style of the remaining countries
+            max_native_zoom (int): Deepest zoom level the server provides
+        """
+        super().__init__()
+        self._name = "CountryTileLayer"
+        self.url = url
+        self.styles = styles
+        self.default_style = default_style
+        self.extent = TILE_EXTENT
+        self.options = {"maxNativeZoom": max_native_zoom, "attribution": "Natural Earth"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve country vector tiles for the map.")
+    parser.add_argument("--source", default=None,
+                        help="GeoJSON or TopoJSON country file (default: JSON/countries.topojson if built, "
+                             "else JSON/countries.geojson)")
+    parser.add_argument("--host", default=TILE_SERVER_HOST, help="Interface to bind")
+    parser.add_argument("--port", type=int, default=TILE_SERVER_PORT, help="Port to bind")
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_MAX_ZOOM, help="Deepest zoom level served")
+    parser.add_argument("--precut", action="store_true", help="Cut every tile before serving")
+    args = parser.parse_args()
+
+    source = args.source
+    if source is None:
+        source = geo_utils.topojson_path()
+        if not os.path.exists(source):
+            source = geo_utils.DEFAULT_GEOJSON_PATH
+    with open(source, encoding="utf-8") as f:
+        tileset = TileSet(json.load(f), max_zoom=args.max_zoom)
+    if args.precut:
+        print(f"Cut {tileset.precut()} tiles")
+
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(tileset))
+    print(f"Serving {source} at {tile_url_template(f'http://{args.host}:{args.port}')}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()